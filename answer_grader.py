@@ -0,0 +1,200 @@
+"""
+Grading typed answers.
+
+A typed answer is compared with the card's answer after normalization:
+case, accents, punctuation and a leading article ("the", "a", "an") are
+ignored, and so are parentheticals ("Paris (France)"). Alternatives written
+into the answer ("colour / color", or between names "Mumbai or Bombay")
+and, for people, the surname alone are accepted too.
+
+What is left may still contain a typo. Each card gets its own edit budget
+(max_edits): none for years, numbers and short answers, otherwise about one
+edit per TYPO_CHARS characters; numbers and Roman numerals inside an answer
+must still be typed exactly. Distances are computed with the
+bit-parallel algorithm of Myers in Hyyrö's formulation, one pass over the
+typed text doing a handful of integer operations per character (Python
+ints serve as bit vectors of any length), and the pass stops as soon as
+the budget cannot be met any more. The accepted variants of an answer and
+their character masks are built once and cached (compile_answer), so
+grading stays well under a millisecond even for long answers.
+"""
+
+import re
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+from answer_index import classify_answer
+
+# Characters per allowed typo.
+TYPO_CHARS = 5
+# Most typos forgiven in any answer.
+MAX_EDITS = 3
+# Answers this short (after normalization) must be typed exactly.
+EXACT_MAX_CHARS = 3
+# Compiled answers kept in memory.
+ANSWER_CACHE_SIZE = 4096
+
+_LEADING_ARTICLE = re.compile(r"^(?:the|an|a)\s+")
+_PARENTHETICAL = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+# " / " always separates alternatives; a bare slash ("1/2", "km/h") is part of the answer.
+_ALTERNATIVES = re.compile(r"\s+/\s+")
+# " or " and ";" only do when every part is name-like ("Mumbai or Bombay",
+# not "To be or not to be" or "Trick or treat").
+_NAME_ALTERNATIVES = re.compile(r"\s*;\s*|\s+or\s+")
+# Words allowed per name-like alternative.
+NAME_MAX_WORDS = 4
+# Shortest surname accepted on its own.
+SURNAME_MIN_CHARS = 3
+# Trailing parts of a person's name that are not a surname ("King Jr.", "Henry VIII").
+_NAME_SUFFIXES = {"jr", "sr", "junior", "senior", "esq", "phd", "md"}
+# A Roman numeral, in upper case as written in names and titles ("Henry VIII", "Rocky II").
+_ROMAN = re.compile(r"M{0,4}(?:CM|CD|D?C{0,3})(?:XC|XL|L?X{0,3})(?:IX|IV|V?I{0,3})")
+
+Grade = namedtuple("Grade", "correct distance variant")
+Grade.__doc__ = """correct, the edit distance to the closest accepted variant (None if over budget) and that variant."""
+
+
+def normalize_answer(text):
+    """Fold case and accents, drop punctuation and a leading article, collapse spaces."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    chars = []
+    for char in text:
+        category = unicodedata.category(char)
+        if category == "Mn":
+            continue  # Combining accent
+        chars.append(" " if category[0] in "PSZC" else char)
+    return _LEADING_ARTICLE.sub("", " ".join("".join(chars).split()))
+
+
+def _is_name_like(part):
+    """A short capitalized phrase; later words may be short lowercase particles ("Gulf of Mexico")."""
+    words = part.split()
+    if not 0 < len(words) <= NAME_MAX_WORDS or not (words[0][0].isupper() or words[0][0].isdigit()):
+        return False
+    return all(word[0].isupper() or word[0].isdigit() or (word.islower() and len(word) <= 3)
+               for word in words[1:])
+
+
+def answer_variants(answer, kind=None):
+    """The normalized forms of an answer that count as correct."""
+    variants = {normalize_answer(answer), normalize_answer(_PARENTHETICAL.sub(" ", answer))}
+    for part in _ALTERNATIVES.split(_PARENTHETICAL.sub(" ", answer)):
+        variants.add(normalize_answer(part))
+        names = _NAME_ALTERNATIVES.split(part.strip())
+        if len(names) > 1 and all(_is_name_like(name) for name in names):
+            variants.update(normalize_answer(name) for name in names)
+    if (kind or classify_answer(answer)) == "person":
+        words = normalize_answer(answer).split()
+        numerals = _roman_numerals(answer)
+        while words and (words[-1] in _NAME_SUFFIXES or words[-1] in numerals):
+            words.pop()
+        if len(words) > 1 and len(words[-1]) >= SURNAME_MIN_CHARS and words[-1].isalpha():
+            variants.add(words[-1])
+    variants.discard("")
+    return variants
+
+
+def _roman_numerals(answer):
+    """The Roman numerals of an answer, normalized; the first word is never one ("I, Robot")."""
+    return {word.lower() for word in re.findall(r"\w+", answer)[1:] if _ROMAN.fullmatch(word)}
+
+
+def _numeral_tokens(text, romans):
+    """The words of normalized text that must be typed exactly: any with a digit, and Roman numerals."""
+    return [word for word in text.split()
+            if word in romans or any(char.isdigit() for char in word)
+            or (romans and _ROMAN.fullmatch(word.upper()))]
+
+
+def max_edits(variant, kind):
+    """The typo budget for one accepted variant."""
+    if kind in ("year", "number") or len(variant) <= EXACT_MAX_CHARS:
+        return 0
+    return min(len(variant) // TYPO_CHARS, MAX_EDITS)
+
+
+def _char_masks(pattern):
+    masks = {}
+    for position, char in enumerate(pattern):
+        masks[char] = masks.get(char, 0) | 1 << position
+    return masks
+
+
+def bounded_edit_distance(pattern, masks, text, limit):
+    """
+    Levenshtein distance between pattern (with masks = its character bit
+    masks) and text, or None if it is over limit.
+    """
+    m = len(pattern)
+    if abs(m - len(text)) > limit:
+        return None
+    if m == 0:
+        return len(text)
+    full = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = full, 0, m
+    remaining = len(text)
+    for char in text:
+        eq = masks.get(char, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        remaining -= 1
+        # Each character left can lower the score by at most one.
+        if score - remaining > limit:
+            return None
+        ph = (ph << 1 | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    return score if score <= limit else None
+
+
+class CompiledAnswer:
+    """An answer's accepted variants with their budgets and bit masks, ready to grade against."""
+    __slots__ = ("answer", "exact", "variants", "romans")
+
+    def __init__(self, answer):
+        self.answer = answer
+        kind = classify_answer(answer)
+        variants = answer_variants(answer, kind)
+        self.exact = variants
+        self.romans = _roman_numerals(answer)
+        # Numbers and numerals are never typos: "Apollo 13" is not "Apollo 11".
+        self.variants = [(variant, _char_masks(variant), max_edits(variant, kind),
+                          _numeral_tokens(variant, self.romans))
+                         for variant in sorted(variants, key=len, reverse=True)]
+
+    def grade(self, typed):
+        typed = normalize_answer(typed)
+        if typed in self.exact:
+            return Grade(True, 0, typed)
+        best = Grade(False, None, None)
+        typed_numerals = None
+        for variant, masks, limit, numerals in self.variants:
+            if limit:
+                if typed_numerals is None:
+                    typed_numerals = _numeral_tokens(typed, self.romans)
+                if typed_numerals != numerals:
+                    continue
+            distance = bounded_edit_distance(variant, masks, typed, limit)
+            if distance is not None and (best.distance is None or distance < best.distance):
+                best = Grade(True, distance, variant)
+        return best
+
+
+@lru_cache(maxsize=ANSWER_CACHE_SIZE)
+def compile_answer(answer):
+    """The CompiledAnswer for an answer text, cached."""
+    return CompiledAnswer(answer)
+
+
+def grade_answer(typed, answer):
+    """Grade typed text against a card's answer; returns a Grade."""
+    return compile_answer(answer).grade(typed)
@@ -0,0 +1,189 @@
+"""
+Library-wide answer index for picking distractors.
+
+Every distinct answer in the library has a row in answer_index, kept in
+step with the cards table by triggers (see simple_db), so importing or
+deleting a deck updates it incrementally. Each answer is classified by its
+shape (a year, a number, a person-like name, a place, a single proper name,
+a short phrase or longer text) and broken into word n-grams in
+answer_tokens. Triggers can only record the raw answer; the classification
+and tokens are filled in from Python by index_pending_answers, which the
+write paths call after adding cards.
+
+AnswerLookup answers "give me answers that look like this one" from any
+deck: answers sharing words with the correct answer first, then random
+answers of the same kind, all through indexed lookups.
+"""
+
+import random
+import re
+
+ANSWER_KINDS = ("year", "number", "person", "place", "name", "phrase", "text")
+
+# Answers classified per round trip by index_pending_answers.
+INDEX_BATCH_SIZE = 1000
+# Longest answer (in words) that still counts as a short phrase.
+PHRASE_MAX_WORDS = 4
+# Word n-gram sizes stored per answer.
+TOKEN_NGRAM_SIZES = (1, 2)
+# Random probes per lookup before giving up on finding more answers.
+LOOKUP_PROBES = 24
+# Consecutive same-kind answers read per random probe.
+LOOKUP_WINDOW = 8
+# Postings read per token, so common words cannot make a lookup slow.
+TOKEN_POSTING_LIMIT = 64
+
+_YEAR = re.compile(r"^(c\.\s*)?(\d{1,4})(s|\s*(?:AD|BC|BCE|CE))?$", re.IGNORECASE)
+_NUMBER = re.compile(r"^[-+~≈]?[$€£]?\d[\d,]*(?:\.\d+)?\s*(?:%|[a-zA-Z°µ/²³]{1,12})?$")
+_WORD = re.compile(r"\w+", re.UNICODE)
+_NAME_WORD = re.compile(r"[\w'’.-]+", re.UNICODE)
+_PLACE_WORDS = {
+    "city", "river", "mountain", "mountains", "mount", "lake", "ocean", "sea", "island", "islands",
+    "republic", "kingdom", "state", "states", "county", "province", "desert", "valley", "bay",
+    "gulf", "strait", "peninsula", "canyon", "falls", "north", "south", "east", "west", "new",
+    "saint", "san", "st", "port", "fort", "cape", "empire",
+}
+_NAME_PARTICLES = {"de", "da", "van", "von", "der", "la", "le", "di", "du", "bin", "ibn", "al", "of", "the"}
+_STOPWORDS = {"the", "a", "an", "of", "and", "or", "in", "on", "to", "for", "is", "by", "with", "at"}
+
+
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+def answer_key(text):
+    """
+    The key answer_index rows are stored under: the triggers' SQL
+    lower(trim(back)), reproduced exactly. SQLite's trim() strips only
+    spaces and its lower() folds only ASCII letters, so str.strip() and
+    str.lower() would disagree with the index for tabs, newlines and
+    non-ASCII answers.
+    """
+    return text.strip(" ").translate(_ASCII_LOWER)
+
+
+def classify_answer(text):
+    """Classify an answer by its shape; returns one of ANSWER_KINDS."""
+    text = text.strip()
+    year = _YEAR.match(text)
+    if year:
+        circa, digits, suffix = year.groups()
+        # A bare number is only a year if it has four digits in range.
+        if circa or suffix or (len(digits) == 4 and 1000 <= int(digits) <= 2100):
+            return "year"
+    if _NUMBER.match(text):
+        return "number"
+    words = text.split()
+    if len(words) > PHRASE_MAX_WORDS:
+        return "text"
+    capitalized = [word for word in words if word[:1].isupper()]
+    significant = [word for word in words if word.lower() not in _NAME_PARTICLES]
+    looks_like_name = all(_NAME_WORD.fullmatch(word.rstrip(",")) for word in words)
+    if significant and looks_like_name and len(capitalized) == len(significant):
+        if any(word.lower().strip(".,") in _PLACE_WORDS for word in words) or "," in text:
+            return "place"
+        if len(significant) == 1:
+            return "name"
+        if 2 <= len(significant) <= 4:
+            return "person"
+    return "phrase"
+
+
+def answer_tokens(text):
+    """Word n-grams of an answer, without stopwords on their own."""
+    words = [word.lower() for word in _WORD.findall(text)]
+    tokens = set()
+    for size in TOKEN_NGRAM_SIZES:
+        for start in range(len(words) - size + 1):
+            gram = words[start:start + size]
+            if size == 1 and (gram[0] in _STOPWORDS or len(gram[0]) < 2):
+                continue
+            tokens.add(" ".join(gram))
+    return tokens
+
+
+def index_pending_answers(conn, batch_size=INDEX_BATCH_SIZE):
+    """
+    Classify and tokenize answers the triggers added since the last call.
+    Runs inside the caller's transaction. Returns how many were indexed.
+    """
+    indexed = 0
+    while True:
+        rows = conn.execute("SELECT id, answer FROM answer_index WHERE kind IS NULL LIMIT ?",
+                            (batch_size,)).fetchall()
+        if not rows:
+            return indexed
+        conn.executemany("UPDATE answer_index SET kind = ? WHERE id = ?",
+                         [(classify_answer(answer), answer_id) for answer_id, answer in rows])
+        conn.executemany("INSERT OR IGNORE INTO answer_tokens (token, answer_id) VALUES (?, ?)",
+                         [(token, answer_id) for answer_id, answer in rows for token in answer_tokens(answer)])
+        indexed += len(rows)
+
+
+class AnswerLookup:
+    """
+    Finds same-kind answers from across the library. Holds one read
+    connection; use as a context manager or call close().
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._bounds = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def distractors(self, answer, count, exclude=()):
+        """
+        Up to count distinct answers of the same kind as answer, excluding
+        answer itself and anything in exclude. Answers that share words with
+        it (same topic) come first, the rest are random.
+        """
+        kind = classify_answer(answer)
+        skip = {answer_key(answer)} | {answer_key(text) for text in exclude}
+        picked = []
+
+        if kind not in ("year", "number"):
+            overlap = {}
+            for token in answer_tokens(answer):
+                for (text,) in self.conn.execute('''
+                        SELECT a.answer FROM answer_tokens t
+                        JOIN answer_index a ON a.id = t.answer_id
+                        WHERE t.token = ? AND a.kind = ? LIMIT ?
+                        ''', (token, kind, TOKEN_POSTING_LIMIT)):
+                    overlap[text] = overlap.get(text, 0) + 1
+            for text in sorted(overlap, key=overlap.get, reverse=True):
+                if self._take(text, skip, picked, count):
+                    return picked
+
+        low, high = self._id_range(kind)
+        if low is None:
+            return picked
+        # Ids of one kind come in runs (one per imported deck), so each probe
+        # reads a short window from a random point rather than a single row.
+        for _ in range(LOOKUP_PROBES):
+            window = [text for (text,) in self.conn.execute(
+                "SELECT answer FROM answer_index WHERE kind = ? AND id >= ? ORDER BY id LIMIT ?",
+                (kind, random.randint(low, high), LOOKUP_WINDOW))]
+            random.shuffle(window)
+            if any(self._take(text, skip, picked, count) for text in window):
+                break
+        return picked
+
+    def _take(self, text, skip, picked, count):
+        key = answer_key(text)
+        if key not in skip:
+            skip.add(key)
+            picked.append(text)
+        return len(picked) >= count
+
+    def _id_range(self, kind):
+        if kind not in self._bounds:
+            self._bounds[kind] = self.conn.execute(
+                "SELECT MIN(id), MAX(id) FROM answer_index WHERE kind = ?", (kind,)).fetchone()
+        return self._bounds[kind]
@@ -0,0 +1,115 @@
+"""
+Compact, column-oriented card storage.
+
+Loading a deck as one dict per card costs a dict, three or four strings and
+a parsed distractor list per row. CardColumns keeps the same data in
+parallel columns instead: IDs in an array of 64-bit ints, fronts and
+(interned) backs in plain lists, and distractor lists only for the cards
+that have any. Card is a __slots__ view onto one row, so iterating does not
+allocate a dict per card either.
+"""
+
+import sys
+from array import array
+
+
+class Card:
+    """A read-only view of one row of a CardColumns."""
+    __slots__ = ("_columns", "_index")
+
+    def __init__(self, columns, index):
+        self._columns = columns
+        self._index = index
+
+    @property
+    def id(self):
+        return self._columns.ids[self._index]
+
+    @property
+    def front(self):
+        return self._columns.fronts[self._index]
+
+    @property
+    def back(self):
+        return self._columns.backs[self._index]
+
+    @property
+    def distractors(self):
+        return self._columns.distractors(self._index)
+
+    def to_dict(self):
+        card = {"id": self.id, "front": self.front, "back": self.back}
+        distractors = self.distractors
+        if distractors is not None:
+            card["distractors"] = distractors
+        return card
+
+    def __repr__(self):
+        return f"Card(id={self.id!r}, front={self.front!r}, back={self.back!r})"
+
+
+class CardColumns:
+    """
+    A deck's cards stored column-wise.
+
+    Answers repeat a lot across cards ("True", years, names), so backs are
+    interned and duplicates share one string object. Distractors are kept in
+    a dict keyed by row, so cards without any cost nothing.
+    """
+    __slots__ = ("ids", "fronts", "backs", "_distractors")
+
+    def __init__(self):
+        self.ids = array("q")
+        self.fronts = []
+        self.backs = []
+        self._distractors = {}
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build from (id, front, back, distractor) rows of a cards LEFT JOIN
+        distractors query, ordered by card and position: one row per
+        distractor, with distractor None for cards that have none.
+        """
+        columns = cls()
+        last_id = None
+        for card_id, front, back, distractor in rows:
+            if card_id != last_id:
+                columns.append(card_id, front, back)
+                last_id = card_id
+            if distractor is not None:
+                columns._distractors.setdefault(len(columns.ids) - 1, []).append(distractor)
+        return columns
+
+    @classmethod
+    def from_dicts(cls, cards):
+        """Build from the legacy list-of-dicts card format."""
+        columns = cls()
+        for card in cards:
+            columns.append(card.get("id", 0), card["front"], card["back"], card.get("distractors"))
+        return columns
+
+    def append(self, card_id, front, back, distractors=None):
+        self.ids.append(card_id)
+        self.fronts.append(front)
+        self.backs.append(sys.intern(back))
+        if distractors:
+            self._distractors[len(self.ids) - 1] = list(distractors)
+
+    def distractors(self, index):
+        """The card's distractor list, or None if it has none."""
+        return self._distractors.get(index)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.ids)
+        if not 0 <= index < len(self.ids):
+            raise IndexError("card index out of range")
+        return Card(self, index)
+
+    def __iter__(self):
+        for index in range(len(self.ids)):
+            yield Card(self, index)
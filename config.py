@@ -20,7 +20,9 @@ APP_NAME = "ZapCards"
 
 # --- Paths ---
 BASE_DIR = Path(__file__).parent
-DB_PATH = BASE_DIR / "data" / "zapcards.db"
+# ZAPCARDS_DB_PATH points the app at another database (a copy, or the
+# synthetic databases ui_benchmarks builds).
+DB_PATH = Path(os.getenv('ZAPCARDS_DB_PATH', BASE_DIR / "data" / "zapcards.db"))
 ASSETS_PATH = BASE_DIR / "assets"
 
 # --- UI Theme (Stranger Things 80s Aesthetic) ---
@@ -55,12 +57,75 @@ THEME = {
 # For security, use environment variable or replace with your actual key
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', 'YOUR_API_KEY_HERE')
 
+# Requests per minute your Gemini quota allows (the free tier is 15 for flash
+# models). All generation jobs share this budget.
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv('GEMINI_REQUESTS_PER_MINUTE', '15'))
+# Attempts per request before giving up on quota/server errors.
+GEMINI_MAX_ATTEMPTS = int(os.getenv('GEMINI_MAX_ATTEMPTS', '5'))
+
 # --- Spaced Repetition ---
 # Delays in days for each Leitner box.
 # Box 0 is for new/failed cards, so the delay is short.
 LEITNER_BOX_DELAYS = {0: 1, 1: 3, 2: 7, 3: 14, 4: 30}
 LEITNER_BOX_COUNT = len(LEITNER_BOX_DELAYS)
 
+# --- Quiz ---
+QUIZ_SIZE = 10
+# How quiz cards are picked: "due" (overdue first, then new, then random),
+# "weighted" (favours low Leitner boxes) or "uniform".
+QUIZ_SAMPLING = os.getenv('ZAPCARDS_QUIZ_SAMPLING', 'due')
+# "choice" (multiple choice) or "typed" (type the answer, graded with typo
+# tolerance by answer_grader); the quiz view can switch at any time.
+QUIZ_ANSWER_MODE = os.getenv('ZAPCARDS_ANSWER_MODE', 'choice')
+# Most cards in one mixed review session across decks (see review_session).
+REVIEW_SESSION_SIZE = int(os.getenv('ZAPCARDS_SESSION_SIZE', '50'))
+
+# --- Prefetch ---
+# After a quiz that went well, generate the next difficulty of the deck in
+# the background so "Regenerate" at that difficulty is instant. Off by
+# default because it spends API quota on guesses.
+PREFETCH_ENABLED = os.getenv('ZAPCARDS_PREFETCH', '0') == '1'
+# Quiz accuracy (0.0 - 1.0) that makes a harder version a likely next step.
+PREFETCH_MIN_ACCURACY = 0.7
+# Prefetch generations allowed per 24 hours.
+PREFETCH_DAILY_BUDGET = int(os.getenv('ZAPCARDS_PREFETCH_BUDGET', '3'))
+# Prefetched decks older than this are discarded unused.
+PREFETCH_CACHE_DAYS = 7
+
+# --- Backups ---
+# Rotating online snapshots of the database (see db_backup), kept next to it.
+BACKUP_DIR = DB_PATH.parent / "backups"
+# Snapshots kept; older ones are deleted after each new snapshot.
+BACKUP_KEEP = int(os.getenv('ZAPCARDS_BACKUP_KEEP', '7'))
+# Gzip snapshots: much smaller, but slower to take and restore.
+BACKUP_COMPRESS = os.getenv('ZAPCARDS_BACKUP_COMPRESS', '0') == '1'
+# A snapshot is taken at startup once the newest is older than this.
+BACKUP_INTERVAL_HOURS = 24
+
+# --- Maintenance ---
+# Seconds without database writes before maintenance may run.
+MAINTENANCE_IDLE_SECONDS = 120
+# Time one maintenance run may take, in seconds. Steps that would not fit
+# are left for the next idle period.
+MAINTENANCE_BUDGET_SECONDS = float(os.getenv('ZAPCARDS_MAINTENANCE_BUDGET', '5'))
+
+# --- Debugging ---
+# Record live QObjects per class and Python allocations at every navigation
+# and print a leak report on exit (see ui_instrumentation). Slow; debug only.
+UI_INSTRUMENTATION = os.getenv('ZAPCARDS_UI_INSTRUMENTATION', '0') == '1'
+
+# --- Shared deck libraries ---
+# Read-only deck databases shared by everyone on the machine (a school's
+# curated library, say), used alongside the user's own database without
+# being copied into it. Every *.db in LIBRARY_DIR is attached, plus any
+# files listed in ZAPCARDS_LIBRARIES (separated by os.pathsep).
+LIBRARY_DIR = BASE_DIR / "libraries"
+LIBRARY_PATHS = sorted(LIBRARY_DIR.glob("*.db")) + [
+    Path(path) for path in os.getenv('ZAPCARDS_LIBRARIES', '').split(os.pathsep) if path]
+# Bytes of each library SQLite may memory-map. Mapped pages are read straight
+# from the OS page cache, which every process using the library shares.
+LIBRARY_MMAP_SIZE = 256 * 1024 * 1024
+
 # --- 80s Aesthetic Elements ---
 STRANGER_THINGS_EMOJIS = {
     "lightning": "⚡",
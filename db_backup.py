@@ -0,0 +1,317 @@
+"""
+Online backups of the ZapCards database.
+
+Copying zapcards.db with a file copy while the app writes to it can produce
+a torn, corrupt copy (and misses whatever is still in the WAL). Snapshots
+are taken with SQLite's online backup API instead, a bounded number of
+pages per step with a short pause in between, on a background thread. The
+source connection holds one read transaction for the whole copy, which pins
+a single WAL snapshot: the copy is consistent, writers are never blocked,
+and the backup does not restart every time a review is saved.
+
+Each snapshot is checked with PRAGMA quick_check, optionally gzipped, and
+the oldest are rotated out. Restoring swaps a verified copy into place with
+a single rename and is meant to run while the app is closed:
+
+    python db_backup.py snapshot [--compress]
+    python db_backup.py list
+    python db_backup.py restore data/backups/zapcards-20240101-120000.db
+"""
+
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from pathlib import Path
+
+from config import BACKUP_DIR, BACKUP_KEEP, BACKUP_COMPRESS
+
+# Pages copied per backup step (4 MiB with the default 4 KiB pages).
+BACKUP_PAGES_PER_STEP = 1024
+# Pause between steps, in seconds, so the copy never hogs the disk.
+BACKUP_STEP_PAUSE = 0.002
+# Steps between flushes of the copy to disk. Flushing as it goes, rather
+# than one multi-GB fsync at the end, keeps the app's own commits from
+# stalling behind it.
+BACKUP_SYNC_STEPS = 16
+# Chunk size for gzip compression and decompression.
+COPY_BUFFER_SIZE = 1024 * 1024
+# Speed matters more than the last few percent of size for snapshots.
+GZIP_LEVEL = 1
+SNAPSHOT_PREFIX = "zapcards-"
+SNAPSHOT_TIME_FORMAT = "%Y%m%d-%H%M%S"
+
+
+class BackupError(Exception):
+    """A snapshot could not be taken, verified or restored."""
+
+
+class BackupCancelled(BackupError):
+    """The snapshot was cancelled before it finished."""
+
+
+def _quick_check(path):
+    conn = sqlite3.connect(f"file:{Path(path).resolve()}?mode=ro", uri=True)
+    try:
+        result = conn.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        conn.close()
+    if result != "ok":
+        raise BackupError(f"{path} failed its integrity check: {result}")
+
+
+def _gzip_file(source, target):
+    with open(source, "rb") as src, gzip.open(target, "wb", compresslevel=GZIP_LEVEL) as dst:
+        shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+
+
+def _gunzip_file(source, target):
+    with gzip.open(source, "rb") as src, open(target, "wb") as dst:
+        shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+
+
+def backup_database(source_path, target_path, pages_per_step=BACKUP_PAGES_PER_STEP,
+                    pause=BACKUP_STEP_PAUSE, progress=None, cancel_event=None):
+    """
+    Copy a live database into target_path with the online backup API.
+
+    progress(copied_pages, total_pages) is called after every step. Setting
+    cancel_event stops the copy with BackupCancelled. The copy is written
+    to a temporary file and renamed into place once complete.
+    """
+    target_path = Path(target_path)
+    partial = target_path.with_name(target_path.name + ".partial")
+    source = sqlite3.connect(source_path, isolation_level=None)
+    sync_fd = None
+    try:
+        # Pin one WAL snapshot for the whole copy; without it every commit
+        # by the app would restart the backup from the first page.
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        target = sqlite3.connect(partial)
+        # Flushed by hand below instead.
+        target.execute("PRAGMA synchronous = OFF")
+        sync_fd = os.open(partial, os.O_RDONLY)
+        steps = 0
+
+        def on_step(status, remaining, total):
+            nonlocal steps
+            if cancel_event is not None and cancel_event.is_set():
+                raise BackupCancelled("The backup was cancelled.")
+            steps += 1
+            if steps % BACKUP_SYNC_STEPS == 0:
+                os.fsync(sync_fd)
+            if progress is not None:
+                progress(total - remaining, total)
+            if remaining and pause:
+                time.sleep(pause)
+
+        try:
+            source.backup(target, pages=pages_per_step, progress=on_step)
+            # The copy inherits WAL mode; a snapshot is a single file.
+            target.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            target.close()
+            source.execute("COMMIT")
+        os.fsync(sync_fd)
+        os.replace(partial, target_path)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    finally:
+        if sync_fd is not None:
+            os.close(sync_fd)
+        source.close()
+    return target_path
+
+
+class BackupManager:
+    """
+    Takes, rotates and restores snapshots of one database.
+
+    create_snapshot() runs on the calling thread; start_snapshot() runs it
+    on a background thread and returns a Future for the snapshot path. Only
+    one snapshot runs at a time.
+    """
+
+    def __init__(self, source_path=None, backup_dir=BACKUP_DIR, keep=BACKUP_KEEP, compress=BACKUP_COMPRESS):
+        self._source_path = source_path
+        self.backup_dir = Path(backup_dir)
+        self.keep = keep
+        self.compress = compress
+        self._lock = threading.Lock()
+        self._thread = None
+        self._cancel = threading.Event()
+
+    @property
+    def source_path(self):
+        if self._source_path is not None:
+            return Path(self._source_path)
+        from simple_db import db  # The live database, wherever it was configured
+        return Path(db.db_path)
+
+    def snapshots(self):
+        """Snapshot files, newest first."""
+        if not self.backup_dir.is_dir():
+            return []
+        found = [path for path in self.backup_dir.glob(f"{SNAPSHOT_PREFIX}*")
+                 if path.name.endswith((".db", ".db.gz"))]
+        return sorted(found, key=lambda path: path.name, reverse=True)
+
+    def latest_age_hours(self):
+        """Hours since the newest snapshot was taken, or None if there is none."""
+        snapshots = self.snapshots()
+        if not snapshots:
+            return None
+        return (time.time() - snapshots[0].stat().st_mtime) / 3600
+
+    def create_snapshot(self, progress=None):
+        """Take, verify, compress (if enabled) and rotate. Returns the snapshot path."""
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        name = f"{SNAPSHOT_PREFIX}{datetime.now().strftime(SNAPSHOT_TIME_FORMAT)}.db"
+        path = self.backup_dir / name
+        started = time.perf_counter()
+        backup_database(self.source_path, path, progress=progress, cancel_event=self._cancel)
+        try:
+            _quick_check(path)
+            if self.compress:
+                compressed = path.with_name(name + ".gz")
+                _gzip_file(path, compressed)
+                path.unlink()
+                path = compressed
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        print(f"Database snapshot {path.name} ({path.stat().st_size / 1e6:.1f} MB) "
+              f"taken in {time.perf_counter() - started:.1f}s")
+        self.rotate()
+        return path
+
+    def start_snapshot(self, progress=None) -> Future:
+        """Take a snapshot on a background thread."""
+        future = Future()
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                future.set_exception(BackupError("A backup is already running."))
+                return future
+            self._cancel.clear()
+
+            def run():
+                if not future.set_running_or_notify_cancel():
+                    return
+                try:
+                    future.set_result(self.create_snapshot(progress))
+                except BaseException as e:
+                    future.set_exception(e)
+
+            self._thread = threading.Thread(target=run, name="zapcards-backup", daemon=True)
+            self._thread.start()
+        return future
+
+    def start_if_due(self, interval_hours) -> Future:
+        """start_snapshot() if the newest snapshot is older than interval_hours, else None."""
+        age = self.latest_age_hours()
+        if age is not None and age < interval_hours:
+            return None
+        return self.start_snapshot()
+
+    def shutdown(self, timeout=5.0):
+        """Cancel a running snapshot and wait for its thread."""
+        self._cancel.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def rotate(self):
+        """Delete all but the newest keep snapshots."""
+        for old in self.snapshots()[self.keep:]:
+            old.unlink(missing_ok=True)
+            print(f"Removed old snapshot {old.name}")
+
+    def restore(self, snapshot, target_path=None, verify=True):
+        """
+        Replace the database with a snapshot. Only while the app is closed.
+
+        The snapshot is copied (or decompressed) next to the database and,
+        unless verify is False, checked again (snapshots are already checked
+        when taken; skipping it makes restoring a large database several
+        times faster). It is then renamed over the database in one step; the
+        database it replaces is kept as <name>.before-restore. Stale
+        -wal/-shm files are removed so SQLite cannot apply the old WAL to
+        the restored file.
+        """
+        snapshot = Path(snapshot)
+        target = Path(target_path) if target_path is not None else self.source_path
+        if not snapshot.is_file():
+            raise BackupError(f"No snapshot at {snapshot}")
+        staged = target.with_name(target.name + ".restoring")
+        try:
+            if snapshot.name.endswith(".gz"):
+                _gunzip_file(snapshot, staged)
+            else:
+                shutil.copyfile(snapshot, staged)
+            if verify:
+                _quick_check(staged)
+            if target.exists():
+                # Checkpoint first, so the kept copy is complete on its own.
+                conn = sqlite3.connect(target)
+                try:
+                    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                finally:
+                    conn.close()
+                os.replace(target, target.with_name(target.name + ".before-restore"))
+            for suffix in ("-wal", "-shm"):
+                target.with_name(target.name + suffix).unlink(missing_ok=True)
+            os.replace(staged, target)
+        except BaseException:
+            staged.unlink(missing_ok=True)
+            raise
+        print(f"Restored {target} from {snapshot.name}")
+        return target
+
+
+# Global backup manager for the app database
+backups = BackupManager()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Back up and restore the ZapCards database.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    snapshot_parser = subparsers.add_parser("snapshot", help="take a snapshot now")
+    snapshot_parser.add_argument("--compress", action="store_true", help="gzip the snapshot")
+    subparsers.add_parser("list", help="list snapshots, newest first")
+    restore_parser = subparsers.add_parser("restore", help="replace the database with a snapshot (app closed)")
+    restore_parser.add_argument("snapshot", help="snapshot file to restore")
+    restore_parser.add_argument("--skip-check", action="store_true",
+                                help="do not re-check the snapshot (it was checked when taken)")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "snapshot":
+            if args.compress:
+                backups.compress = True
+
+            def show_progress(copied, total):
+                print(f"\r{copied}/{total} pages", end="", flush=True)
+
+            path = backups.create_snapshot(progress=show_progress)
+            print(f"\nSaved {path}")
+        elif args.command == "list":
+            for path in backups.snapshots():
+                print(f"{path.name}  {path.stat().st_size / 1e6:10.1f} MB")
+        elif args.command == "restore":
+            backups.restore(args.snapshot, verify=not args.skip_check)
+    except (OSError, sqlite3.Error, BackupError) as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
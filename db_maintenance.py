@@ -0,0 +1,307 @@
+"""
+Idle-time database maintenance.
+
+Generating, regenerating and deleting decks churns through cards. That
+leaves free pages in the file, a WAL that keeps growing and planner
+statistics describing a database that no longer exists. MaintenanceScheduler
+waits until the database has been idle for MAINTENANCE_IDLE_SECONDS and then
+runs whichever of these tasks are due, within MAINTENANCE_BUDGET_SECONDS:
+
+  convert     one-off VACUUM to auto_vacuum=INCREMENTAL, for databases too
+              large to convert at startup, if it fits the budget
+  optimize    PRAGMA optimize (a bounded ANALYZE) once enough rows changed
+  vacuum      PRAGMA incremental_vacuum, a few pages per step, once enough
+              pages are free
+  checkpoint  PRAGMA wal_checkpoint(TRUNCATE) once the WAL is large
+  integrity   PRAGMA quick_check once a week, on its own read connection;
+              a check that runs out of time is retried a day later
+
+Writes go through the database writer one short step at a time, so reviews
+saved meanwhile wait for at most one step. File sizes and a few query
+timings are logged before and after every run.
+
+    python db_maintenance.py stats
+    python db_maintenance.py run [--budget SECONDS] [--force]
+"""
+
+import argparse
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from config import MAINTENANCE_IDLE_SECONDS, MAINTENANCE_BUDGET_SECONDS, QUIZ_SIZE
+from simple_db import db, convert_to_incremental_vacuum
+from db_writer import writer
+from qt_futures import watch_future
+
+# Rows changed since the last optimize that make the statistics stale.
+OPTIMIZE_CHURN = 5000
+# Optimize anyway after this long if anything changed at all.
+OPTIMIZE_MAX_AGE_HOURS = 7 * 24
+# Rows ANALYZE samples per index during optimize.
+ANALYSIS_LIMIT = 1000
+# Free pages (and share of the file) worth vacuuming.
+VACUUM_MIN_FREE_PAGES = 256
+VACUUM_MIN_FREE_FRACTION = 0.05
+# Pages released per incremental_vacuum step.
+VACUUM_STEP_PAGES = 1024
+# WAL size that triggers a checkpoint.
+CHECKPOINT_WAL_BYTES = 16 * 1024 * 1024
+INTEGRITY_INTERVAL_HOURS = 7 * 24
+# Wait before retrying an integrity check that ran out of time.
+INTEGRITY_RETRY_HOURS = 24
+# Rough VACUUM throughput, to decide whether a conversion fits the budget.
+VACUUM_BYTES_PER_SECOND = 50 * 1024 * 1024
+# How often the scheduler looks for idle time, in milliseconds.
+CHECK_INTERVAL_MS = 30 * 1000
+
+
+def database_stats():
+    """Page counts and on-disk sizes of the main database."""
+    conn = db.get_connection()
+    try:
+        stats = {name: conn.execute(f"PRAGMA main.{name}").fetchone()[0]
+                 for name in ("page_size", "page_count", "freelist_count", "auto_vacuum")}
+    finally:
+        conn.close()
+    path = Path(db.db_path)
+    wal = path.with_name(path.name + "-wal")
+    stats["file_bytes"] = path.stat().st_size if path.exists() else 0
+    stats["wal_bytes"] = wal.stat().st_size if wal.exists() else 0
+    return stats
+
+
+def time_queries(repeat=3):
+    """Median time in ms of the queries the UI waits on: the deck list and a quiz sample."""
+    timings = {}
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        decks = db.get_all_decks()
+        samples.append((time.perf_counter() - started) * 1000)
+    timings["deck list"] = statistics.median(samples)
+    own = [deck for deck in decks if deck.get("library") is None]
+    if own:
+        largest = max(own, key=lambda deck: deck["card_count"])["id"]
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            db.sample_deck_cards(largest, QUIZ_SIZE, "due")
+            samples.append((time.perf_counter() - started) * 1000)
+        timings["quiz sample"] = statistics.median(samples)
+    return timings
+
+
+def due_tasks(stats, state, budget, now=None, force=False):
+    """The tasks worth running now, in the order they should run."""
+    now = time.time() if now is None else now
+    due = []
+    # Databases too large to convert within the budget need a forced run.
+    if stats["auto_vacuum"] != 2 and stats["file_bytes"] / VACUUM_BYTES_PER_SECOND <= budget:
+        due.append("convert")
+    churn = state.get("churn", 0)
+    optimize_age = (now - state.get("last_optimize", 0)) / 3600
+    if force or churn >= OPTIMIZE_CHURN or (churn and optimize_age >= OPTIMIZE_MAX_AGE_HOURS):
+        due.append("optimize")
+    free = stats["freelist_count"]
+    if stats["auto_vacuum"] == 2 and free and (force or (
+            free >= VACUUM_MIN_FREE_PAGES and free >= VACUUM_MIN_FREE_FRACTION * stats["page_count"])):
+        due.append("vacuum")
+    if force or stats["wal_bytes"] >= CHECKPOINT_WAL_BYTES:
+        due.append("checkpoint")
+    if force or ((now - state.get("last_integrity_check", 0)) / 3600 >= INTEGRITY_INTERVAL_HOURS
+                 and (now - state.get("last_integrity_attempt", 0)) / 3600 >= INTEGRITY_RETRY_HOURS):
+        due.append("integrity")
+    return due
+
+
+def _optimize(conn):
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("PRAGMA optimize")
+    db.set_maintenance_state({"churn": 0, "last_optimize": time.time()}, conn=conn)
+
+
+def _vacuum_step(pages, conn):
+    # Every sqlite3_step frees one page, and execute() steps a statement
+    # without result columns only once; executescript() runs it to the end
+    # (and commits, so this runs outside the writer's transactions).
+    conn.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+    return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def _checkpoint(conn):
+    return conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+
+
+def integrity_check(budget):
+    """
+    PRAGMA quick_check on a read-only connection, interrupted once budget
+    seconds have passed. Returns the problems found ([] if none), or None if
+    it ran out of time.
+    """
+    conn = sqlite3.connect(f"file:{Path(db.db_path).resolve()}?mode=ro", uri=True)
+    deadline = time.monotonic() + budget
+    conn.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+    try:
+        rows = [row[0] for row in conn.execute("PRAGMA quick_check")]
+    except sqlite3.OperationalError as e:
+        if "interrupt" in str(e):
+            return None
+        raise
+    finally:
+        conn.close()
+    return [] if rows == ["ok"] else rows
+
+
+def run_maintenance(budget=MAINTENANCE_BUDGET_SECONDS, force=False, cancel_event=None):
+    """
+    Run the due tasks within budget seconds. Returns a report dict with the
+    tasks run, sizes and query timings before and after, and the integrity
+    check result (None if it did not run or did not finish).
+    """
+    started = time.monotonic()
+    deadline = started + budget
+    before = database_stats()
+    tasks = due_tasks(before, db.get_maintenance_state(), budget, force=force)
+    report = {"tasks": [], "before": before, "after": before, "integrity": None}
+    if not tasks:
+        return report
+    report["timings_before"] = time_queries()
+
+    for task in tasks:
+        if time.monotonic() >= deadline or (cancel_event is not None and cancel_event.is_set()):
+            print(f"Maintenance: out of time, leaving {task} for later")
+            break
+        task_started = time.monotonic()
+        if task == "convert":
+            writer.submit_outside_transaction(convert_to_incremental_vacuum).result()
+        elif task == "optimize":
+            writer.submit(_optimize).result()
+        elif task == "vacuum":
+            free = before["freelist_count"]
+            while free and time.monotonic() < deadline:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                free = writer.submit_outside_transaction(_vacuum_step, VACUUM_STEP_PAGES).result()
+        elif task == "checkpoint":
+            busy, _, _ = writer.submit_outside_transaction(_checkpoint).result()
+            if busy:
+                print("Maintenance: checkpoint could not finish while the database was being read")
+        elif task == "integrity":
+            problems = integrity_check(max(deadline - time.monotonic(), 0.1))
+            report["integrity"] = problems
+            if problems is None:
+                # Back off rather than rerunning it at every idle check.
+                writer.submit(db.set_maintenance_state, {"last_integrity_attempt": time.time()}).result()
+                print(f"Maintenance: integrity check ran out of time; retrying in {INTEGRITY_RETRY_HOURS} hours "
+                      "(python db_maintenance.py run --force --budget SECONDS runs it with more time)")
+            else:
+                writer.submit(db.set_maintenance_state, {"last_integrity_check": time.time()}).result()
+                if problems:
+                    print(f"Maintenance: INTEGRITY CHECK FAILED: {'; '.join(problems[:10])}")
+        report["tasks"].append(task)
+        print(f"Maintenance: {task} took {time.monotonic() - task_started:.2f}s")
+
+    after = report["after"] = database_stats()
+    timings_after = report["timings_after"] = time_queries()
+    timings = ", ".join(f"{name} {report['timings_before'][name]:.1f} -> {timings_after.get(name, 0):.1f} ms"
+                        for name in report["timings_before"])
+    print(f"Maintenance finished in {time.monotonic() - started:.1f}s: "
+          f"file {before['file_bytes'] / 1e6:.1f} -> {after['file_bytes'] / 1e6:.1f} MB, "
+          f"free pages {before['freelist_count']} -> {after['freelist_count']}, "
+          f"WAL {before['wal_bytes'] / 1e6:.1f} -> {after['wal_bytes'] / 1e6:.1f} MB; {timings}")
+    return report
+
+
+class MaintenanceScheduler(QObject):
+    """
+    Runs run_maintenance() on a background thread whenever the database
+    writer has been idle long enough. finished carries the report.
+    """
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+    def __init__(self, parent=None, idle_seconds=MAINTENANCE_IDLE_SECONDS, budget=MAINTENANCE_BUDGET_SECONDS):
+        super().__init__(parent)
+        self.idle_seconds = idle_seconds
+        self.budget = budget
+        self._future = None
+        self._thread = None
+        self._cancel = threading.Event()
+        self._timer = QTimer(self)
+        self._timer.setInterval(CHECK_INTERVAL_MS)
+        self._timer.timeout.connect(self.check)
+
+    def start(self):
+        self._timer.start()
+
+    def is_running(self):
+        return self._future is not None and not self._future.done()
+
+    def check(self):
+        """Start a run if the database is idle and no run is in progress."""
+        if self.is_running() or time.monotonic() - writer.last_activity < self.idle_seconds:
+            return
+        future = self._future = Future()
+
+        def run():
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(run_maintenance(self.budget, cancel_event=self._cancel))
+            except Exception as e:
+                future.set_exception(e)
+
+        self._thread = threading.Thread(target=run, name="zapcards-maintenance", daemon=True)
+        self._thread.start()
+        watch_future(future, self.finished.emit, self.failed.emit, parent=self)
+
+    def shutdown(self, timeout=5.0):
+        """Stop scheduling, and let a running step finish."""
+        self._timer.stop()
+        self._cancel.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def main(argv=None):
+    from simple_db import init_db
+
+    parser = argparse.ArgumentParser(description="Inspect and maintain the ZapCards database.")
+    parser.add_argument("command", choices=["stats", "run"],
+                        help="stats: sizes and due tasks; run: run the due tasks now")
+    parser.add_argument("--budget", type=float, default=MAINTENANCE_BUDGET_SECONDS, help="time budget in seconds")
+    parser.add_argument("--force", action="store_true", help="run every task, due or not")
+    args = parser.parse_args(argv)
+
+    init_db()
+    try:
+        if args.command == "stats":
+            stats = database_stats()
+            for name, value in stats.items():
+                print(f"{name:<16}{value}")
+            state = db.get_maintenance_state()
+            print(f"{'churn':<16}{int(state.get('churn', 0))}")
+            print(f"{'due':<16}{', '.join(due_tasks(stats, state, args.budget)) or 'nothing'}")
+            if stats["auto_vacuum"] != 2:
+                print("Not using incremental auto-vacuum yet; 'run --force' converts the database.")
+        else:
+            # A forced run is the way to convert databases too large for the budget.
+            budget = float("inf") if args.force else args.budget
+            report = run_maintenance(budget, force=args.force)
+            if not report["tasks"]:
+                print("Nothing to do.")
+            if report["integrity"]:
+                return 1
+    finally:
+        writer.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Non-blocking database reads for the views.
+
+Views submit read functions (usually SimpleDB methods) to a small thread
+pool and get the result back through a Qt slot on the GUI thread, so the
+event loop keeps painting while SQLite works. Every request belongs to a
+named channel; a newer request on the same channel, or an explicit cancel
+(e.g. when a view is hidden), makes the older one stale. Stale requests are
+dropped before they start when possible, and their results are discarded
+otherwise.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from qt_futures import watch_future
+
+# Reads are short and SQLite allows concurrent readers under WAL; a couple
+# of threads keeps one slow query from delaying the next view.
+READ_POOL_SIZE = 2
+
+
+class QueryRunner:
+    """Runs reads off the GUI thread and delivers only the latest result per channel."""
+
+    def __init__(self, max_workers=READ_POOL_SIZE):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="zapcards-db-read")
+        self._latest = {}  # channel -> Future; only touched on the GUI thread
+
+    def submit(self, channel, func, *args, on_result=None, on_error=None, parent=None):
+        """
+        Run func(*args) on the read pool. on_result(value) or on_error(exc)
+        is called on the GUI thread, unless the request went stale first.
+        Pass the requesting widget as parent so callbacks die with it.
+        """
+        self.cancel(channel)
+        future = self._executor.submit(func, *args)
+        self._latest[channel] = future
+        watch_future(
+            future,
+            lambda value: self._deliver(channel, future, on_result, value),
+            lambda error: self._deliver(channel, future, on_error, error),
+            parent=parent,
+        )
+        return future
+
+    def cancel(self, channel):
+        """Make the pending request on a channel stale."""
+        future = self._latest.pop(channel, None)
+        if future is not None:
+            future.cancel()  # Only succeeds if it has not started yet
+
+    def is_pending(self, channel):
+        return channel in self._latest
+
+    def shutdown(self):
+        """Stop accepting work; requests already running finish in the background."""
+        for channel in list(self._latest):
+            self.cancel(channel)
+        self._executor.shutdown(wait=False)
+
+    def _deliver(self, channel, future, callback, value):
+        if self._latest.get(channel) is not future:
+            return  # Superseded or cancelled while it was running
+        del self._latest[channel]
+        if callback is not None:
+            callback(value)
+        elif isinstance(value, Exception):
+            print(f"Background query on '{channel}' failed: {value}")
+
+
+# Global query runner instance
+queries = QueryRunner()
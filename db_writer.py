@@ -0,0 +1,218 @@
+"""
+Single writer thread for all database mutations.
+
+Every write goes through one DatabaseWriter, which owns the only write
+connection and runs on its own thread. Callers submit a SimpleDB method and
+get a concurrent.futures.Future back (see qt_futures for turning that into
+Qt signals). Requests that arrive close together share one transaction
+("group commit"), so a burst of small writes costs one fsync instead of
+many. Requests run strictly in submission order, and a future only resolves
+after its transaction has committed.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from simple_db import db, DELETE_CHUNK_SIZE
+
+# How long the writer waits for more requests to share a commit, in seconds.
+GROUP_COMMIT_WINDOW = 0.005
+# Upper bound on requests folded into a single transaction.
+MAX_GROUP_SIZE = 64
+
+_STOP = object()
+
+
+class DatabaseWriter:
+    """
+    Serializes mutations onto a dedicated thread with group commit.
+
+    submit(func, *args) queues func(*args, conn=<writer connection>). The
+    function runs inside a savepoint, so one failing request is rolled back
+    on its own and does not take the rest of its group with it.
+
+    submit_outside_transaction() is for the few statements SQLite refuses to
+    run in a transaction (VACUUM, some PRAGMAs): the request runs on its own,
+    between groups, on the autocommit connection.
+    """
+
+    def __init__(self, database=db):
+        self.database = database
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._held = None  # A request that must not join the current group
+        self.last_activity = time.monotonic()  # When the last request was submitted
+
+    def start(self):
+        """Start the writer thread if it is not already running."""
+        with self._lock:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="zapcards-db-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, func, *args, **kwargs) -> Future:
+        """Queue a mutation and return a Future for its result."""
+        self.start()
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The database writer has been closed.")
+            self.last_activity = time.monotonic()
+            self._queue.put((func, args, kwargs, future, True))
+        return future
+
+    def submit_outside_transaction(self, func, *args, **kwargs) -> Future:
+        """Queue func(*args, conn=...) to run alone, with no transaction open."""
+        self.start()
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The database writer has been closed.")
+            self.last_activity = time.monotonic()
+            self._queue.put((func, args, kwargs, future, False))
+        return future
+
+    def delete_deck_in_chunks(self, deck_id, chunk_size=DELETE_CHUNK_SIZE, progress_callback=None) -> Future:
+        """
+        Delete a deck as a series of SimpleDB.delete_deck_chunk requests.
+
+        Each chunk is queued only after the previous one committed, so other
+        writes interleave with a large deletion instead of waiting behind
+        it. progress_callback(deleted, total) is called from the writer
+        thread after each chunk. The returned Future resolves to the number
+        of cards removed.
+        """
+        done = Future()
+        deleted = 0
+
+        def on_chunk(chunk_future):
+            nonlocal deleted
+            try:
+                removed, remaining = chunk_future.result()
+                deleted += removed
+                if removed == 0:
+                    done.set_result(deleted)
+                    return
+                if progress_callback:
+                    progress_callback(deleted, deleted + remaining)
+                self.submit(self.database.delete_deck_chunk, deck_id, chunk_size).add_done_callback(on_chunk)
+            except Exception as e:
+                done.set_exception(e)
+
+        self.submit(self.database.delete_deck_chunk, deck_id, chunk_size).add_done_callback(on_chunk)
+        return done
+
+    def close(self, timeout=None):
+        """
+        Flush everything already queued, commit it and stop the thread.
+        Further submits raise RuntimeError.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            self._queue.put(_STOP)
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        conn = self.database.get_connection()
+        # Transactions are managed explicitly below.
+        conn.isolation_level = None
+        try:
+            while True:
+                item, self._held = self._held or self._queue.get(), None
+                if item is _STOP:
+                    break
+                if not item[4]:
+                    self._run_alone(conn, item)
+                    continue
+                batch, stop = self._collect_group(item)
+                self._commit_group(conn, batch)
+                if stop:
+                    break
+        finally:
+            conn.close()
+
+    def _collect_group(self, first):
+        """Gather requests that arrive within the group commit window."""
+        batch = [first]
+        deadline = time.monotonic() + GROUP_COMMIT_WINDOW
+        while len(batch) < MAX_GROUP_SIZE:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            if not item[4]:
+                self._held = item
+                break
+            batch.append(item)
+        return batch, False
+
+    def _run_alone(self, conn, item):
+        func, args, kwargs, future, _ = item
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func(*args, conn=conn, **kwargs))
+        except Exception as e:
+            self._rollback(conn)
+            future.set_exception(e)
+
+    @staticmethod
+    def _rollback(conn):
+        """Roll back an open transaction; a failure here must not stop the writer thread."""
+        try:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+        except Exception as e:
+            print(f"Database writer could not roll back: {e}")
+
+    def _commit_group(self, conn, batch):
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for func, args, kwargs, future, _ in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT request")
+                try:
+                    result = func(*args, conn=conn, **kwargs)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO SAVEPOINT request")
+                    conn.execute("RELEASE SAVEPOINT request")
+                    outcomes.append((future, None, e))
+                else:
+                    conn.execute("RELEASE SAVEPOINT request")
+                    outcomes.append((future, result, None))
+            conn.execute("COMMIT")
+        except Exception as e:
+            print(f"Database writer failed to commit a group of {len(batch)} requests: {e}")
+            self._rollback(conn)
+            # Includes requests never started, e.g. when BEGIN IMMEDIATE itself
+            # failed because another process held the write lock.
+            for func, args, kwargs, future, _ in batch:
+                if future.done():
+                    continue
+                if future.running() or future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+            return
+
+        # Only report back once the data is durable.
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+# Global writer instance
+writer = DatabaseWriter()
@@ -0,0 +1,274 @@
+"""
+Persistent, resumable deck generation jobs.
+
+Every generation request is written to the generation_jobs table before any
+API call is made, and the valid cards of each API response are saved as a
+"shard" the moment they arrive. If the app closes or crashes mid-generation,
+the job is picked up again on the next start and only the cards that are
+still missing are requested; shards that were already received are never
+paid for twice. Completing a job imports the deck and marks the job done in
+the same transaction.
+
+GenerationJobScheduler runs the jobs one at a time on a QThread, which hands
+the API work to the generation worker process (see generation_process).
+
+Prefetch jobs are the speculative kind: after a quiz that went well, the
+next difficulty of the deck is generated in the background (within a daily
+budget) and kept in the response cache. Regenerating the deck at that
+difficulty then uses the cached cards instead of waiting for the API.
+"""
+
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+
+from config import PREFETCH_ENABLED, PREFETCH_MIN_ACCURACY, PREFETCH_DAILY_BUDGET
+from simple_db import db, is_library_id
+from db_writer import writer
+from db_queries import queries
+from qt_futures import watch_future
+from generation_process import generator, GenerationProcessError
+
+# Cards per generated deck.
+GENERATED_DECK_SIZE = 10
+# Runs (including resumes after a restart) before a job is given up on.
+MAX_JOB_ATTEMPTS = 3
+DIFFICULTIES = ("Easy", "Medium", "Hard")
+
+
+def topic_from_deck_name(deck_name: str) -> str:
+    """The generation topic behind a deck name like "Topic Name - Hard"."""
+    return deck_name.replace(" - Easy", "").replace(" - Medium", "").replace(" - Hard", "")
+
+
+def next_difficulty(difficulty: str):
+    """The difficulty above this one, or None at the top."""
+    if difficulty not in DIFFICULTIES:
+        difficulty = "Medium"
+    index = DIFFICULTIES.index(difficulty)
+    return DIFFICULTIES[index + 1] if index + 1 < len(DIFFICULTIES) else None
+
+
+def plan_prefetch(deck_id: int, deck_name: str, accuracy: float):
+    """
+    The prefetch policy: returns (topic, difficulty) worth generating ahead
+    for a finished quiz, or None. Runs database reads; call it off the GUI
+    thread.
+    """
+    if not PREFETCH_ENABLED or accuracy < PREFETCH_MIN_ACCURACY or is_library_id(deck_id):
+        return None
+    difficulty = next_difficulty(db.get_deck_difficulty(deck_id) or "Medium")
+    if difficulty is None:
+        return None
+    topic = topic_from_deck_name(deck_name)
+    if not db.is_prefetch_wanted(topic, difficulty):
+        return None
+    if db.prefetch_jobs_since(24) >= PREFETCH_DAILY_BUDGET:
+        print("Prefetch budget for today is used up.")
+        return None
+    return topic, difficulty
+
+
+class GenerationJobWorker(QObject):
+    """
+    Runs one generation job to completion on a background thread.
+
+    finished carries the job dict (see SimpleDB.get_generation_job) with
+    the import result under "result"; failed carries the job and an error
+    message.
+    """
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object, str)
+
+    def __init__(self, job_id: int):
+        super().__init__()
+        self.job_id = job_id
+
+    def run(self):
+        job = None
+        attempt = 0
+        try:
+            attempt = writer.submit(db.start_generation_job_attempt, self.job_id).result()
+            job = db.get_generation_job(self.job_id)
+            shard = job["shards"]
+            missing = job["target_count"] - len(job["cards"])
+            print(f"Generation job {self.job_id} ({job['topic']}, {job['difficulty']}): attempt {attempt}, "
+                  f"{len(job['cards'])} card(s) already received")
+
+            def save_shard(name, description, cards):
+                nonlocal shard
+                # Wait for the commit so an acknowledged shard is durable.
+                writer.submit(db.save_generation_shard, self.job_id, shard, name, description, cards).result()
+                shard += 1
+
+            if missing > 0:
+                # The API call itself runs in the generation worker process.
+                generator.generate(job["topic"], job["target_count"], job["difficulty"],
+                                   existing_cards=job["cards"], on_cards=save_shard)
+                job = db.get_generation_job(self.job_id)
+
+            if not job["cards"]:
+                retry = attempt < MAX_JOB_ATTEMPTS
+                message = f"Could not generate a deck for the topic '{job['topic']}'."
+                writer.submit(db.fail_generation_job, self.job_id, message, retry).result()
+                self.failed.emit(job, message)
+                return
+
+            job["result"] = writer.submit(db.complete_generation_job, self.job_id).result()
+            self.finished.emit(job)
+        except GenerationProcessError as e:
+            # The worker process crashed or was stopped; the cards saved so
+            # far are kept and the job resumes on the next start.
+            print(f"Generation job {self.job_id} interrupted: {e}")
+            try:
+                writer.submit(db.fail_generation_job, self.job_id, e, attempt < MAX_JOB_ATTEMPTS).result()
+            except Exception as record_error:
+                print(f"Could not record the failure of job {self.job_id}: {record_error}")
+            self.failed.emit(job or {"id": self.job_id}, f"Deck generation was interrupted: {e}")
+        except Exception as e:
+            print(f"Error in generation job {self.job_id}: {e}")
+            try:
+                writer.submit(db.fail_generation_job, self.job_id, e).result()
+            except Exception as record_error:
+                print(f"Could not record the failure of job {self.job_id}: {record_error}")
+            self.failed.emit(job or {"id": self.job_id}, f"An unexpected error occurred during generation: {e}")
+
+
+class GenerationJobScheduler(QObject):
+    """
+    Queues generation jobs and runs them one after another.
+
+    submit() records a new job; resume_pending() re-queues jobs left over
+    from a previous session. The signals are delivered on the GUI thread.
+    """
+    job_started = pyqtSignal(object)        # job dict (without cards)
+    job_finished = pyqtSignal(object)       # job dict, result under "result"
+    job_failed = pyqtSignal(object, str)    # job dict, error message
+    idle = pyqtSignal()                     # No user-requested job is queued or running
+
+    PREFETCH_CHANNEL = "generation.prefetch"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._queue = []
+        self._prefetch_ids = set()
+        self._running_prefetch = False
+        self._thread = None
+        self._worker = None
+
+    def submit(self, topic: str, difficulty: str = "Medium", replace_deck_id: int = None,
+               count: int = GENERATED_DECK_SIZE, kind: str = "deck"):
+        """Persist a new job and queue it once it is saved."""
+        def on_error(error):
+            job = {"id": None, "topic": topic, "difficulty": difficulty, "replace_deck_id": replace_deck_id,
+                   "kind": kind}
+            self.job_failed.emit(job, f"Could not save the generation request: {error}")
+            if not self.is_busy():
+                self.idle.emit()
+
+        future = writer.submit(db.create_generation_job, topic, difficulty, count, replace_deck_id, kind)
+        watch_future(future, lambda job_id: self._enqueue(job_id, kind == "prefetch"), on_error, parent=self)
+
+    def regenerate(self, deck_id: int, topic: str, difficulty: str):
+        """
+        Regenerate a deck, straight from the response cache when a prefetch
+        guessed this difficulty, otherwise through a normal job.
+        """
+        def on_result(summary):
+            if summary is None:
+                self.submit(topic, difficulty, replace_deck_id=deck_id)
+                return
+            print(f"Regenerated deck {deck_id} from prefetched {difficulty} cards.")
+            self.job_finished.emit({"id": None, "topic": topic, "difficulty": difficulty, "kind": "deck",
+                                    "replace_deck_id": deck_id, "deck_name": None, "result": summary})
+            if not self.is_busy():
+                self.idle.emit()
+
+        def on_error(error):
+            print(f"Could not use the response cache: {error}")
+            self.submit(topic, difficulty, replace_deck_id=deck_id)
+
+        watch_future(writer.submit(db.apply_cached_response, deck_id, topic, difficulty),
+                     on_result, on_error, parent=self)
+
+    def prefetch_after_quiz(self, deck_id: int, deck_name: str, accuracy: float):
+        """Queue a prefetch of the next difficulty if the policy and budget allow."""
+        if not PREFETCH_ENABLED:
+            return
+
+        def on_plan(plan):
+            if plan is not None:
+                topic, difficulty = plan
+                print(f"Prefetching the {difficulty} version of '{topic}'.")
+                self.submit(topic, difficulty, kind="prefetch")
+
+        queries.submit(self.PREFETCH_CHANNEL, plan_prefetch, deck_id, deck_name, accuracy,
+                       on_result=on_plan, parent=self)
+
+    def resume_pending(self):
+        """Queue every job that did not finish last time. Returns how many."""
+        job_ids = [job_id for job_id in db.get_resumable_generation_jobs() if job_id not in self._queue]
+        for job_id in job_ids:
+            self._enqueue(job_id)
+        return len(job_ids)
+
+    def is_busy(self):
+        """True while a user-requested (non-prefetch) job is queued or running."""
+        running = self._thread is not None and not self._running_prefetch
+        return running or any(job_id not in self._prefetch_ids for job_id in self._queue)
+
+    def shutdown(self, timeout_ms=5000):
+        """
+        Drop queued jobs, stop the generation process and wait briefly for
+        the running job. Anything not finished stays in the database and
+        resumes next time.
+        """
+        self._queue.clear()
+        generator.stop()
+        if self._thread is not None:
+            self._thread.quit()
+            self._thread.wait(timeout_ms)
+
+    def _enqueue(self, job_id, prefetch=False):
+        if prefetch:
+            self._prefetch_ids.add(job_id)
+            self._queue.append(job_id)
+        else:
+            # User requests go ahead of queued prefetches.
+            position = next((i for i, queued in enumerate(self._queue) if queued in self._prefetch_ids),
+                            len(self._queue))
+            self._queue.insert(position, job_id)
+        if self._thread is None:
+            self._start_next()
+
+    def _start_next(self):
+        if not self.is_busy():
+            self.idle.emit()
+        if not self._queue:
+            return
+        job_id = self._queue.pop(0)
+        self._prefetch_ids.discard(job_id)
+        job = db.get_generation_job_row(job_id)
+        if job is None or job["state"] not in ("pending", "running"):
+            self._start_next()
+            return
+        self._running_prefetch = job["kind"] == "prefetch"
+        self.job_started.emit(job)
+
+        self._thread = QThread()
+        self._worker = GenerationJobWorker(job_id)
+        self._worker.moveToThread(self._thread)
+        self._thread.started.connect(self._worker.run)
+        self._worker.finished.connect(self.job_finished)
+        self._worker.failed.connect(self.job_failed)
+        self._worker.finished.connect(self._thread.quit)
+        self._worker.failed.connect(self._thread.quit)
+        self._thread.finished.connect(self._on_thread_finished)
+        self._thread.start()
+
+    def _on_thread_finished(self):
+        # A bound method of a GUI-thread object, so this runs on the GUI thread.
+        self._worker.deleteLater()
+        self._thread.deleteLater()
+        self._worker = None
+        self._thread = None
+        self._running_prefetch = False
+        self._start_next()
@@ -0,0 +1,196 @@
+"""
+Out-of-process deck generation.
+
+The Gemini SDK call, the parsing of large responses and the logging around
+them run in a separate worker process, so they never compete with the Qt
+event loop for the GIL. The GUI process only waits on a pipe (which releases
+the GIL) and never imports the SDK at all.
+
+Messages are plain tuples tagged with a one-letter type, and cards travel as
+(front, back, distractors) tuples rather than dicts:
+
+    GUI -> worker   ("g", request_id, topic, difficulty, count, cards)   generate
+                    ("q",)                                                quit
+    worker -> GUI   ("c", request_id, name, description, cards)          cards of one response
+                    ("d", request_id, metrics)                            request done
+                    ("e", request_id, message)                            request failed
+
+The worker never touches the database. If it dies mid-request it is
+restarted and the request is re-sent with the cards received so far, so
+only the missing cards are asked for again.
+"""
+
+import multiprocessing
+import threading
+
+MSG_GENERATE = "g"
+MSG_QUIT = "q"
+MSG_CARDS = "c"
+MSG_DONE = "d"
+MSG_ERROR = "e"
+
+# How often a waiting request checks that the worker is still alive, in seconds.
+LIVENESS_INTERVAL = 1.0
+# Worker restarts allowed within one request before it is given up on.
+MAX_RESTARTS = 2
+# Spawn rather than fork: a forked copy of the Qt GUI process is not safe.
+_context = multiprocessing.get_context("spawn")
+
+
+class GenerationProcessError(Exception):
+    """The worker process failed or kept crashing."""
+
+
+def pack_cards(cards):
+    return tuple((card["front"], card["back"], tuple(card.get("distractors") or ())) for card in cards)
+
+
+def unpack_cards(packed):
+    cards = []
+    for front, back, distractors in packed:
+        card = {"front": front, "back": back}
+        if distractors:
+            card["distractors"] = list(distractors)
+        cards.append(card)
+    return cards
+
+
+def _worker_main(conn):
+    """Entry point of the worker process: serve generate requests until told to quit."""
+    # Imported here so only the worker process loads the SDK.
+    from web_question_finder import find_questions_for_topic, get_generation_metrics
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if message[0] == MSG_QUIT:
+            break
+        _, request_id, topic, difficulty, count, packed = message
+
+        def on_cards(name, description, cards):
+            conn.send((MSG_CARDS, request_id, name, description, pack_cards(cards)))
+
+        try:
+            find_questions_for_topic(topic, count=count, difficulty=difficulty,
+                                     existing_cards=unpack_cards(packed), on_cards=on_cards)
+            conn.send((MSG_DONE, request_id, get_generation_metrics()))
+        except Exception as e:
+            conn.send((MSG_ERROR, request_id, str(e)))
+    conn.close()
+
+
+class GenerationProcess:
+    """
+    Owns the worker process: starts it on first use, restarts it after a
+    crash and stops it on shutdown. generate() is blocking and meant to be
+    called from a background thread; requests are served one at a time.
+    """
+
+    def __init__(self):
+        self._process = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self._next_request_id = 0
+        self.restarts = 0
+        self.last_metrics = {}
+        self._stopping = False
+
+    def is_alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def start(self):
+        if self.is_alive():
+            return
+        self._discard()
+        parent_conn, child_conn = _context.Pipe()
+        self._process = _context.Process(target=_worker_main, args=(child_conn,),
+                                         name="zapcards-generator", daemon=True)
+        self._process.start()
+        child_conn.close()  # The worker holds its own copy
+        self._conn = parent_conn
+        print(f"Started generation worker process (pid {self._process.pid})")
+
+    def generate(self, topic, count, difficulty="Medium", existing_cards=(), on_cards=None):
+        """
+        Generate cards in the worker process. on_cards(name, description,
+        cards) is called on this thread for each response's cards. Returns
+        every card for the deck, existing ones included.
+        """
+        with self._lock:
+            cards = list(existing_cards)
+            for restart in range(MAX_RESTARTS + 1):
+                if restart:
+                    self.restarts += 1
+                    print(f"Generation worker died; restarting ({restart}/{MAX_RESTARTS})...")
+                if self._stopping:
+                    break
+                self.start()
+                self._next_request_id += 1
+                request_id = self._next_request_id
+                conn, process = self._conn, self._process
+                try:
+                    conn.send((MSG_GENERATE, request_id, topic, difficulty, count, pack_cards(cards)))
+                    if self._wait(conn, process, request_id, cards, on_cards):
+                        return cards
+                except (EOFError, OSError):
+                    pass  # Pipe broken: the worker died or is being stopped
+                if self._stopping:
+                    break
+                self._discard()
+            if self._stopping:
+                raise GenerationProcessError("The generation worker was stopped.")
+            raise GenerationProcessError("The generation worker keeps crashing.")
+
+    def _wait(self, conn, process, request_id, cards, on_cards):
+        """Relay messages for a request. Returns False if the worker died."""
+        while True:
+            if not conn.poll(LIVENESS_INTERVAL):
+                if not process.is_alive():
+                    return False
+                continue
+            message = conn.recv()
+            if message[1] != request_id:
+                continue  # Left over from a request the worker was restarted during
+            if message[0] == MSG_CARDS:
+                new_cards = unpack_cards(message[4])
+                cards.extend(new_cards)
+                if on_cards is not None:
+                    on_cards(message[2], message[3], new_cards)
+            elif message[0] == MSG_DONE:
+                self.last_metrics = message[2]
+                return True
+            elif message[0] == MSG_ERROR:
+                raise GenerationProcessError(message[2])
+
+    def stop(self, timeout=2.0):
+        """
+        Ask the worker to quit, and terminate it if it does not. A request
+        in flight fails with GenerationProcessError.
+        """
+        self._stopping = True
+        if self._conn is not None:
+            try:
+                self._conn.send((MSG_QUIT,))
+            except (OSError, BrokenPipeError):
+                pass
+        if self._process is not None:
+            self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join(timeout)
+        self._discard()
+
+    def _discard(self):
+        if self._process is not None and self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        if self._conn is not None:
+            self._conn.close()
+        self._process = None
+        self._conn = None
+
+
+# Global generation process
+generator = GenerationProcess()
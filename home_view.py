@@ -7,7 +7,7 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QLabel, QHBoxLayout,
                              QScrollArea, QFrame)
 
 from themes import get_current_theme
-from widgets import PrimaryButton
+from widgets import PrimaryButton, refresh_child_themes
 
 class HomeView(QWidget):
     navigate_to_decks_signal = pyqtSignal()
@@ -22,30 +22,17 @@ class HomeView(QWidget):
         main_layout.setContentsMargins(30, 30, 30, 30)
         
         # Scroll area for content
-        scroll = QScrollArea()
+        self.scroll = scroll = QScrollArea()
         scroll_widget = QWidget()
         layout = QVBoxLayout(scroll_widget)
         
-        theme = get_current_theme()
-        
         # Title
-        title = QLabel("⚡ ZAPCARDS - MIND PALACE ⚡")
-        title.setStyleSheet(f"""
-            QLabel {{
-                font-family: {theme['title_font']};
-                font-size: 28px;
-                font-weight: bold;
-                color: {theme['primary']};
-                text-align: center;
-                padding: 20px;
-                margin-bottom: 20px;
-            }}
-        """)
+        self.title = title = QLabel("⚡ ZAPCARDS - MIND PALACE ⚡")
         title.setAlignment(Qt.AlignCenter)
         layout.addWidget(title)
         
         # Description
-        desc = QLabel("""
+        self.description = desc = QLabel("""
         Welcome to ZapCards - Your Personal Study Companion!
         
         🎯 WHAT IS ZAPCARDS?
@@ -72,19 +59,6 @@ class HomeView(QWidget):
         • Anyone who wants to make learning fun!
         """)
         
-        desc.setStyleSheet(f"""
-            QLabel {{
-                font-family: {theme['font_family']};
-                font-size: {theme['font_size']};
-                color: {theme['foreground']};
-                background: {theme['panel_bg']};
-                border: 2px solid {theme['button_border']};
-                border-radius: 8px;
-                padding: 25px;
-                line-height: 1.6;
-                background-image: {theme.get('scan_lines', 'none')};
-            }}
-        """)
         desc.setWordWrap(True)
         layout.addWidget(desc)
         
@@ -105,16 +79,41 @@ class HomeView(QWidget):
         
         scroll.setWidget(scroll_widget)
         scroll.setWidgetResizable(True)
-        scroll.setStyleSheet(f"""
+        
+        main_layout.addWidget(scroll)
+        self.refresh_theme()
+    
+    def refresh_theme(self):
+        """Re-apply the current theme to this view and its buttons."""
+        theme = get_current_theme()
+        self.title.setStyleSheet(f"""
+            QLabel {{
+                font-family: {theme['title_font']};
+                font-size: 28px;
+                font-weight: bold;
+                color: {theme['primary']};
+                text-align: center;
+                padding: 20px;
+                margin-bottom: 20px;
+            }}
+        """)
+        self.description.setStyleSheet(f"""
+            QLabel {{
+                font-family: {theme['font_family']};
+                font-size: {theme['font_size']};
+                color: {theme['foreground']};
+                background: {theme['panel_bg']};
+                border: 2px solid {theme['button_border']};
+                border-radius: 8px;
+                padding: 25px;
+                line-height: 1.6;
+                background-image: {theme.get('scan_lines', 'none')};
+            }}
+        """)
+        self.scroll.setStyleSheet(f"""
             QScrollArea {{
                 border: none;
                 background: {theme['window_bg']};
             }}
         """)
-        
-        main_layout.addWidget(scroll)
-    
-    def refresh_theme(self):
-        """Refresh the UI with current theme."""
-        # Simple refresh - styles will update on next interaction
-        pass
\ No newline at end of file
+        refresh_child_themes(self)
@@ -3,8 +3,13 @@ import sys
 from PyQt5.QtWidgets import QApplication
 
 from simple_db import init_db
+from db_writer import writer
+from db_queries import queries
+from db_backup import backups
+from review_log import review_log
 from main_window import MainWindow
-from themes import get_current_theme
+from ui_instrumentation import ui_instrumentation
+from themes import get_current_theme, app_stylesheet
 
 
 def main():
@@ -13,6 +18,8 @@ def main():
 
     Initializes the database and launches the PyQt5 user interface.
     """
+    ui_instrumentation.start()
+
     # 1. Initialize the database (creates tables if they don't exist)
     print("Initializing database...")
     init_db()
@@ -22,41 +29,24 @@ def main():
     app = QApplication(sys.argv)
     
     # Apply current theme
-    theme = get_current_theme()
-    app.setStyleSheet(f"""
-        QWidget {{
-            font-family: {theme['font_family']};
-            font-size: {theme['font_size']};
-            background: {theme['background']};
-            color: {theme['foreground']};
-        }}
-        QMessageBox {{
-            background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
-                stop:0 {theme['background']}, stop:1 {theme['panel_bg']});
-            border: 2px solid {theme['button_border']};
-            background-image: {theme.get('grid_texture', 'none')};
-        }}
-        QMessageBox QPushButton {{
-            background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                stop:0 {theme['button_bg']}, stop:1 {theme['background']});
-            border: 2px solid {theme['button_border']};
-            border-radius: 4px;
-            padding: 10px 20px;
-            font-weight: bold;
-            color: {theme['foreground']};
-            background-image: {theme.get('scan_lines', 'none')};
-        }}
-        QMessageBox QPushButton:hover {{
-            background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                stop:0 {theme['primary']}, stop:1 {theme['secondary']});
-            color: {theme['background']};
-        }}
-    """)
+    app.setStyleSheet(app_stylesheet(get_current_theme()))
 
     main_window = MainWindow()
     main_window.show()
 
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    if ui_instrumentation.enabled:
+        print(ui_instrumentation.leak_report())
+
+    # 3. Commit any writes still queued before the process exits; an
+    # unfinished generation job stays pending and resumes on the next start
+    review_log.flush()
+    main_window.generation_jobs.shutdown()
+    main_window.maintenance.shutdown()
+    backups.shutdown()
+    queries.shutdown()
+    writer.close()
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -4,43 +4,27 @@ The main window of the application, which handles navigation between different v
 from typing import Dict
 
 from PyQt5.QtWidgets import QMainWindow, QStackedWidget, QWidget, QMessageBox
-from PyQt5.QtCore import QObject, QThread, pyqtSignal
 
-from config import APP_NAME
-from themes import get_current_theme
+from config import APP_NAME, BACKUP_INTERVAL_HOURS
+from themes import get_current_theme, app_stylesheet
 from home_view import HomeView
 from settings_view import SettingsView
 from simple_deck_list_view import DeckListView
 from simple_quiz_view import QuizView
-from web_question_finder import find_questions_for_topic
-from simple_db import db
+from db_writer import writer
+from qt_futures import FutureWatcher, watch_future
+from db_backup import backups, BackupCancelled
+from db_maintenance import MaintenanceScheduler
+from ui_instrumentation import ui_instrumentation
+from generation_jobs import GenerationJobScheduler, topic_from_deck_name
 from PyQt5.QtWidgets import QApplication
 
-class DeckGenerationWorker(QObject):
-    """
-    A worker that runs the deck generation task in a separate thread.
-    Emits the generated deck data or an error message upon completion.
-    """
-    finished = pyqtSignal(object, str)  # Emits deck_data (dict or None) and the original topic
-    error = pyqtSignal(str)
-
-    def __init__(self, topic: str, difficulty: str = "Medium"):
-        super().__init__()
-        self.topic = topic
-        self.difficulty = difficulty
-
-    def run(self):
-        """Performs the long-running task."""
-        try:
-            print(f"Worker thread starting to find questions for: {self.topic} (difficulty: {self.difficulty})")
-            deck_data = find_questions_for_topic(self.topic, difficulty=self.difficulty)
-            self.finished.emit(deck_data, self.topic)
-        except Exception as e:
-            print(f"Error in worker thread: {e}")
-            self.error.emit(f"An unexpected error occurred during generation: {e}")
-
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, background_work=True):
+        """
+        background_work=False skips resuming generation jobs, the startup
+        backup and idle maintenance, for tools that only drive the UI.
+        """
         super().__init__()
 
         self.setWindowTitle(f"⚡ {APP_NAME} - Study Companion")
@@ -52,9 +36,16 @@ class MainWindow(QMainWindow):
         self.central_widget = QStackedWidget()
         self.setCentralWidget(self.central_widget)
 
-        # --- Threading ---
-        self.thread = None
-        self.worker = None
+        # --- Background work ---
+        self.generation_jobs = GenerationJobScheduler(self)
+        self.generation_jobs.job_started.connect(self.on_generation_started)
+        self.generation_jobs.job_finished.connect(self.on_generation_finished)
+        self.generation_jobs.job_failed.connect(self.on_generation_error)
+        self.generation_jobs.idle.connect(self._reset_generate_button)
+        self.deletions_in_progress = set()
+        self.maintenance = MaintenanceScheduler(self)
+        self.maintenance.finished.connect(self.on_maintenance_finished)
+        self.maintenance.failed.connect(self.on_maintenance_error)
         # --- View Management ---
         self.views: Dict[str, QWidget] = {}
         self._init_views()
@@ -63,8 +54,28 @@ class MainWindow(QMainWindow):
         # Start at the home page
         self.show_view("home")
 
+        if background_work:
+            self._start_background_work()
+
+    def _start_background_work(self):
+        # Pick up generations interrupted by a crash or by closing the app
+        resumed = self.generation_jobs.resume_pending()
+        if resumed:
+            self.statusBar().showMessage(f"Resuming {resumed} unfinished deck generation(s)...", 5000)
+
+        # Daily snapshot of the database, taken in the background
+        future = backups.start_if_due(BACKUP_INTERVAL_HOURS)
+        if future is not None:
+            watch_future(future, self.on_backup_finished, self.on_backup_error, parent=self)
+
+        # Optimize, vacuum and check the database whenever it sits idle
+        self.maintenance.start()
+
     def _init_views(self):
-        """Initializes and adds all views to the stacked widget."""
+        """
+        Creates each view once and adds it to the stacked widget. The views
+        live as long as the window; a theme change restyles them in place.
+        """
         self.views["home"] = HomeView()
         self.views["settings"] = SettingsView()
         self.views["deck_list"] = DeckListView()
@@ -85,27 +96,47 @@ class MainWindow(QMainWindow):
         
         # Deck list view connections
         self.views["deck_list"].start_quiz_signal.connect(self.start_quiz)
+        self.views["deck_list"].start_session_signal.connect(self.start_session)
         self.views["deck_list"].generate_deck_signal.connect(self.generate_deck)
         self.views["deck_list"].regenerate_deck_signal.connect(self.regenerate_deck)
         self.views["deck_list"].delete_deck_signal.connect(self.delete_deck)
         
         # Quiz view connections
         self.views["quiz"].quiz_finished_signal.connect(lambda: self.show_view("deck_list"))
+        self.views["quiz"].quiz_completed_signal.connect(self.on_quiz_completed)
 
     def start_quiz(self, deck_id: int):
         self.views["quiz"].load_deck(deck_id)
         self.show_view("quiz")
 
+    def start_session(self, deck_ids):
+        self.views["quiz"].load_session(deck_ids)
+        self.show_view("quiz")
+
+    def on_quiz_completed(self, deck_id: int, correct: int, answered: int):
+        """Lets the prefetch policy guess whether a harder version comes next."""
+        deck_name = self._deck_name(deck_id)
+        if deck_name:
+            self.generation_jobs.prefetch_after_quiz(deck_id, deck_name, correct / answered)
+
+    def _deck_name(self, deck_id: int):
+        for deck in self.views["deck_list"].decks:
+            if deck["id"] == deck_id:
+                return deck["name"]
+        return None
+
     def show_view(self, view_name: str):
         """Switches the central widget to the specified view."""
         if view_name == "deck_list":
             self.views["deck_list"].refresh_decks()
         self.central_widget.setCurrentWidget(self.views[view_name])
+        ui_instrumentation.checkpoint(view_name)
 
     def generate_deck(self, topic_with_difficulty: str):
         """
-        Handles the request to generate a deck from a topic by running
-        the task in a background thread to keep the UI responsive.
+        Handles the request to generate a deck from a topic. The request is
+        saved as a generation job and runs in the background, so it
+        survives the app being closed before it finishes.
         """
         # Parse topic and difficulty
         if "|" in topic_with_difficulty:
@@ -119,57 +150,40 @@ class MainWindow(QMainWindow):
         generate_button.setText("Generating...")
 
         print(f"Main window received request to generate deck for: {topic} (difficulty: {difficulty})")
+        self.generation_jobs.submit(topic, difficulty)
 
-        # Set up the thread and worker
-        self.thread = QThread()
-        self.worker = DeckGenerationWorker(topic, difficulty)
-        self.worker.moveToThread(self.thread)
-
-        # Connect signals from the worker to slots in the main window
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(self.on_generation_finished)
-        self.worker.error.connect(self.on_generation_error)
-        
-        # Clean up after the worker is done
-        self.worker.finished.connect(self.thread.quit)
-        self.worker.finished.connect(self.worker.deleteLater)
-        self.thread.finished.connect(self.thread.deleteLater)
-
-        # Start the thread
-        self.thread.start()
-
-    def on_generation_finished(self, deck_data, topic: str):
-        """Handles the successful completion of the deck generation task."""
-        print("Worker finished, handling results in main thread.")
-
-        # Hide loading indicator here
-        if deck_data:
-            try:
-                deck_id = db.import_deck(deck_data)
-                QMessageBox.information(self, "Success", f"Successfully generated and saved the deck '{deck_data['name']}'!")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to save the generated deck to the database: {e}")
-        else:
-            QMessageBox.warning(self, "Generation Failed", f"Could not generate a deck for the topic '{topic}'. Please try another topic.")
+    def on_generation_started(self, job):
+        """Keeps the generate button busy while any job runs, including resumed ones."""
+        if job["kind"] == "prefetch":
+            return  # Background guesswork; the user can keep working
+        generate_button = self.views["deck_list"].generate_deck_button
+        generate_button.setEnabled(False)
+        generate_button.setText("Regenerating..." if job["replace_deck_id"] is not None else "Generating...")
 
-        self._reset_generate_button()
+    def on_generation_finished(self, job):
+        """Handles a completed generation job; its deck is already saved."""
+        if job["kind"] == "prefetch":
+            print(f"Prefetched the {job['difficulty']} version of '{job['topic']}'.")
+            return
+        print("Generation job finished, deck saved.")
+        if job["replace_deck_id"] is not None:
+            self.on_regeneration_finished(job["result"], job["topic"])
+            return
+        QMessageBox.information(
+            self, "Success",
+            f"Successfully generated and saved the deck '{job['deck_name'] or job['topic']}'!")
         self.views["deck_list"].refresh_decks()
     
     def regenerate_deck(self, deck_id: int, difficulty: str):
         """Regenerates an existing deck with new difficulty."""
         # Get the deck name first
-        deck_name = None
-        for deck in self.views["deck_list"].decks:
-            if deck["id"] == deck_id:
-                deck_name = deck["name"]
-                break
-        
+        deck_name = self._deck_name(deck_id)
         if not deck_name:
             QMessageBox.warning(self, "Error", "Could not find deck to regenerate.")
             return
         
         # Extract topic from deck name (assuming format like "Topic Name")
-        topic = deck_name.replace(" - Easy", "").replace(" - Medium", "").replace(" - Hard", "")
+        topic = topic_from_deck_name(deck_name)
         
         # Set up regeneration (similar to generate_deck but replace existing)
         generate_button = self.views["deck_list"].generate_deck_button
@@ -177,121 +191,81 @@ class MainWindow(QMainWindow):
         generate_button.setText("Regenerating...")
         
         print(f"Regenerating deck {deck_id} for topic: {topic} with difficulty: {difficulty}")
-        
-        self.thread = QThread()
-        self.worker = DeckGenerationWorker(topic, difficulty)
-        self.worker.deck_id_to_replace = deck_id  # Store which deck to replace
-        self.worker.moveToThread(self.thread)
-        
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(self.on_regeneration_finished)
-        self.worker.error.connect(self.on_generation_error)
-        
-        self.worker.finished.connect(self.thread.quit)
-        self.worker.finished.connect(self.worker.deleteLater)
-        self.thread.finished.connect(self.thread.deleteLater)
-        
-        self.thread.start()
+        self.generation_jobs.regenerate(deck_id, topic, difficulty)
     
-    def on_regeneration_finished(self, deck_data, topic: str):
-        """Handles regeneration completion by replacing the existing deck."""
-        print("Regeneration finished, replacing existing deck.")
+    def on_regeneration_finished(self, summary, topic: str):
+        """Handles regeneration completion; the job has already replaced the cards."""
+        print("Regeneration finished, deck cards replaced.")
         
-        if deck_data and hasattr(self.worker, 'deck_id_to_replace'):
-            try:
-                # Delete old cards
-                conn = db.get_connection()
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM cards WHERE deck_id = ?", (self.worker.deck_id_to_replace,))
-                
-                # Insert new cards
-                for card in deck_data["cards"]:
-                    distractors_json = None
-                    if "distractors" in card:
-                        import json
-                        distractors_json = json.dumps(card["distractors"])
-                    
-                    cursor.execute("INSERT INTO cards (deck_id, front, back, distractors) VALUES (?, ?, ?, ?)", 
-                                 (self.worker.deck_id_to_replace, card["front"], card["back"], distractors_json))
-                
-                conn.commit()
-                conn.close()
-                QMessageBox.information(self, "Success", f"Successfully regenerated the deck with new difficulty!")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to regenerate the deck: {e}")
+        if summary:
+            QMessageBox.information(
+                self, "Success",
+                f"Successfully regenerated the deck with new difficulty!\n\n"
+                f"{summary['inserted']} new, {summary['updated']} updated, "
+                f"{summary['deleted']} removed, {summary['kept']} unchanged (progress kept).")
         else:
             QMessageBox.warning(self, "Regeneration Failed", f"Could not regenerate the deck for topic '{topic}'.")
         
-        self._reset_generate_button()
         self.views["deck_list"].refresh_decks()
     
     def delete_deck(self, deck_id: int):
-        """Delete a deck and refresh the list."""
-        try:
-            db.delete_deck(deck_id)
-            QMessageBox.information(self, "Success", "Deck deleted successfully!")
-            self.views["deck_list"].refresh_decks()
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to delete deck: {e}")
+        """Delete a deck in the background and refresh the list when done."""
+        if deck_id in self.deletions_in_progress:
+            return
+        self.deletions_in_progress.add(deck_id)
+
+        watcher = FutureWatcher(self)
+        watcher.progress.connect(self.on_deletion_progress)
+        watcher.succeeded.connect(lambda _deleted: self.on_deletion_finished(deck_id))
+        watcher.failed.connect(lambda error: self.on_deletion_error(deck_id, f"Failed to delete deck: {error}"))
+
+        self.statusBar().showMessage("Deleting deck...")
+        watcher.watch(writer.delete_deck_in_chunks(deck_id, progress_callback=watcher.progress.emit))
+
+    def on_deletion_progress(self, deleted: int, total: int):
+        """Shows chunked deletion progress in the status bar."""
+        self.statusBar().showMessage(f"Deleting deck... {deleted}/{total} cards removed")
+
+    def on_deletion_finished(self, deck_id: int):
+        """Handles the successful completion of a background deletion."""
+        self.deletions_in_progress.discard(deck_id)
+        self.statusBar().showMessage("Deck deleted successfully!", 5000)
+        self.views["deck_list"].refresh_decks()
+
+    def on_deletion_error(self, deck_id: int, error_message: str):
+        """Handles errors reported by the database writer."""
+        self.deletions_in_progress.discard(deck_id)
+        self.statusBar().clearMessage()
+        QMessageBox.critical(self, "Error", error_message)
+        self.views["deck_list"].refresh_decks()
     
+    def on_backup_finished(self, path):
+        self.statusBar().showMessage(f"Database backed up to {path.name}", 5000)
+
+    def on_backup_error(self, error):
+        if not isinstance(error, BackupCancelled):
+            print(f"Database backup failed: {error}")
+            self.statusBar().showMessage("Database backup failed; see the log for details.", 5000)
+
+    def on_maintenance_finished(self, report):
+        if report["integrity"]:
+            QMessageBox.warning(self, "Database Problem",
+                                "The database integrity check found problems. Restore a recent backup "
+                                "(python db_backup.py list) if decks or progress look wrong.")
+
+    def on_maintenance_error(self, error):
+        print(f"Database maintenance failed: {error}")
+
     def change_theme(self, theme_name: str):
-        """Change the application theme."""
-        # Apply new theme to main window
+        """
+        Apply the new theme to the window and restyle every view in place.
+        Views are kept, with their state and connections, rather than rebuilt.
+        """
         self.apply_theme()
-        
-        # Apply new theme to application
-        theme = get_current_theme()
-        QApplication.instance().setStyleSheet(f"""
-            QWidget {{
-                font-family: {theme['font_family']};
-                font-size: {theme['font_size']};
-                background: {theme['background']};
-                color: {theme['foreground']};
-            }}
-            QMessageBox {{
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
-                    stop:0 {theme['background']}, stop:1 {theme['panel_bg']});
-                border: 2px solid {theme['button_border']};
-                background-image: {theme.get('grid_texture', 'none')};
-            }}
-            QMessageBox QPushButton {{
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 {theme['button_bg']}, stop:1 {theme['background']});
-                border: 2px solid {theme['button_border']};
-                border-radius: 4px;
-                padding: 10px 20px;
-                font-weight: bold;
-                color: {theme['foreground']};
-                background-image: {theme.get('scan_lines', 'none')};
-            }}
-            QMessageBox QPushButton:hover {{
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 {theme['primary']}, stop:1 {theme['secondary']});
-                color: {theme['background']};
-            }}
-        """)
-        
-        # Recreate all views with new theme
-        current_view = self.central_widget.currentWidget()
-        current_view_name = "settings"  # Stay on settings after theme change
-        for name, view in self.views.items():
-            if view == current_view:
-                current_view_name = name
-                break
-        
-        # Clear old views
-        for view in list(self.views.values()):
-            self.central_widget.removeWidget(view)
-            view.setParent(None)
-        
-        self.views.clear()
-        
-        # Recreate views
-        self._init_views()
-        self._init_connections()
-        
-        # Return to settings view
-        self.show_view("settings")
+        QApplication.instance().setStyleSheet(app_stylesheet(get_current_theme()))
+        for view in self.views.values():
+            view.refresh_theme()
+        ui_instrumentation.checkpoint(f"theme:{theme_name}")
     
     def apply_theme(self):
         """Apply current theme to main window."""
@@ -312,14 +286,18 @@ class MainWindow(QMainWindow):
             }}
         """)
 
-    def on_generation_error(self, error_message: str):
-        """Handles errors reported by the worker thread."""
-        print(f"Worker reported an error: {error_message}")
+    def on_generation_error(self, job, error_message: str):
+        """Handles errors reported by a generation job."""
+        print(f"Generation job {job.get('id')} reported an error: {error_message}")
+        if job.get("kind") == "prefetch":
+            return
         QMessageBox.critical(self, "Error", error_message)
         self._reset_generate_button()
 
     def _reset_generate_button(self):
         """Resets the 'Generate' button to its initial state."""
+        if self.generation_jobs.is_busy():
+            return
         try:
             generate_button = self.views["deck_list"].generate_deck_button
             generate_button.setText("✨ Generate from Topic")
@@ -0,0 +1,70 @@
+"""
+Bridges concurrent.futures.Future results into Qt signals.
+
+Futures from the database writer complete on background threads. A
+FutureWatcher re-emits the outcome as Qt signals, which are delivered on the
+GUI thread, so slots can safely touch widgets.
+"""
+
+from functools import partial
+from itertools import count
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+# Watchers waiting to deliver. Often nothing else in Python refers to
+# a watcher (only its Qt parent does), so without this the cyclic garbage
+# collector could free it, and the slots connected to it, while its result
+# is still on its way to the GUI thread.
+_pending = {}
+_keys = count()
+
+
+class FutureWatcher(QObject):
+    """
+    Emits succeeded(result) or failed(exception) on the watcher's own
+    (normally the GUI) thread when a watched future completes, then
+    schedules itself for deletion.
+
+    Connect the signals before calling watch(): an already finished future
+    reports immediately.
+    """
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(object)
+    progress = pyqtSignal(int, int)  # Optional, for jobs that report progress
+    _done = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.future = None
+        self._key = next(_keys)
+        self._done.connect(self._deliver)
+
+    def watch(self, future):
+        self.future = future
+        _pending[self._key] = self
+        # Also forget the watcher if its parent deletes it before delivery.
+        self.destroyed.connect(partial(_pending.pop, self._key, None))
+        future.add_done_callback(self._done.emit)
+        return self
+
+    def _deliver(self, future):
+        # Queued by Qt onto this object's thread when the future completed
+        # elsewhere.
+        _pending.pop(self._key, None)
+        if not future.cancelled():
+            error = future.exception()
+            if error is not None:
+                self.failed.emit(error)
+            else:
+                self.succeeded.emit(future.result())
+        self.deleteLater()
+
+
+def watch_future(future, on_success=None, on_error=None, parent=None):
+    """Convenience wrapper: connect callbacks and start watching a future."""
+    watcher = FutureWatcher(parent)
+    if on_success is not None:
+        watcher.succeeded.connect(on_success)
+    if on_error is not None:
+        watcher.failed.connect(on_error)
+    return watcher.watch(future)
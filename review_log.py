@@ -0,0 +1,111 @@
+"""
+Append-only log of every answer given in a quiz.
+
+Each answer becomes a review_log row: the card, when it was answered, the
+option chosen, whether it was right and how long the question had been on
+screen. Answers are buffered in memory and appended through the database
+writer in batches of REVIEW_LOG_BATCH_SIZE (sooner once the oldest has
+waited REVIEW_LOG_FLUSH_SECONDS, when a quiz ends and at exit), so logging
+adds no write of its own per answer. Leitner progress is still saved per
+answer by record_answer; a crash loses at most the buffered log rows.
+
+After every batch, the new rows are rolled up into review_daily_deck and
+review_daily_card (per UTC day), which analytics read instead of the raw
+log:
+
+    python review_log.py stats [--days 30] [--deck ID]
+    python review_log.py rebuild
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime, timezone
+
+from simple_db import db
+from db_writer import writer
+
+# Answers appended per writer request.
+REVIEW_LOG_BATCH_SIZE = 50
+# Longest an answer waits in the buffer once the next one arrives.
+REVIEW_LOG_FLUSH_SECONDS = 60
+
+
+def _utc_timestamp():
+    # Same format as SQLite's CURRENT_TIMESTAMP, with milliseconds.
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat(" ", "milliseconds")
+
+
+def _report_error(future):
+    if future.exception() is not None:
+        print(f"Could not save the review log: {future.exception()}")
+
+
+class ReviewLog:
+    """
+    Buffers answers and appends them to review_log in batches. Only used
+    from the GUI thread.
+    """
+
+    def __init__(self, batch_size=REVIEW_LOG_BATCH_SIZE, flush_seconds=REVIEW_LOG_FLUSH_SECONDS):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._rows = []
+        self._oldest = None  # time.monotonic() of the first buffered answer
+
+    def __len__(self):
+        return len(self._rows)
+
+    def record(self, card_id, deck_id, answer, correct, response_ms):
+        """Buffer one answer (global card and deck IDs); flushes when a batch is due."""
+        if not self._rows:
+            self._oldest = time.monotonic()
+        self._rows.append((card_id, deck_id, _utc_timestamp(), answer, bool(correct), int(response_ms)))
+        if len(self._rows) >= self.batch_size or time.monotonic() - self._oldest >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Hand the buffered answers to the writer. Returns the Future of the rollup, or None."""
+        if not self._rows:
+            return None
+        rows, self._rows = self._rows, []
+        writer.submit(db.append_reviews, rows).add_done_callback(_report_error)
+        # Queued right behind the append, so it usually shares its commit.
+        future = writer.submit(db.roll_up_reviews)
+        future.add_done_callback(_report_error)
+        return future
+
+
+# Global review log, fed by the quiz view
+review_log = ReviewLog()
+
+
+def main(argv=None):
+    from simple_db import init_db
+
+    parser = argparse.ArgumentParser(description="Inspect the ZapCards review log.")
+    parser.add_argument("command", choices=["stats", "rebuild"],
+                        help="stats: reviews per day; rebuild: recompute the daily rollups from the log")
+    parser.add_argument("--days", type=int, default=30, help="days to show")
+    parser.add_argument("--deck", type=int, help="only this deck")
+    args = parser.parse_args(argv)
+
+    init_db()
+    try:
+        if args.command == "stats":
+            summary = db.get_review_summary(args.days, args.deck)
+            if not summary:
+                print("No reviews in that period.")
+            for day in summary:
+                print(f"{day['day']}  {day['reviews']:>6} reviews  {day['accuracy']:>5.0%} correct  "
+                      f"{day['avg_response_ms'] / 1000:>6.1f}s per answer")
+        else:
+            rows = writer.submit(db.rebuild_review_rollups).result()
+            print(f"Rolled up {rows} reviews.")
+    finally:
+        writer.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
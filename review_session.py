@@ -0,0 +1,91 @@
+"""
+Interleaved review sessions across several decks.
+
+A quiz covers one deck (QuizView.load_deck). A session covers the decks
+the user selected, or all of them: each deck contributes its own review
+queue, due cards first (oldest due date first), then cards never reviewed,
+and the queues are k-way merged with heapq.merge. Cards come out in due
+order across all decks, and new cards take turns between decks.
+
+Each deck's queue is read lazily, SESSION_PAGE_SIZE cards at a time with
+keyset pagination (see SimpleDB.due_card_page), so starting a session over
+200 decks costs one short index lookup per deck, and only the cards that
+are actually shown are ever loaded.
+"""
+
+import heapq
+from itertools import islice
+
+from config import REVIEW_SESSION_SIZE
+from simple_db import db
+
+# Cards read per page of one deck's queue.
+SESSION_PAGE_SIZE = 8
+
+
+class ReviewSession:
+    """
+    The merged review queue of one session. next_cards() runs database
+    reads (call it off the GUI thread), from one thread at a time.
+    """
+
+    def __init__(self, deck_ids, size=REVIEW_SESSION_SIZE, page_size=SESSION_PAGE_SIZE, database=db):
+        self.deck_ids = list(dict.fromkeys(deck_ids))
+        self.size = size
+        self.page_size = page_size
+        self.database = database
+        self.served = 0
+        self.finished = False
+        self._now = None   # CURRENT_TIMESTAMP when the session started
+        self._conn = None  # Read connection, open only during next_cards()
+        self._queue = heapq.merge(*(self._deck_queue(position, deck_id)
+                                    for position, deck_id in enumerate(self.deck_ids)))
+
+    def _deck_queue(self, position, deck_id):
+        """
+        One deck's queue as (sort key, deck_id, card_id), read a page at a
+        time. New cards are keyed as due now and by their rank in the deck,
+        so the merge deals them out round-robin between decks.
+        """
+        after = None
+        while True:
+            page = self.database.due_card_page(self._conn, deck_id, self._now, after, self.page_size)
+            for due_at, card_id in page:
+                yield (due_at, 0, position), deck_id, card_id
+            if len(page) < self.page_size:
+                break
+            after = page[-1]
+        # Fully reviewed decks skip the new-card phase without touching their cards.
+        if not self.database.has_new_cards(self._conn, deck_id):
+            return
+        rank, after_id = 0, 0
+        while True:
+            page = self.database.new_card_page(self._conn, deck_id, after_id, self.page_size)
+            for card_id in page:
+                rank += 1
+                yield (self._now, rank, position), deck_id, card_id
+            if len(page) < self.page_size:
+                return
+            after_id = page[-1]
+
+    def next_cards(self, count):
+        """
+        The next up to count cards, as (CardColumns, deck ID of each card).
+        Sets finished once the queue (or the session size) is used up.
+        """
+        count = max(min(count, self.size - self.served), 0)
+        self._conn = self.database.get_connection()
+        try:
+            if self._now is None:
+                # Cards answered during the session move past this and are not served again.
+                self._now = self._conn.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0]
+            picked = list(islice(self._queue, count))
+            cards = self.database.load_cards(self._conn, [card_id for _, _, card_id in picked])
+        finally:
+            self._conn.close()
+            self._conn = None
+        if len(picked) < count or self.served + len(picked) >= self.size:
+            self.finished = True
+        self.served += len(picked)
+        deck_of = {card_id: deck_id for _, deck_id, card_id in picked}
+        return cards, [deck_of[card_id] for card_id in cards.ids]
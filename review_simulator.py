@@ -0,0 +1,244 @@
+"""
+Offline review-workload simulator for the Leitner schedule.
+
+Projects how many reviews per day a schedule (LEITNER_BOX_DELAYS) produces
+and how much of the material is retained, over months and for very large
+collections, so box delays can be tuned before they ship.
+
+Each card gets a memory "stability" S in days: the chance of recalling it
+t days after the last review is exp(-t / S). A correct answer grows S, a
+lapse shrinks it, and the card moves between Leitner boxes with the same
+rule the app uses (simple_db.next_leitner_box). The simulation is fully
+vectorized with NumPy and cards are bucketed by due day, so a run over 1M
+cards and half a year takes a fraction of a second and sweeps can be
+spread over several processes.
+
+Examples:
+    python review_simulator.py
+    python review_simulator.py --delays 1,3,7,14,30 --delays 1,2,5,12,30
+    python review_simulator.py --scale-sweep 0.5:2.0:200 --jobs 4
+    python review_simulator.py --from-db --days 90 --daily
+
+NumPy is only needed for this tool, not for the app itself.
+"""
+
+import argparse
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency, see module docstring
+    np = None
+
+from config import DB_PATH, LEITNER_BOX_DELAYS
+
+# --- Memory model ---
+# Stability (days) right after a card is first learned.
+INITIAL_STABILITY = 4.0
+# Multiplier applied to stability after a correct review.
+STABILITY_GROWTH = 2.5
+# Multiplier applied after a lapse. A lapsed card is relearned, so it never
+# drops below the stability it had when first learned.
+LAPSE_FACTOR = 0.5
+# Log-normal spread of per-card difficulty (0 = all cards alike).
+DIFFICULTY_SPREAD = 0.35
+
+# --- Simulation defaults ---
+DEFAULT_CARDS = 1_000_000
+DEFAULT_DAYS = 180
+DEFAULT_NEW_PER_DAY = 10_000
+# Population retention is estimated every few days on a random sample of
+# the learned cards rather than on all of them.
+RETENTION_EVERY = 7
+RETENTION_SAMPLE = 100_000
+
+
+def simulate(delays, cards=DEFAULT_CARDS, days=DEFAULT_DAYS, new_per_day=DEFAULT_NEW_PER_DAY,
+             seed=0, initial_boxes=None, initial_due=None, retention_every=RETENTION_EVERY):
+    """
+    Run one schedule and return a dict of per-day arrays and summary stats.
+
+    delays lists the review delay in days for each Leitner box. Cards
+    described by initial_boxes/initial_due (due in days from day 0, e.g.
+    from load_progress_snapshot) start already learned; the rest are
+    introduced new_per_day at a time.
+    """
+    rng = np.random.default_rng(seed)
+    delays = np.maximum(np.asarray(delays, dtype=np.int32), 1)
+    top_box = len(delays) - 1
+
+    box = np.zeros(cards, dtype=np.int8)
+    last = np.zeros(cards, dtype=np.int32)
+    base_stability = (INITIAL_STABILITY * rng.lognormal(0.0, DIFFICULTY_SPREAD, cards)).astype(np.float32)
+    stability = base_stability.copy()
+    # Cards are filed under the day they fall due, so each day only touches
+    # the cards it reviews instead of scanning the whole collection.
+    agenda = {}
+
+    def schedule(day, card_indices):
+        if card_indices.size:
+            agenda.setdefault(day, []).append(card_indices)
+
+    learned = 0
+    if initial_boxes is not None and len(initial_boxes):
+        learned = min(len(initial_boxes), cards)
+        seeded_box = np.minimum(np.asarray(initial_boxes[:learned], dtype=np.int8), top_box)
+        seeded_due = np.asarray(initial_due[:learned], dtype=np.int32)
+        box[:learned] = seeded_box
+        last[:learned] = seeded_due - delays[seeded_box]
+        # A card that climbed to box b has survived b reviews.
+        stability[:learned] *= STABILITY_GROWTH ** seeded_box.astype(np.float32)
+        order = np.argsort(seeded_due, kind="stable")
+        due_days, starts = np.unique(seeded_due[order], return_index=True)
+        for due_day, chunk in zip(due_days, np.split(order, starts[1:])):
+            schedule(int(due_day), chunk)
+
+    daily_reviews = np.zeros(days, dtype=np.int64)
+    daily_correct = np.zeros(days, dtype=np.int64)
+    daily_new = np.zeros(days, dtype=np.int64)
+    retention_days, retention = [], []
+
+    for day in range(days):
+        if learned < cards and new_per_day > 0:
+            end = min(cards, learned + new_per_day)
+            last[learned:end] = day
+            schedule(day + int(delays[0]), np.arange(learned, end))
+            daily_new[day] = end - learned
+            learned = end
+
+        pending = agenda.pop(day, None)
+        if pending:
+            idx = np.concatenate(pending)
+            elapsed = (day - last[idx]).astype(np.float32)
+            card_stability = stability[idx]
+            recalled = rng.random(idx.size, dtype=np.float32) < np.exp(-elapsed / card_stability)
+            new_box = np.where(recalled, np.minimum(box[idx] + 1, top_box), 0).astype(np.int8)
+            stability[idx] = np.where(recalled, card_stability * STABILITY_GROWTH,
+                                      np.maximum(card_stability * LAPSE_FACTOR, base_stability[idx]))
+            box[idx] = new_box
+            last[idx] = day
+            for next_box in range(top_box + 1):
+                schedule(day + int(delays[next_box]), idx[new_box == next_box])
+            daily_reviews[day] = idx.size
+            daily_correct[day] = np.count_nonzero(recalled)
+
+        if learned and retention_every and (day % retention_every == 0 or day == days - 1):
+            sample = rng.integers(0, learned, size=min(learned, RETENTION_SAMPLE))
+            elapsed = (day - last[sample]).astype(np.float32)
+            retention_days.append(day)
+            retention.append(float(np.exp(-elapsed / stability[sample]).mean()))
+
+    reviewed = daily_reviews.sum()
+    return {
+        "delays": [int(d) for d in delays],
+        "daily_reviews": daily_reviews,
+        "daily_correct": daily_correct,
+        "daily_new": daily_new,
+        "retention_days": retention_days,
+        "retention": retention,
+        "mean_reviews": float(daily_reviews.mean()),
+        "peak_reviews": int(daily_reviews.max()),
+        "review_accuracy": float(daily_correct.sum() / reviewed) if reviewed else 0.0,
+        "final_retention": retention[-1] if retention else 0.0,
+    }
+
+
+def load_progress_snapshot(db_path=DB_PATH):
+    """
+    Read the real collection as a starting point: each reviewed card's
+    Leitner box and how many days until it is due, and the number of cards
+    that have never been reviewed.
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT leitner_box, CAST(julianday(next_review_at) - julianday('now') AS INTEGER) "
+            "FROM progress").fetchall()
+        total = conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+    finally:
+        conn.close()
+    boxes = np.array([row[0] or 0 for row in rows], dtype=np.int8)
+    due = np.maximum(np.array([row[1] or 0 for row in rows], dtype=np.int32), 0)
+    return boxes, due, max(total - len(rows), 0)
+
+
+def _parse_delays(text):
+    return [int(part) for part in text.split(",") if part.strip()]
+
+
+def _scaled_schedules(spec, base):
+    start, stop, count = spec.split(":")
+    start, stop, count = float(start), float(stop), int(count)
+    step = (stop - start) / (count - 1) if count > 1 else 0.0
+    schedules = []
+    for i in range(count):
+        scale = start + i * step
+        schedules.append([max(1, round(delay * scale)) for delay in base])
+    return schedules
+
+
+def _run(job):
+    delays, options = job
+    return simulate(delays, **options)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Project daily review load and retention for Leitner schedules.")
+    parser.add_argument("--delays", action="append", type=_parse_delays,
+                        help="comma-separated box delays in days; repeat to compare schedules "
+                             "(default: LEITNER_BOX_DELAYS from config.py)")
+    parser.add_argument("--scale-sweep", metavar="START:STOP:COUNT",
+                        help="also try COUNT copies of the base delays scaled from START to STOP")
+    parser.add_argument("--cards", type=int, default=DEFAULT_CARDS, help="collection size")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help="days to simulate")
+    parser.add_argument("--new-per-day", type=int, default=DEFAULT_NEW_PER_DAY, help="new cards learned per day")
+    parser.add_argument("--from-db", nargs="?", const=str(DB_PATH), metavar="PATH",
+                        help="start from the boxes and due dates recorded in a ZapCards database")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jobs", type=int, default=1, help="worker processes for sweeps")
+    parser.add_argument("--daily", action="store_true", help="print the per-day load of each schedule")
+    args = parser.parse_args(argv)
+
+    if np is None:
+        print("The review simulator needs NumPy: pip install numpy")
+        return 1
+
+    base = [LEITNER_BOX_DELAYS[box] for box in sorted(LEITNER_BOX_DELAYS)]
+    schedules = args.delays or [base]
+    if args.scale_sweep:
+        schedules += _scaled_schedules(args.scale_sweep, schedules[0])
+    # Rounding makes neighbouring scales collide; simulate each schedule once.
+    schedules = list(dict.fromkeys(tuple(delays) for delays in schedules))
+
+    options = {"cards": args.cards, "days": args.days, "new_per_day": args.new_per_day, "seed": args.seed}
+    if args.from_db:
+        boxes, due, unreviewed = load_progress_snapshot(args.from_db)
+        options.update(initial_boxes=boxes, initial_due=due, cards=max(args.cards, len(boxes) + unreviewed))
+        print(f"Loaded {len(boxes)} reviewed cards ({unreviewed} never reviewed) from {args.from_db}")
+
+    started = time.perf_counter()
+    jobs = [(delays, options) for delays in schedules]
+    if args.jobs > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(_run, jobs))
+    else:
+        results = [_run(job) for job in jobs]
+    elapsed = time.perf_counter() - started
+
+    print(f"{'delays':<28}{'mean/day':>10}{'peak/day':>10}{'accuracy':>10}{'retention':>11}")
+    for result in sorted(results, key=lambda r: r["mean_reviews"]):
+        print(f"{','.join(map(str, result['delays'])):<28}{result['mean_reviews']:>10.0f}"
+              f"{result['peak_reviews']:>10}{result['review_accuracy']:>10.1%}{result['final_retention']:>11.1%}")
+        if args.daily:
+            for day, (reviews, new) in enumerate(zip(result["daily_reviews"], result["daily_new"])):
+                print(f"    day {day:>4}: {reviews:>9} reviews, {new:>7} new")
+    print(f"Simulated {len(results)} schedule(s) of {options['cards']:,} cards over {args.days} days "
+          f"in {elapsed:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
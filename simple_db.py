@@ -4,16 +4,654 @@ Simple SQLite database implementation without SQLAlchemy.
 
 import sqlite3
 import json
+import random
+from array import array
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
-from config import DB_PATH
+from config import (DB_PATH, LEITNER_BOX_COUNT, LEITNER_BOX_DELAYS, PREFETCH_CACHE_DAYS,
+                    LIBRARY_DIR, LIBRARY_PATHS, LIBRARY_MMAP_SIZE)
+from card_store import CardColumns
+from answer_index import AnswerLookup, index_pending_answers
+
+# Cards in this Leitner box (or above) count as mastered in deck_stats.
+MASTERED_BOX = LEITNER_BOX_COUNT - 1
+
+# Cards removed per transaction when deleting a deck in the background.
+DELETE_CHUNK_SIZE = 500
+
+# Rows fetched per round trip by iter_deck_cards.
+STREAM_BATCH_SIZE = 500
+
+# Rows handed to executemany at a time by bulk_insert_cards.
+BULK_INSERT_BATCH_SIZE = 5000
+
+SAMPLING_STRATEGIES = ("uniform", "weighted", "due")
+
+# Deck and card IDs from an attached library are negative:
+# -(n * LIBRARY_ID_STRIDE + local ID) for the n-th library. Small enough to
+# stay a 32-bit int, so they pass through Qt int signals unchanged.
+LIBRARY_ID_STRIDE = 10_000_000
+
+# Wraps a query selecting (id, front, back) from {schema}.cards so each card
+# comes back with its distractors: one row per distractor, in position
+# order, as CardColumns.from_rows expects.
+_WITH_DISTRACTORS = '''
+    SELECT c.id, c.front, c.back, d.text
+    FROM ({cards}) c
+    LEFT JOIN {schema}.distractors d ON d.card_id = c.id
+    ORDER BY c.id, d.position
+'''
+
+def next_leitner_box(box, correct):
+    """Leitner rule: a correct answer moves the card up one box, a miss sends it back to box 0."""
+    if not correct:
+        return 0
+    return min(box + 1, LEITNER_BOX_COUNT - 1)
+
+
+def normalize_front(text):
+    """Case- and whitespace-insensitive key used to match cards across regenerations."""
+    return " ".join((text or "").casefold().split())
+
+
+def is_library_id(deck_or_card_id):
+    """True for IDs of decks and cards from an attached (read-only) library."""
+    return deck_or_card_id < 0
+
+
+def _read_only_uri(path):
+    # immutable: the file is never written while we use it, so SQLite can
+    # skip locking and change detection entirely.
+    return Path(path).resolve().as_uri() + "?mode=ro&immutable=1"
+
+
+class _Source:
+    """Where a deck lives: the main database or one attached library."""
+
+    def __init__(self, schema="main", library=None, number=0, path=None):
+        self.schema = schema
+        self.library = library  # Library name; None for the main database
+        self.number = number    # Position among the attached libraries, from 1
+        self.path = path
+        if library is None:
+            self.progress = "main.progress"
+        else:
+            # Progress on library cards lives in the user's own database.
+            name = library.replace("'", "''")
+            self.progress = ("(SELECT card_id, deck_id, leitner_box, next_review_at "
+                             f"FROM main.library_progress WHERE library = '{name}')")
+
+    def to_global(self, local_id):
+        return local_id if self.library is None else -(self.number * LIBRARY_ID_STRIDE + local_id)
+
+
+_MAIN_SOURCE = _Source()
+
+
+def _globalize(columns, source):
+    """Replace library-local card IDs in a CardColumns with global ones."""
+    if source.library is not None:
+        columns.ids = array("q", (source.to_global(card_id) for card_id in columns.ids))
+    return columns
+
+
+def _add_churn(cursor, rows):
+    """Count rows written or deleted, for the maintenance scheduler (see db_maintenance)."""
+    if rows:
+        cursor.execute(
+            "INSERT INTO maintenance_state (name, value) VALUES ('churn', ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value", (rows,))
+
+
+def convert_to_incremental_vacuum(conn):
+    """
+    Switch a database to auto_vacuum=INCREMENTAL. That only takes effect
+    through a VACUUM, which rewrites the whole file and cannot run inside a
+    transaction, so conn must be in autocommit mode (or have none open).
+    """
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+def _distractor_rows(card_id, distractors):
+    """(card_id, position, text) rows for the distractors table."""
+    return [(card_id, position, str(text)) for position, text in enumerate(distractors or ())]
+
+
+# Triggers that keep deck_stats current so the deck list never aggregates
+# over cards/progress. Due counts depend on the clock and are not stored.
+_DECK_STATS_TRIGGERS = [
+    '''
+        CREATE TRIGGER IF NOT EXISTS deck_stats_deck_insert
+        AFTER INSERT ON decks
+        BEGIN
+            INSERT OR IGNORE INTO deck_stats (deck_id) VALUES (NEW.id);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS deck_stats_deck_delete
+        AFTER DELETE ON decks
+        BEGIN
+            DELETE FROM deck_stats WHERE deck_id = OLD.id;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS deck_stats_card_insert
+        AFTER INSERT ON cards
+        BEGIN
+            UPDATE deck_stats SET card_count = card_count + 1
+            WHERE deck_id = NEW.deck_id;
+        END
+    ''',
+    # Runs before the row disappears so the card's progress can still be
+    # subtracted; the progress triggers are no-ops once the card is gone.
+    f'''
+        CREATE TRIGGER IF NOT EXISTS deck_stats_card_delete
+        BEFORE DELETE ON cards
+        BEGIN
+            UPDATE deck_stats SET
+                card_count = card_count - 1,
+                reviewed_count = reviewed_count -
+                    (SELECT COUNT(*) FROM progress WHERE card_id = OLD.id),
+                box_sum = box_sum -
+                    COALESCE((SELECT leitner_box FROM progress WHERE card_id = OLD.id), 0),
+                mastered_count = mastered_count -
+                    (SELECT COUNT(*) FROM progress
+                     WHERE card_id = OLD.id AND leitner_box >= {MASTERED_BOX})
+            WHERE deck_id = OLD.deck_id;
+        END
+    ''',
+    f'''
+        CREATE TRIGGER IF NOT EXISTS deck_stats_progress_insert
+        AFTER INSERT ON progress
+        BEGIN
+            UPDATE deck_stats SET
+                reviewed_count = reviewed_count + 1,
+                box_sum = box_sum + COALESCE(NEW.leitner_box, 0),
+                mastered_count = mastered_count + (COALESCE(NEW.leitner_box, 0) >= {MASTERED_BOX})
+            WHERE deck_id = (SELECT deck_id FROM cards WHERE id = NEW.card_id);
+        END
+    ''',
+    f'''
+        CREATE TRIGGER IF NOT EXISTS deck_stats_progress_update
+        AFTER UPDATE OF leitner_box ON progress
+        BEGIN
+            UPDATE deck_stats SET
+                box_sum = box_sum - COALESCE(OLD.leitner_box, 0) + COALESCE(NEW.leitner_box, 0),
+                mastered_count = mastered_count
+                    - (COALESCE(OLD.leitner_box, 0) >= {MASTERED_BOX})
+                    + (COALESCE(NEW.leitner_box, 0) >= {MASTERED_BOX})
+            WHERE deck_id = (SELECT deck_id FROM cards WHERE id = NEW.card_id);
+        END
+    ''',
+    f'''
+        CREATE TRIGGER IF NOT EXISTS deck_stats_progress_delete
+        AFTER DELETE ON progress
+        BEGIN
+            UPDATE deck_stats SET
+                reviewed_count = reviewed_count - 1,
+                box_sum = box_sum - COALESCE(OLD.leitner_box, 0),
+                mastered_count = mastered_count - (COALESCE(OLD.leitner_box, 0) >= {MASTERED_BOX})
+            WHERE deck_id = (SELECT deck_id FROM cards WHERE id = OLD.card_id);
+        END
+    ''',
+]
+
+
+def _create_deck_stats_triggers(cursor):
+    """
+    (Re)create the triggers that keep deck_stats in step with decks,
+    cards and progress. Safe to call repeatedly.
+    """
+    for trigger_sql in _DECK_STATS_TRIGGERS:
+        cursor.execute(trigger_sql)
+
+
+def _rebuild_deck_stats(cursor):
+    """Recompute every deck_stats row from the base tables."""
+    cursor.execute("DELETE FROM deck_stats")
+    cursor.execute(f'''
+        INSERT INTO deck_stats (deck_id, card_count, reviewed_count, box_sum, mastered_count)
+        SELECT d.id,
+               COUNT(c.id),
+               COUNT(p.card_id),
+               COALESCE(SUM(p.leitner_box), 0),
+               COALESCE(SUM(p.leitner_box >= {MASTERED_BOX}), 0)
+        FROM decks d
+        LEFT JOIN cards c ON c.deck_id = d.id
+        LEFT JOIN progress p ON p.card_id = c.id
+        GROUP BY d.id
+    ''')
+
+
+def _migrate_deck_stats(cursor):
+    """Add the materialized per-deck statistics table."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS deck_stats (
+            deck_id INTEGER PRIMARY KEY,
+            card_count INTEGER NOT NULL DEFAULT 0,
+            reviewed_count INTEGER NOT NULL DEFAULT 0,
+            box_sum INTEGER NOT NULL DEFAULT 0,
+            mastered_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    _create_deck_stats_triggers(cursor)
+    _rebuild_deck_stats(cursor)
+
+
+def _migrate_cascade_deletes(cursor):
+    """
+    Rebuild cards and progress with ON DELETE CASCADE foreign keys.
+
+    SQLite cannot alter a foreign key in place, so both tables are copied
+    into new definitions. Orphaned rows left behind by the old delete_deck
+    are dropped on the way, and the deck_id index makes chunked deletes
+    cheap.
+    """
+    cursor.execute('''
+        CREATE TABLE cards_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            deck_id INTEGER NOT NULL,
+            front TEXT NOT NULL,
+            back TEXT NOT NULL,
+            distractors TEXT,
+            image_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (deck_id) REFERENCES decks (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO cards_new (id, deck_id, front, back, distractors, image_path, created_at)
+        SELECT id, deck_id, front, back, distractors, image_path, created_at
+        FROM cards WHERE deck_id IN (SELECT id FROM decks)
+    ''')
+    cursor.execute('''
+        CREATE TABLE progress_new (
+            card_id INTEGER PRIMARY KEY,
+            leitner_box INTEGER DEFAULT 0,
+            last_reviewed_at TIMESTAMP,
+            next_review_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (card_id) REFERENCES cards (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO progress_new (card_id, leitner_box, last_reviewed_at, next_review_at)
+        SELECT card_id, leitner_box, last_reviewed_at, next_review_at
+        FROM progress WHERE card_id IN (SELECT id FROM cards_new)
+    ''')
+    cursor.execute("DROP TABLE progress")
+    cursor.execute("DROP TABLE cards")
+    cursor.execute("ALTER TABLE cards_new RENAME TO cards")
+    cursor.execute("ALTER TABLE progress_new RENAME TO progress")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cards_deck_id ON cards (deck_id)")
+
+    # Dropping the old tables took their triggers with them.
+    _create_deck_stats_triggers(cursor)
+    _rebuild_deck_stats(cursor)
+
+
+def _migrate_progress_deck_index(cursor):
+    """
+    Denormalize deck_id onto progress so due cards of one deck can be read
+    in next_review_at order straight from an index.
+    """
+    cursor.execute("ALTER TABLE progress ADD COLUMN deck_id INTEGER")
+    cursor.execute("UPDATE progress SET deck_id = (SELECT deck_id FROM cards WHERE id = progress.card_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_progress_deck_due ON progress (deck_id, next_review_at)")
+    # Writers normally supply deck_id; this covers any that do not.
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS progress_fill_deck_id
+        AFTER INSERT ON progress
+        WHEN NEW.deck_id IS NULL
+        BEGIN
+            UPDATE progress SET deck_id = (SELECT deck_id FROM cards WHERE id = NEW.card_id)
+            WHERE card_id = NEW.card_id;
+        END
+    ''')
+
+
+def _migrate_generation_jobs(cursor):
+    """
+    Persist deck generation requests, and every card received for them, so
+    an interrupted generation can be resumed instead of paid for again.
+    """
+    cursor.execute('''
+        CREATE TABLE generation_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            target_count INTEGER NOT NULL,
+            replace_deck_id INTEGER REFERENCES decks (id) ON DELETE SET NULL,
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            deck_name TEXT,
+            deck_description TEXT,
+            result_deck_id INTEGER,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("CREATE INDEX idx_generation_jobs_state ON generation_jobs (state)")
+    # One row per card of each API response ("shard"). The primary key makes
+    # saving a shard idempotent if it is ever written twice.
+    cursor.execute('''
+        CREATE TABLE generation_job_cards (
+            job_id INTEGER NOT NULL REFERENCES generation_jobs (id) ON DELETE CASCADE,
+            shard INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            front TEXT NOT NULL,
+            back TEXT NOT NULL,
+            distractors TEXT,
+            PRIMARY KEY (job_id, shard, position)
+        )
+    ''')
+
+
+def _migrate_response_cache(cursor):
+    """
+    Tell prefetch jobs apart from deck jobs, and keep the decks they
+    generate in a cache until a regeneration asks for them.
+    """
+    cursor.execute("ALTER TABLE generation_jobs ADD COLUMN kind TEXT NOT NULL DEFAULT 'deck'")
+    cursor.execute('''
+        CREATE TABLE response_cache (
+            topic_key TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            deck_name TEXT,
+            deck_description TEXT,
+            cards TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (topic_key, difficulty)
+        )
+    ''')
+
+
+# Triggers that keep answer_index (see answer_index.py) in step with the
+# cards table. They only count references to each distinct answer; kind and
+# tokens are filled in by index_pending_answers.
+_ANSWER_INDEX_TRIGGERS = [
+    '''
+        CREATE TRIGGER IF NOT EXISTS answer_index_card_insert
+        AFTER INSERT ON cards
+        WHEN trim(NEW.back) != ''
+        BEGIN
+            INSERT INTO answer_index (answer_key, answer, ref_count)
+            VALUES (lower(trim(NEW.back)), trim(NEW.back), 1)
+            ON CONFLICT (answer_key) DO UPDATE SET ref_count = ref_count + 1;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS answer_index_card_delete
+        AFTER DELETE ON cards
+        BEGIN
+            UPDATE answer_index SET ref_count = ref_count - 1 WHERE answer_key = lower(trim(OLD.back));
+            DELETE FROM answer_index WHERE answer_key = lower(trim(OLD.back)) AND ref_count <= 0;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS answer_index_card_update
+        AFTER UPDATE OF back ON cards
+        WHEN OLD.back IS NOT NEW.back
+        BEGIN
+            UPDATE answer_index SET ref_count = ref_count - 1 WHERE answer_key = lower(trim(OLD.back));
+            DELETE FROM answer_index WHERE answer_key = lower(trim(OLD.back)) AND ref_count <= 0;
+            INSERT INTO answer_index (answer_key, answer, ref_count)
+            SELECT lower(trim(NEW.back)), trim(NEW.back), 1 WHERE trim(NEW.back) != ''
+            ON CONFLICT (answer_key) DO UPDATE SET ref_count = ref_count + 1;
+        END
+    ''',
+]
+
+
+def _create_answer_index_triggers(cursor):
+    """(Re)create the answer_index triggers. Safe to call repeatedly."""
+    for trigger_sql in _ANSWER_INDEX_TRIGGERS:
+        cursor.execute(trigger_sql)
+
+
+def _migrate_answer_index(cursor):
+    """
+    Build the library-wide answer index used for cross-deck distractors.
+    Existing answers are loaded here and classified on the next start.
+    """
+    cursor.execute('''
+        CREATE TABLE answer_index (
+            id INTEGER PRIMARY KEY,
+            answer_key TEXT NOT NULL UNIQUE,
+            answer TEXT NOT NULL,
+            kind TEXT,
+            ref_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute("CREATE INDEX idx_answer_index_kind ON answer_index (kind, id)")
+    cursor.execute('''
+        CREATE TABLE answer_tokens (
+            token TEXT NOT NULL,
+            answer_id INTEGER NOT NULL REFERENCES answer_index (id) ON DELETE CASCADE,
+            PRIMARY KEY (token, answer_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX idx_answer_tokens_answer ON answer_tokens (answer_id)")
+    cursor.execute('''
+        INSERT INTO answer_index (answer_key, answer, ref_count)
+        SELECT lower(trim(back)), MIN(trim(back)), COUNT(*)
+        FROM cards WHERE trim(back) != ''
+        GROUP BY lower(trim(back))
+    ''')
+    _create_answer_index_triggers(cursor)
+
+
+def _migrate_distractors_table(cursor):
+    """
+    Move distractors out of the JSON text in cards.distractors into one row
+    per distractor. The old column is kept (SQLite cannot drop it cheaply)
+    but emptied, and nothing reads it any more.
+    """
+    cursor.execute('''
+        CREATE TABLE distractors (
+            card_id INTEGER NOT NULL REFERENCES cards (id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            PRIMARY KEY (card_id, position)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX idx_distractors_text ON distractors (text)")
+    # Malformed JSON and non-array values are dropped, as the old reader did.
+    cursor.execute('''
+        INSERT INTO distractors (card_id, position, text)
+        SELECT c.id, j.key, CAST(j.value AS TEXT)
+        FROM cards c, json_each(c.distractors) j
+        WHERE c.distractors IS NOT NULL AND json_valid(c.distractors)
+          AND json_type(c.distractors) = 'array' AND j.value IS NOT NULL
+    ''')
+    cursor.execute("UPDATE cards SET distractors = NULL WHERE distractors IS NOT NULL")
+
+
+def _migrate_library_progress(cursor):
+    """
+    Review progress for cards of shared libraries. The libraries themselves
+    are read-only, so their progress is kept here, keyed by library name
+    and the card's ID within the library.
+    """
+    cursor.execute('''
+        CREATE TABLE library_progress (
+            library TEXT NOT NULL,
+            card_id INTEGER NOT NULL,
+            deck_id INTEGER NOT NULL,
+            leitner_box INTEGER DEFAULT 0,
+            last_reviewed_at TIMESTAMP,
+            next_review_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (library, card_id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX idx_library_progress_due ON library_progress (library, deck_id, next_review_at)")
+
+
+def _migrate_maintenance_state(cursor):
+    """
+    Counters and timestamps for the maintenance scheduler. Databases created
+    from now on start with auto_vacuum=INCREMENTAL (see init_db); existing
+    ones are converted by a VACUUM after the migration, which cannot run in
+    this transaction.
+    """
+    cursor.execute('''
+        CREATE TABLE maintenance_state (
+            name TEXT PRIMARY KEY,
+            value REAL NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def _migrate_review_log(cursor):
+    """
+    The append-only log of answers (see review_log) and its daily rollups
+    per deck and per card. library is '' for the user's own cards, whose
+    IDs are local like everywhere else in the schema. There are no foreign
+    keys: the log outlives deleted decks, and deleting a deck should not
+    have to walk its history.
+    """
+    cursor.execute('''
+        CREATE TABLE review_log (
+            id INTEGER PRIMARY KEY,
+            library TEXT NOT NULL DEFAULT '',
+            card_id INTEGER NOT NULL,
+            deck_id INTEGER NOT NULL,
+            reviewed_at TIMESTAMP NOT NULL,
+            answer TEXT,
+            correct INTEGER NOT NULL,
+            response_ms INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE review_daily_deck (
+            library TEXT NOT NULL,
+            deck_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            reviews INTEGER NOT NULL,
+            correct INTEGER NOT NULL,
+            response_ms INTEGER NOT NULL,
+            PRIMARY KEY (library, deck_id, day)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE review_daily_card (
+            library TEXT NOT NULL,
+            card_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            deck_id INTEGER NOT NULL,
+            reviews INTEGER NOT NULL,
+            correct INTEGER NOT NULL,
+            response_ms INTEGER NOT NULL,
+            PRIMARY KEY (library, card_id, day)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX idx_review_daily_card_deck ON review_daily_card (library, deck_id, day)")
+
+
+def _migrate_new_card_index(cursor):
+    """
+    Flag cards that have progress, kept in step by triggers, so a deck's
+    never-reviewed cards come from a partial index instead of a scan of
+    the whole deck checking progress card by card.
+    """
+    cursor.execute("ALTER TABLE cards ADD COLUMN reviewed INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("UPDATE cards SET reviewed = 1 WHERE id IN (SELECT card_id FROM progress)")
+    cursor.execute("CREATE INDEX idx_cards_new ON cards (deck_id, id) WHERE reviewed = 0")
+    cursor.execute('''
+        CREATE TRIGGER cards_reviewed_progress_insert
+        AFTER INSERT ON progress
+        BEGIN
+            UPDATE cards SET reviewed = 1 WHERE id = NEW.card_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER cards_reviewed_progress_delete
+        AFTER DELETE ON progress
+        BEGIN
+            UPDATE cards SET reviewed = 0 WHERE id = OLD.card_id;
+        END
+    ''')
+
+
+# Schema migrations, applied in order. PRAGMA user_version records how many
+# have run, so append new steps and never reorder existing ones.
+MIGRATIONS = [
+    _migrate_deck_stats,
+    _migrate_cascade_deletes,
+    _migrate_progress_deck_index,
+    _migrate_generation_jobs,
+    _migrate_response_cache,
+    _migrate_answer_index,
+    _migrate_distractors_table,
+    _migrate_library_progress,
+    _migrate_maintenance_state,
+    _migrate_review_log,
+    _migrate_new_card_index,
+]
+
+# Databases up to this size are converted to incremental auto-vacuum during
+# startup; larger ones are left to idle maintenance or db_maintenance.py.
+AUTO_VACUUM_CONVERT_MAX_BYTES = 64 * 1024 * 1024
+
+# Oldest schema a shared library file may have: it needs the distractors table.
+LIBRARY_MIN_VERSION = MIGRATIONS.index(_migrate_distractors_table) + 1
+
+
+def _check_library(path):
+    """Why a library file cannot be attached, or None if it can."""
+    if not path.is_file():
+        return "file not found"
+    try:
+        conn = sqlite3.connect(_read_only_uri(path), uri=True)
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < LIBRARY_MIN_VERSION:
+                return f"schema version {version} is older than {LIBRARY_MIN_VERSION}"
+            largest = conn.execute("SELECT MAX(COALESCE((SELECT MAX(id) FROM decks), 0), "
+                                   "COALESCE((SELECT MAX(id) FROM cards), 0))").fetchone()[0]
+            if largest >= LIBRARY_ID_STRIDE:
+                return f"IDs above {LIBRARY_ID_STRIDE} are not supported"
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        return str(e)
+    return None
+
+
+def _run_migrations(conn):
+    """Apply any migrations this database has not seen yet."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        try:
+            migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Applied database migration {number}: {migration.__name__}")
+
 
 def init_db():
-    """Initialize the database and create tables."""
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    """Initialize the database (db.db_path) and create tables."""
+    db_path = Path(db.db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
+    # Lets maintenance hand free pages back a few at a time (see
+    # db_maintenance). Only takes effect here on a brand-new database.
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    
+    # WAL lets the quiz and deck list keep reading while a background job
+    # (e.g. a large deck deletion) is writing.
+    cursor.execute("PRAGMA journal_mode = WAL")
+    
     # Create tables
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS decks (
@@ -58,6 +696,17 @@ def init_db():
         # Column already exists
         pass
     
+    _run_migrations(conn)
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        if db_path.stat().st_size <= AUTO_VACUUM_CONVERT_MAX_BYTES:
+            convert_to_incremental_vacuum(conn)
+            print("Switched the database to incremental auto-vacuum")
+        else:
+            print("The database will switch to incremental auto-vacuum during idle maintenance")
+    # Classify answers the migration or an older version left unindexed
+    if index_pending_answers(conn):
+        conn.commit()
+    
     # Add sample data if no decks exist
     cursor.execute("SELECT COUNT(*) FROM decks")
     if cursor.fetchone()[0] == 0:
@@ -76,77 +725,898 @@ def init_db():
         for front, back in sample_cards:
             cursor.execute("INSERT INTO cards (deck_id, front, back) VALUES (?, ?, ?)", 
                           (deck_id, front, back))
+        index_pending_answers(conn)
         
         conn.commit()
     
     conn.close()
+    db.attach_libraries(LIBRARY_PATHS)
 
 class SimpleDB:
     def __init__(self):
         self.db_path = DB_PATH
+        self.libraries = []  # _Source per attached shared library
     
     def get_connection(self):
-        return sqlite3.connect(self.db_path)
+        if self.libraries:
+            # URI mode, so the libraries can be attached read-only.
+            conn = sqlite3.connect(Path(self.db_path).resolve().as_uri(), uri=True)
+        else:
+            conn = sqlite3.connect(self.db_path)
+        # Foreign keys are off by default in SQLite and must be enabled
+        # per connection for the ON DELETE CASCADE rules to apply.
+        conn.execute("PRAGMA foreign_keys = ON")
+        for source in self.libraries:
+            conn.execute(f"ATTACH DATABASE ? AS {source.schema}", (_read_only_uri(source.path),))
+            conn.execute(f"PRAGMA {source.schema}.mmap_size = {LIBRARY_MMAP_SIZE}")
+        return conn
+
+    def attach_libraries(self, paths):
+        """
+        Attach these shared library databases (read-only, memory-mapped) to
+        every connection opened from now on. Their decks are listed and
+        quizzed like the user's own; progress on them is stored in
+        library_progress. Unusable files are skipped. Returns the names of
+        the libraries attached.
+        """
+        self.libraries = []
+        for path in paths:
+            path = Path(path)
+            problem = _check_library(path)
+            if problem is None and any(source.library == path.stem for source in self.libraries):
+                problem = "a library with the same name is already attached"
+            if problem:
+                print(f"Skipping deck library {path}: {problem}")
+                continue
+            number = len(self.libraries) + 1
+            self.libraries.append(_Source(f"library{number}", path.stem, number, path))
+            print(f"Attached deck library '{path.stem}' from {path}")
+        return [source.library for source in self.libraries]
+
+    def _source(self, global_id):
+        """The _Source a deck or card ID belongs to, and its ID there."""
+        if not is_library_id(global_id):
+            return _MAIN_SOURCE, global_id
+        number, local_id = divmod(-global_id, LIBRARY_ID_STRIDE)
+        if not 1 <= number <= len(self.libraries):
+            raise ValueError(f"No deck library is attached for ID {global_id}")
+        return self.libraries[number - 1], local_id
+
+    def _require_user_deck(self, deck_id):
+        if is_library_id(deck_id):
+            raise ValueError("Decks from a shared library are read-only.")
+
+    @contextmanager
+    def _write(self, conn=None):
+        """
+        Yield a cursor for a mutation.
+
+        With conn given (the writer thread's connection, see db_writer) the
+        caller owns the transaction. Otherwise a private connection is
+        opened, committed or rolled back, and closed here. Its transaction
+        takes the write lock up front (BEGIN IMMEDIATE), like the writer's,
+        so reads it makes before writing (e.g. the next card ID in
+        _insert_card_rows) cannot be overtaken by another writer.
+        """
+        if conn is not None:
+            yield conn.cursor()
+            return
+        conn = self.get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn.cursor()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
     
     def get_all_decks(self):
+        """
+        Return every deck with its materialized statistics.
+
+        Stats come straight from deck_stats, so this is one row per deck
+        regardless of how many cards or reviews the library holds. Decks of
+        attached shared libraries follow the user's own, with their
+        "library" set to the library name (None for the user's decks).
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT id, name, description FROM decks")
+        parts = ['''
+            SELECT 0, d.id, d.name, d.description,
+                   COALESCE(s.card_count, 0), COALESCE(s.reviewed_count, 0),
+                   COALESCE(s.box_sum, 0), COALESCE(s.mastered_count, 0)
+            FROM main.decks d
+            LEFT JOIN main.deck_stats s ON s.deck_id = d.id
+        ''']
+        for source in self.libraries:
+            parts.append(f'''
+                SELECT {source.number}, d.id, d.name, d.description,
+                       COALESCE(s.card_count, 0), COALESCE(p.reviewed_count, 0),
+                       COALESCE(p.box_sum, 0), COALESCE(p.mastered_count, 0)
+                FROM {source.schema}.decks d
+                LEFT JOIN {source.schema}.deck_stats s ON s.deck_id = d.id
+                LEFT JOIN (SELECT deck_id, COUNT(*) AS reviewed_count, SUM(leitner_box) AS box_sum,
+                                  SUM(leitner_box >= {MASTERED_BOX}) AS mastered_count
+                           FROM {source.progress} GROUP BY deck_id) p ON p.deck_id = d.id
+            ''')
+        cursor.execute(" UNION ALL ".join(parts))
         decks = cursor.fetchall()
         conn.close()
-        return [{"id": d[0], "name": d[1], "description": d[2]} for d in decks]
+        sources = [_MAIN_SOURCE] + self.libraries
+        result = []
+        for d in decks:
+            source = sources[d[0]]
+            card_count, reviewed_count, box_sum, mastered_count = d[4:8]
+            result.append({
+                "id": source.to_global(d[1]),
+                "name": d[2],
+                "description": d[3],
+                "library": source.library,
+                "card_count": card_count,
+                "new_count": card_count - reviewed_count,
+                "mastered_count": mastered_count,
+                # Average progress towards the top Leitner box, 0.0 - 1.0
+                "mastery": box_sum / (card_count * MASTERED_BOX) if card_count and MASTERED_BOX else 0.0,
+            })
+        return result
     
     def get_deck_cards(self, deck_id):
+        return [card.to_dict() for card in self.get_deck_card_columns(deck_id)]
+
+    def get_deck_card_columns(self, deck_id, limit=None):
+        """
+        Load a deck into a compact CardColumns (see card_store) rather than
+        one dict per card, distractors included, with a single join.
+        """
+        source, deck_id = self._source(deck_id)
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT id, front, back, distractors FROM cards WHERE deck_id = ?", (deck_id,))
-        cards = cursor.fetchall()
+        query = f"SELECT id, front, back FROM {source.schema}.cards WHERE deck_id = ? ORDER BY id"
+        params = (deck_id,)
+        if limit is not None:
+            query += " LIMIT ?"
+            params += (limit,)
+        cursor.execute(_WITH_DISTRACTORS.format(cards=query, schema=source.schema), params)
+        columns = _globalize(CardColumns.from_rows(cursor), source)
         conn.close()
-        result = []
-        for c in cards:
-            card = {"id": c[0], "front": c[1], "back": c[2]}
-            if c[3]:  # If distractors exist
-                import json
-                try:
-                    card["distractors"] = json.loads(c[3])
-                except:
-                    pass
-            result.append(card)
-        return result
+        return columns
+
+    def iter_deck_cards(self, deck_id, batch_size=STREAM_BATCH_SIZE):
+        """
+        Stream a deck as CardColumns batches of at most batch_size cards.
 
-    def import_deck(self, deck_data):
+        Uses keyset pagination on the (deck_id, id) index, so each batch is
+        one short query and memory stays bounded however large the deck is.
+        """
+        source, deck_id = self._source(deck_id)
+        query = _WITH_DISTRACTORS.format(
+            cards=f"SELECT id, front, back FROM {source.schema}.cards WHERE deck_id = ? AND id > ? ORDER BY id LIMIT ?",
+            schema=source.schema)
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Insert deck
-        cursor.execute("INSERT INTO decks (name, description) VALUES (?, ?)", 
-                      (deck_data.get("name", "Unnamed Deck"), deck_data.get("description", "")))
-        deck_id = cursor.lastrowid
-        
-        # Insert cards with distractors
-        for card_data in deck_data.get("cards", []):
-            distractors_json = None
-            if "distractors" in card_data:
-                distractors_json = json.dumps(card_data["distractors"])
+        try:
+            last_id = -1
+            while True:
+                batch = CardColumns.from_rows(conn.execute(query, (deck_id, last_id, batch_size)))
+                if not len(batch):
+                    return
+                last_id = batch.ids[-1]
+                yield _globalize(batch, source)
+        finally:
+            conn.close()
+
+    def sample_deck_cards(self, deck_id, count, strategy="uniform"):
+        """
+        Pick up to count cards from a deck inside SQLite, as CardColumns.
+
+        Strategies:
+          uniform  - random cards, found by probing random IDs in the deck's
+                     ID range (no ORDER BY RANDOM(), so no full scan)
+          weighted - like uniform, but probes are accepted with a probability
+                     that halves with every Leitner box, favouring weak cards
+          due      - overdue cards first (oldest due date first), then cards
+                     never reviewed, then uniform to fill up
+
+        Every step is an index lookup, so the cost depends on count, not on
+        the size of the deck. IDs of a deck are mostly contiguous, so the
+        slight bias probing gives cards after a gap is negligible.
+        """
+        if strategy not in SAMPLING_STRATEGIES:
+            raise ValueError(f"Unknown sampling strategy: {strategy}")
+        source, deck_id = self._source(deck_id)
+        conn = self.get_connection()
+        try:
+            chosen = []
+            if strategy == "due":
+                chosen = self._due_card_ids(conn, source, deck_id, count)
+            elif strategy == "weighted":
+                chosen = self._probe_card_ids(conn, source, deck_id, count, weighted=True)
+            if len(chosen) < count:
+                chosen += self._probe_card_ids(conn, source, deck_id, count - len(chosen), exclude=set(chosen))
+            return _globalize(self._load_cards_by_id(conn, source, chosen), source)
+        finally:
+            conn.close()
+
+    def answer_lookup(self):
+        """An AnswerLookup for same-kind answers from the whole library. Close it when done."""
+        return AnswerLookup(self.get_connection())
+
+    def due_card_page(self, conn, deck_id, now, after=None, limit=100):
+        """
+        One page of a deck's due cards for a review session (see
+        review_session): (next_review_at, card_id) of cards due at now, in
+        due order, following the (next_review_at, card_id) key after. The
+        keyset keeps every page an index range scan, however deep.
+        """
+        source, deck_id = self._source(deck_id)
+        due_at, after_id = after or ("", 0)
+        rows = conn.execute(f'''
+            SELECT next_review_at, card_id FROM {source.progress}
+            WHERE deck_id = ? AND next_review_at <= ? AND (next_review_at, card_id) > (?, ?)
+            ORDER BY next_review_at, card_id LIMIT ?
+        ''', (deck_id, now, due_at, self._source(after_id)[1], limit)).fetchall()
+        return [(due_at, source.to_global(card_id)) for due_at, card_id in rows]
+
+    def has_new_cards(self, conn, deck_id):
+        """Whether a deck has never-reviewed cards, from deck_stats (and library_progress for libraries)."""
+        source, deck_id = self._source(deck_id)
+        if source.library is None:
+            row = conn.execute("SELECT card_count > reviewed_count FROM main.deck_stats WHERE deck_id = ?",
+                               (deck_id,)).fetchone()
+        else:
+            row = conn.execute(
+                f"SELECT card_count > (SELECT COUNT(*) FROM main.library_progress WHERE library = ? AND deck_id = ?) "
+                f"FROM {source.schema}.deck_stats WHERE deck_id = ?", (source.library, deck_id, deck_id)).fetchone()
+        return row is None or bool(row[0])
+
+    def new_card_page(self, conn, deck_id, after_id=0, limit=100):
+        """One page of a deck's never-reviewed card IDs after after_id, in ID order."""
+        source, deck_id = self._source(deck_id)
+        return [source.to_global(card_id)
+                for card_id in self._new_card_ids(conn, source, deck_id, self._source(after_id)[1], limit)]
+
+    def _new_card_ids(self, conn, source, deck_id, after_id, limit):
+        if source.library is None:
+            # Straight from the partial index idx_cards_new.
+            query = "SELECT id FROM main.cards WHERE deck_id = ? AND reviewed = 0 AND id > ? ORDER BY id LIMIT ?"
+        else:
+            # Library files are read-only and carry no flag for the user's progress.
+            query = (f"SELECT id FROM {source.schema}.cards c WHERE deck_id = ? AND id > ? "
+                     f"AND NOT EXISTS (SELECT 1 FROM {source.progress} p WHERE p.card_id = c.id) "
+                     "ORDER BY id LIMIT ?")
+        return [row[0] for row in conn.execute(query, (deck_id, after_id, limit))]
+
+    def load_cards(self, conn, card_ids):
+        """CardColumns for cards of any deck or library, in the order given; missing cards are skipped."""
+        by_source = {}
+        for card_id in card_ids:
+            source, local_id = self._source(card_id)
+            by_source.setdefault(source.number, (source, []))[1].append(local_id)
+        loaded = {}
+        for source, local_ids in by_source.values():
+            for card in _globalize(self._load_cards_by_id(conn, source, local_ids), source):
+                loaded[card.id] = card
+        columns = CardColumns()
+        for card_id in card_ids:
+            card = loaded.get(card_id)
+            if card is not None:
+                columns.append(card.id, card.front, card.back, card.distractors)
+        return columns
+
+    def _due_card_ids(self, conn, source, deck_id, count):
+        ids = [row[0] for row in conn.execute(
+            f"SELECT card_id FROM {source.progress} WHERE deck_id = ? AND next_review_at <= CURRENT_TIMESTAMP "
+            "ORDER BY next_review_at LIMIT ?", (deck_id, count))]
+        if len(ids) < count:
+            ids += self._new_card_ids(conn, source, deck_id, 0, count - len(ids))
+        return ids
+
+    def _probe_card_ids(self, conn, source, deck_id, count, weighted=False, exclude=()):
+        if count <= 0:
+            return []
+        cards = f"{source.schema}.cards"
+        first = conn.execute(f"SELECT id FROM {cards} WHERE deck_id = ? ORDER BY id LIMIT 1", (deck_id,)).fetchone()
+        last = conn.execute(f"SELECT id FROM {cards} WHERE deck_id = ? ORDER BY id DESC LIMIT 1", (deck_id,)).fetchone()
+        if first is None:
+            return []
+        low, high = first[0], last[0]
+        top_box = LEITNER_BOX_COUNT - 1
+        chosen = []
+        seen = set(exclude)
+        # Small decks run out of unseen cards quickly; the attempt cap keeps
+        # probing bounded and the ordered scan below fills whatever is left.
+        for _ in range(count * (20 if weighted else 4)):
+            probe = random.randint(low, high)
+            row = conn.execute(
+                f"SELECT c.id, COALESCE(p.leitner_box, 0) FROM {cards} c "
+                f"LEFT JOIN {source.progress} p ON p.card_id = c.id "
+                "WHERE c.deck_id = ? AND c.id >= ? ORDER BY c.id LIMIT 1", (deck_id, probe)).fetchone()
+            if row is None or row[0] in seen:
+                continue
+            if weighted and random.random() >= 0.5 ** min(row[1], top_box):
+                continue
+            seen.add(row[0])
+            chosen.append(row[0])
+            if len(chosen) == count:
+                return chosen
+        if not weighted:
+            for (card_id,) in conn.execute(
+                    f"SELECT id FROM {cards} WHERE deck_id = ? ORDER BY id LIMIT ?", (deck_id, len(seen) + count)):
+                if card_id not in seen:
+                    seen.add(card_id)
+                    chosen.append(card_id)
+                    if len(chosen) == count:
+                        break
+        return chosen
+
+    def _load_cards_by_id(self, conn, source, card_ids):
+        cards = {}
+        for start in range(0, len(card_ids), 500):
+            chunk = card_ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            query = _WITH_DISTRACTORS.format(
+                cards=f"SELECT id, front, back FROM {source.schema}.cards WHERE id IN ({placeholders})",
+                schema=source.schema)
+            for card_id, front, back, distractor in conn.execute(query, chunk):
+                card = cards.setdefault(card_id, (front, back, []))
+                if distractor is not None:
+                    card[2].append(distractor)
+        columns = CardColumns()
+        for card_id in card_ids:
+            if card_id in cards:
+                columns.append(card_id, *cards[card_id])
+        return columns
+
+    def import_deck(self, deck_data, conn=None):
+        with self._write(conn) as cursor:
+            # Insert deck
+            cursor.execute("INSERT INTO decks (name, description) VALUES (?, ?)", 
+                          (deck_data.get("name", "Unnamed Deck"), deck_data.get("description", "")))
+            deck_id = cursor.lastrowid
             
-            cursor.execute("INSERT INTO cards (deck_id, front, back, distractors) VALUES (?, ?, ?, ?)", 
-                          (deck_id, card_data.get("front", ""), card_data.get("back", ""), distractors_json))
-        
-        conn.commit()
-        conn.close()
+            # Insert cards with distractors
+            self.bulk_insert_cards(deck_id, deck_data.get("cards", []), conn=cursor.connection)
+            index_pending_answers(cursor.connection)
         return deck_id
+
+    def bulk_insert_cards(self, deck_id, cards, batch_size=BULK_INSERT_BATCH_SIZE, conn=None):
+        """
+        Insert card dicts (front, back, optional distractors) into a deck
+        with executemany, batch_size rows at a time, so a generator of
+        any length can be streamed in without building it in memory.
+        Everything lands in one transaction. Returns the number inserted.
+        """
+        self._require_user_deck(deck_id)
+        inserted = 0
+        cards = iter(cards)
+        with self._write(conn) as cursor:
+            while True:
+                batch = [(card.get("front", ""), card.get("back", ""), card.get("distractors"))
+                         for card in islice(cards, batch_size)]
+                if not batch:
+                    break
+                self._insert_card_rows(cursor, deck_id, batch)
+                inserted += len(batch)
+            _add_churn(cursor, inserted)
+        return inserted
+
+    def _insert_card_rows(self, cursor, deck_id, rows):
+        """
+        Insert (front, back, distractors) rows with two executemany calls.
+        IDs are assigned here, continuing the cards AUTOINCREMENT sequence,
+        so the distractor rows can refer to them without a query per card.
+        Must run inside a transaction holding the write lock (the writer's,
+        or a private one from _write).
+        """
+        next_id = cursor.execute(
+            "SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'cards'), 0), "
+            "COALESCE((SELECT MAX(id) FROM cards), 0)) + 1").fetchone()[0]
+        card_rows, distractor_rows = [], []
+        for card_id, (front, back, distractors) in enumerate(rows, next_id):
+            card_rows.append((card_id, deck_id, front, back))
+            distractor_rows.extend(_distractor_rows(card_id, distractors))
+        cursor.executemany("INSERT INTO cards (id, deck_id, front, back) VALUES (?, ?, ?, ?)", card_rows)
+        cursor.executemany("INSERT INTO distractors (card_id, position, text) VALUES (?, ?, ?)", distractor_rows)
     
-    def delete_deck(self, deck_id):
+    def replace_deck_cards(self, deck_id, cards, conn=None):
+        """
+        Replace a deck's cards with a freshly generated set, in place.
+
+        Cards are matched to existing ones by normalized front text. Matches
+        keep their ID (and so their progress); only cards whose answer
+        changed lose their progress. New fronts are inserted and fronts that
+        disappeared are deleted. Everything is applied in one transaction,
+        so a failure leaves the old deck untouched.
+
+        Returns a dict with inserted/updated/deleted/kept counts.
+        """
+        self._require_user_deck(deck_id)
+        with self._write(conn) as cursor:
+            cursor.execute(_WITH_DISTRACTORS.format(
+                cards="SELECT id, front, back FROM main.cards WHERE deck_id = ?", schema="main"), (deck_id,))
+            existing = {}
+            deletes = []
+            for card in CardColumns.from_rows(cursor.fetchall()):
+                key = normalize_front(card.front)
+                if key in existing:
+                    deletes.append((card.id,))  # Duplicate front from an older import
+                else:
+                    existing[key] = (card.id, card.front, card.back, tuple(card.distractors or ()))
+
+            inserts, updates, new_distractors, reset_progress = [], [], [], []
+            kept = 0
+            seen = set()
+            for card_data in cards:
+                front = card_data.get("front", "")
+                key = normalize_front(front)
+                if not key or key in seen:
+                    continue
+                seen.add(key)
+                back = card_data.get("back", "")
+                distractors = tuple(str(text) for text in card_data.get("distractors") or ())
+
+                match = existing.pop(key, None)
+                if match is None:
+                    inserts.append((front, back, distractors))
+                    continue
+                card_id, old_front, old_back, old_distractors = match
+                if (front, back, distractors) == (old_front, old_back, old_distractors):
+                    kept += 1
+                    continue
+                updates.append((front, back, card_id))
+                new_distractors.extend(_distractor_rows(card_id, distractors))
+                if normalize_front(back) != normalize_front(old_back):
+                    reset_progress.append((card_id,))
+            deletes.extend((match[0],) for match in existing.values())
+
+            cursor.executemany("DELETE FROM cards WHERE id = ?", deletes)
+            cursor.executemany("UPDATE cards SET front = ?, back = ? WHERE id = ?", updates)
+            cursor.executemany("DELETE FROM distractors WHERE card_id = ?", [(row[2],) for row in updates])
+            cursor.executemany("INSERT INTO distractors (card_id, position, text) VALUES (?, ?, ?)", new_distractors)
+            cursor.executemany("DELETE FROM progress WHERE card_id = ?", reset_progress)
+            self._insert_card_rows(cursor, deck_id, inserts)
+            index_pending_answers(cursor.connection)
+            _add_churn(cursor, len(inserts) + len(updates) + len(deletes))
+        return {"inserted": len(inserts), "updated": len(updates), "deleted": len(deletes), "kept": kept}
+
+    def record_answer(self, card_id, correct, conn=None):
+        """Move a card between Leitner boxes and schedule its next review."""
+        source, card_id = self._source(card_id)
+        if source.library is not None:
+            return self._record_library_answer(source, card_id, correct, conn)
+        with self._write(conn) as cursor:
+            cursor.execute("SELECT leitner_box FROM progress WHERE card_id = ?", (card_id,))
+            row = cursor.fetchone()
+            box = next_leitner_box(row[0] if row else 0, correct)
+            cursor.execute('''
+                INSERT INTO progress (card_id, deck_id, leitner_box, last_reviewed_at, next_review_at)
+                VALUES (?, (SELECT deck_id FROM cards WHERE id = ?), ?, CURRENT_TIMESTAMP, datetime('now', ?))
+                ON CONFLICT (card_id) DO UPDATE SET
+                    leitner_box = excluded.leitner_box,
+                    last_reviewed_at = excluded.last_reviewed_at,
+                    next_review_at = excluded.next_review_at
+            ''', (card_id, card_id, box, f"+{LEITNER_BOX_DELAYS[box]} days"))
+        return box
+
+    def _record_library_answer(self, source, card_id, correct, conn=None):
+        with self._write(conn) as cursor:
+            cursor.execute("SELECT leitner_box FROM library_progress WHERE library = ? AND card_id = ?",
+                           (source.library, card_id))
+            row = cursor.fetchone()
+            box = next_leitner_box(row[0] if row else 0, correct)
+            cursor.execute(f'''
+                INSERT INTO library_progress (library, card_id, deck_id, leitner_box, last_reviewed_at, next_review_at)
+                VALUES (?, ?, (SELECT deck_id FROM {source.schema}.cards WHERE id = ?), ?,
+                        CURRENT_TIMESTAMP, datetime('now', ?))
+                ON CONFLICT (library, card_id) DO UPDATE SET
+                    leitner_box = excluded.leitner_box,
+                    last_reviewed_at = excluded.last_reviewed_at,
+                    next_review_at = excluded.next_review_at
+            ''', (source.library, card_id, card_id, box, f"+{LEITNER_BOX_DELAYS[box]} days"))
+        return box
+
+    def delete_deck(self, deck_id, conn=None):
+        self._require_user_deck(deck_id)
+        with self._write(conn) as cursor:
+            cursor.execute("SELECT card_count FROM deck_stats WHERE deck_id = ?", (deck_id,))
+            row = cursor.fetchone()
+            # Cards and their progress go with the deck via ON DELETE CASCADE
+            cursor.execute("DELETE FROM decks WHERE id = ?", (deck_id,))
+            _add_churn(cursor, row[0] if row else 0)
+
+    def delete_deck_chunk(self, deck_id, chunk_size=DELETE_CHUNK_SIZE, conn=None):
+        """
+        Delete up to chunk_size of a deck's cards, or the deck itself once
+        it has no cards left. Used to remove large decks as a series of
+        short transactions (see DatabaseWriter.delete_deck_in_chunks).
+
+        Returns (cards removed, cards remaining).
+        """
+        self._require_user_deck(deck_id)
+        with self._write(conn) as cursor:
+            cursor.execute(
+                "DELETE FROM cards WHERE id IN "
+                "(SELECT id FROM cards WHERE deck_id = ? LIMIT ?)",
+                (deck_id, chunk_size))
+            removed = cursor.rowcount
+            if removed <= 0:
+                cursor.execute("DELETE FROM decks WHERE id = ?", (deck_id,))
+                return 0, 0
+            _add_churn(cursor, removed)
+            cursor.execute("SELECT card_count FROM deck_stats WHERE deck_id = ?", (deck_id,))
+            row = cursor.fetchone()
+        return removed, row[0] if row else 0
+
+    def create_generation_job(self, topic, difficulty, target_count, replace_deck_id=None, kind="deck",
+                              conn=None):
+        """
+        Record a new generation request and return its job ID. kind is
+        "deck" for user requests or "prefetch" for speculative ones, whose
+        cards go to the response cache instead of a deck.
+        """
+        with self._write(conn) as cursor:
+            cursor.execute(
+                "INSERT INTO generation_jobs (topic, difficulty, target_count, replace_deck_id, kind) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (topic, difficulty, target_count, replace_deck_id, kind))
+            return cursor.lastrowid
+
+    def get_generation_job_row(self, job_id):
+        """A job as a dict without its cards: a single primary-key lookup, cheap enough for the GUI thread."""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Delete cards first (foreign key constraint)
-        cursor.execute("DELETE FROM cards WHERE deck_id = ?", (deck_id,))
-        # Delete deck
-        cursor.execute("DELETE FROM decks WHERE id = ?", (deck_id,))
-        
-        conn.commit()
-        conn.close()
+        try:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM generation_jobs WHERE id = ?", (job_id,)).fetchone()
+            return None if row is None else dict(row)
+        finally:
+            conn.close()
+
+    def get_generation_job(self, job_id):
+        """A job as a dict, with the cards received so far under "cards"."""
+        conn = self.get_connection()
+        try:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM generation_jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = dict(row)
+            job["cards"] = []
+            job["shards"] = 0
+            for shard, front, back, distractors in conn.execute(
+                    "SELECT shard, front, back, distractors FROM generation_job_cards "
+                    "WHERE job_id = ? ORDER BY shard, position", (job_id,)):
+                card = {"front": front, "back": back}
+                if distractors:
+                    card["distractors"] = json.loads(distractors)
+                job["cards"].append(card)
+                job["shards"] = max(job["shards"], shard + 1)
+            return job
+        finally:
+            conn.close()
+
+    def get_resumable_generation_jobs(self):
+        """
+        IDs of jobs that never finished, oldest first. A job still marked
+        'running' here was interrupted by a crash or by closing the app.
+        """
+        conn = self.get_connection()
+        try:
+            return [row[0] for row in conn.execute(
+                "SELECT id FROM generation_jobs WHERE state IN ('pending', 'running') ORDER BY id")]
+        finally:
+            conn.close()
+
+    def start_generation_job_attempt(self, job_id, conn=None):
+        """Mark a job as running and count the attempt. Returns the attempt number."""
+        with self._write(conn) as cursor:
+            cursor.execute(
+                "UPDATE generation_jobs SET state = 'running', attempts = attempts + 1, "
+                "updated_at = CURRENT_TIMESTAMP WHERE id = ?", (job_id,))
+            cursor.execute("SELECT attempts FROM generation_jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def save_generation_shard(self, job_id, shard, name, description, cards, conn=None):
+        """
+        Store the valid cards of one API response. Saving the same shard
+        again is a no-op, so a retried write can never duplicate cards.
+        """
+        with self._write(conn) as cursor:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO generation_job_cards (job_id, shard, position, front, back, distractors) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(job_id, shard, position, card["front"], card["back"],
+                  json.dumps(card["distractors"]) if card.get("distractors") else None)
+                 for position, card in enumerate(cards)])
+            cursor.execute(
+                "UPDATE generation_jobs SET deck_name = COALESCE(deck_name, ?), "
+                "deck_description = COALESCE(deck_description, ?), updated_at = CURRENT_TIMESTAMP "
+                "WHERE id = ?", (name, description, job_id))
+
+    def complete_generation_job(self, job_id, conn=None):
+        """
+        Turn a job's received cards into a deck (or merge them into the deck
+        being regenerated) and mark the job completed, in one transaction,
+        so a crash can never import the same job twice.
+
+        Returns the new deck ID, or the replace summary for regenerations.
+        Prefetch jobs store their cards in the response cache and return None.
+        """
+        job = self.get_generation_job(job_id)
+        with self._write(conn) as cursor:
+            if job["kind"] == "prefetch":
+                cursor.execute(
+                    "INSERT OR REPLACE INTO response_cache (topic_key, difficulty, deck_name, deck_description, cards) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (normalize_front(job["topic"]), job["difficulty"], job["deck_name"], job["deck_description"],
+                     json.dumps(job["cards"])))
+                result = deck_id = None
+            elif job["replace_deck_id"] is not None:
+                result = self.replace_deck_cards(job["replace_deck_id"], job["cards"], conn=cursor.connection)
+                deck_id = job["replace_deck_id"]
+            else:
+                deck_data = {
+                    "name": job["deck_name"] or job["topic"],
+                    "description": job["deck_description"] or f"Auto-generated deck about {job['topic']}.",
+                    "cards": job["cards"],
+                }
+                result = deck_id = self.import_deck(deck_data, conn=cursor.connection)
+            cursor.execute(
+                "UPDATE generation_jobs SET state = 'completed', result_deck_id = ?, error = NULL, "
+                "updated_at = CURRENT_TIMESTAMP WHERE id = ?", (deck_id, job_id))
+            # The cards now live in the deck itself.
+            cursor.execute("DELETE FROM generation_job_cards WHERE job_id = ?", (job_id,))
+        return result
+
+    def get_deck_difficulty(self, deck_id):
+        """The difficulty a deck was last generated at, or None if unknown."""
+        conn = self.get_connection()
+        try:
+            row = conn.execute(
+                "SELECT difficulty FROM generation_jobs WHERE kind = 'deck' AND state = 'completed' "
+                "AND result_deck_id = ? ORDER BY id DESC LIMIT 1", (deck_id,)).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    def prefetch_jobs_since(self, hours=24):
+        """How many prefetch jobs were started in the last few hours (for the budget)."""
+        conn = self.get_connection()
+        try:
+            return conn.execute(
+                "SELECT COUNT(*) FROM generation_jobs WHERE kind = 'prefetch' AND created_at >= datetime('now', ?)",
+                (f"-{hours} hours",)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def is_prefetch_wanted(self, topic, difficulty):
+        """False if this variant is already cached or being generated."""
+        conn = self.get_connection()
+        try:
+            cached = conn.execute(
+                "SELECT 1 FROM response_cache WHERE topic_key = ? AND difficulty = ? AND created_at >= datetime('now', ?)",
+                (normalize_front(topic), difficulty, f"-{PREFETCH_CACHE_DAYS} days")).fetchone()
+            pending = conn.execute(
+                "SELECT 1 FROM generation_jobs WHERE kind = 'prefetch' AND state IN ('pending', 'running') "
+                "AND topic = ? AND difficulty = ?", (topic, difficulty)).fetchone()
+            return not cached and not pending
+        finally:
+            conn.close()
+
+    def apply_cached_response(self, deck_id, topic, difficulty, conn=None):
+        """
+        Regenerate a deck from a prefetched response, if one is cached:
+        merge its cards (see replace_deck_cards), drop the cache entry and
+        record the regeneration as a completed job, in one transaction.
+
+        Returns the replace summary, or None on a cache miss.
+        """
+        with self._write(conn) as cursor:
+            cursor.execute("DELETE FROM response_cache WHERE created_at < datetime('now', ?)",
+                           (f"-{PREFETCH_CACHE_DAYS} days",))
+            key = (normalize_front(topic), difficulty)
+            cursor.execute("SELECT cards FROM response_cache WHERE topic_key = ? AND difficulty = ?", key)
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            cards = json.loads(row[0])
+            summary = self.replace_deck_cards(deck_id, cards, conn=cursor.connection)
+            cursor.execute("DELETE FROM response_cache WHERE topic_key = ? AND difficulty = ?", key)
+            cursor.execute(
+                "INSERT INTO generation_jobs (topic, difficulty, target_count, replace_deck_id, state, "
+                "result_deck_id) VALUES (?, ?, ?, ?, 'completed', ?)",
+                (topic, difficulty, len(cards), deck_id, deck_id))
+        return summary
+
+    def fail_generation_job(self, job_id, error, retry=False, conn=None):
+        """Record an error. With retry, the job stays pending and resumes on the next start."""
+        with self._write(conn) as cursor:
+            cursor.execute(
+                "UPDATE generation_jobs SET state = ?, error = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                ("pending" if retry else "failed", str(error), job_id))
+
+    def rebuild_deck_stats(self, conn=None):
+        """
+        Recompute deck_stats from scratch. The triggers keep it current
+        during normal use; this is the recovery path if it ever drifts.
+        """
+        with self._write(conn) as cursor:
+            _create_deck_stats_triggers(cursor)
+            _rebuild_deck_stats(cursor)
+
+    def get_maintenance_state(self):
+        """The maintenance counters and timestamps, as a dict."""
+        conn = self.get_connection()
+        try:
+            return dict(conn.execute("SELECT name, value FROM maintenance_state"))
+        finally:
+            conn.close()
+
+    def set_maintenance_state(self, values, conn=None):
+        """Store maintenance counters/timestamps from a dict."""
+        with self._write(conn) as cursor:
+            cursor.executemany(
+                "INSERT INTO maintenance_state (name, value) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET value = excluded.value", list(values.items()))
+
+    def append_reviews(self, reviews, conn=None):
+        """
+        Append answers to review_log. reviews are (card_id, deck_id,
+        reviewed_at, answer, correct, response_ms) tuples with global IDs.
+        """
+        rows = []
+        for card_id, deck_id, reviewed_at, answer, correct, response_ms in reviews:
+            source, card_id = self._source(card_id)
+            deck_id = self._source(deck_id)[1]
+            rows.append((source.library or "", card_id, deck_id, reviewed_at, answer, int(correct), response_ms))
+        with self._write(conn) as cursor:
+            cursor.executemany('''
+                INSERT INTO review_log (library, card_id, deck_id, reviewed_at, answer, correct, response_ms)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            _add_churn(cursor, len(rows))
+        return len(rows)
+
+    def roll_up_reviews(self, conn=None):
+        """
+        Add the review_log rows appended since the last call to the daily
+        rollups. A watermark in maintenance_state records how far the log
+        has been rolled up. Returns the number of rows added.
+        """
+        with self._write(conn) as cursor:
+            row = cursor.execute("SELECT value FROM maintenance_state WHERE name = 'review_log_rolled_up'").fetchone()
+            low = int(row[0]) if row else 0
+            high = cursor.execute("SELECT MAX(id) FROM review_log").fetchone()[0] or 0
+            if high <= low:
+                return 0
+            # The WHERE clause is required by SQLite's upsert after a SELECT.
+            cursor.execute('''
+                INSERT INTO review_daily_deck (library, deck_id, day, reviews, correct, response_ms)
+                SELECT library, deck_id, date(reviewed_at), COUNT(*), SUM(correct), SUM(response_ms)
+                FROM review_log WHERE id > ? AND id <= ?
+                GROUP BY library, deck_id, date(reviewed_at)
+                ON CONFLICT (library, deck_id, day) DO UPDATE SET
+                    reviews = reviews + excluded.reviews,
+                    correct = correct + excluded.correct,
+                    response_ms = response_ms + excluded.response_ms
+            ''', (low, high))
+            cursor.execute('''
+                INSERT INTO review_daily_card (library, card_id, day, deck_id, reviews, correct, response_ms)
+                SELECT library, card_id, date(reviewed_at), MAX(deck_id), COUNT(*), SUM(correct), SUM(response_ms)
+                FROM review_log WHERE id > ? AND id <= ?
+                GROUP BY library, card_id, date(reviewed_at)
+                ON CONFLICT (library, card_id, day) DO UPDATE SET
+                    reviews = reviews + excluded.reviews,
+                    correct = correct + excluded.correct,
+                    response_ms = response_ms + excluded.response_ms
+            ''', (low, high))
+            self.set_maintenance_state({"review_log_rolled_up": high}, conn=cursor.connection)
+            return cursor.execute("SELECT COUNT(*) FROM review_log WHERE id > ? AND id <= ?", (low, high)).fetchone()[0]
+
+    def rebuild_review_rollups(self, conn=None):
+        """Recompute the daily rollups from the whole review log."""
+        with self._write(conn) as cursor:
+            cursor.execute("DELETE FROM review_daily_deck")
+            cursor.execute("DELETE FROM review_daily_card")
+            self.set_maintenance_state({"review_log_rolled_up": 0}, conn=cursor.connection)
+            return self.roll_up_reviews(conn=cursor.connection)
+
+    def get_review_summary(self, days=30, deck_id=None):
+        """
+        Reviews per day over the last days (UTC) from the rollups, for one
+        deck or all of them: dicts with day, reviews, correct, accuracy and
+        avg_response_ms, oldest first.
+        """
+        query = '''
+            SELECT day, SUM(reviews), SUM(correct), SUM(response_ms) FROM review_daily_deck
+            WHERE day >= date('now', ?)
+        '''
+        params = [f"-{int(days) - 1} days"]
+        if deck_id is not None:
+            source, local_id = self._source(deck_id)
+            query += " AND library = ? AND deck_id = ?"
+            params += [source.library or "", local_id]
+        query += " GROUP BY day ORDER BY day"
+        conn = self.get_connection()
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+        return [{"day": day, "reviews": reviews, "correct": correct, "accuracy": correct / reviews,
+                 "avg_response_ms": response_ms / reviews}
+                for day, reviews, correct, response_ms in rows]
+
+    def get_card_review_totals(self, deck_id, days=None):
+        """
+        Per-card totals for a deck from the rollups, optionally over the
+        last days only: {card_id: (reviews, correct, avg_response_ms)}.
+        """
+        source, local_id = self._source(deck_id)
+        query = '''
+            SELECT card_id, SUM(reviews), SUM(correct), SUM(response_ms) FROM review_daily_card
+            WHERE library = ? AND deck_id = ?
+        '''
+        params = [source.library or "", local_id]
+        if days is not None:
+            query += " AND day >= date('now', ?)"
+            params.append(f"-{int(days) - 1} days")
+        query += " GROUP BY card_id"
+        conn = self.get_connection()
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+        return {source.to_global(card_id): (reviews, correct, response_ms / reviews)
+                for card_id, reviews, correct, response_ms in rows}
+
+    def export_library(self, path):
+        """
+        Write the user's decks to a new shared library file (see
+        attach_libraries): a compacted copy of the database without review
+        progress or generation history.
+        """
+        path = Path(path)
+        if path.exists():
+            raise FileExistsError(f"{path} already exists")
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("VACUUM INTO ?", (str(path),))
+        finally:
+            conn.close()
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute("PRAGMA foreign_keys = ON")
+            for table in ("progress", "library_progress", "generation_jobs", "response_cache", "maintenance_state",
+                          "review_log", "review_daily_deck", "review_daily_card"):
+                conn.execute(f"DELETE FROM {table}")
+            conn.commit()
+            # Libraries are opened immutable, which needs a rollback journal.
+            conn.execute("PRAGMA journal_mode = DELETE")
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
 
 # Global database instance
-db = SimpleDB()
\ No newline at end of file
+db = SimpleDB()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ZapCards database utilities.")
+    parser.add_argument("command", choices=["rebuild-stats", "export-library"],
+                        help="rebuild-stats: recompute the materialized deck statistics; "
+                             "export-library: write your decks to a shared library file")
+    parser.add_argument("path", nargs="?", help="output file for export-library")
+    args = parser.parse_args()
+
+    init_db()
+    if args.command == "rebuild-stats":
+        db.rebuild_deck_stats()
+        print("Deck statistics rebuilt.")
+    elif args.command == "export-library":
+        if not args.path:
+            parser.error("export-library needs an output path")
+        db.export_library(args.path)
+        print(f"Library written to {args.path}; copy it into {LIBRARY_DIR} on each machine.")
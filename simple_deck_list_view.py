@@ -3,16 +3,20 @@ Simple deck list view without SQLAlchemy dependencies.
 """
 
 from PyQt5.QtCore import pyqtSignal, Qt
-from PyQt5.QtWidgets import (QListWidget, QListWidgetItem, QVBoxLayout,
+from PyQt5.QtWidgets import (QAbstractItemView, QListWidget, QListWidgetItem, QVBoxLayout,
                              QWidget, QLabel, QHBoxLayout, QDialog, QLineEdit, 
                              QPushButton, QComboBox, QMenu, QAction, QMessageBox)
 
 from themes import get_current_theme
-from widgets import PrimaryButton
+from widgets import PrimaryButton, refresh_child_themes
 from simple_db import db
+from db_queries import queries
 
 class DeckListView(QWidget):
+    DECKS_CHANNEL = "deck_list.decks"
+
     start_quiz_signal = pyqtSignal(int)
+    start_session_signal = pyqtSignal(list)  # deck_ids of a mixed review
     generate_deck_signal = pyqtSignal(str)
     regenerate_deck_signal = pyqtSignal(int, str)  # deck_id, difficulty
     delete_deck_signal = pyqtSignal(int)  # deck_id
@@ -29,64 +33,13 @@ class DeckListView(QWidget):
         layout.setContentsMargins(20, 20, 20, 20)
         
         # Dynamic title based on theme
-        title = QLabel("📚 YOUR QUIZ DECKS 📚")
-        theme = get_current_theme()
-        title.setStyleSheet(f"""
-            QLabel {{
-                font-family: {theme['title_font']};
-                font-size: 22px;
-                font-weight: bold;
-                color: {theme['primary']};
-                background: {theme['panel_bg']};
-                border: 2px solid {theme['button_border']};
-                border-radius: 8px;
-                padding: 20px;
-                margin-bottom: 20px;
-                text-align: center;
-                background-image: {theme.get('scan_lines', 'none')};
-            }}
-        """)
+        self.title = title = QLabel("📚 YOUR QUIZ DECKS 📚")
         title.setAlignment(Qt.AlignCenter)
         layout.addWidget(title)
 
         self.deck_list_widget = QListWidget()
-        self.deck_list_widget.setStyleSheet(f"""
-            QListWidget {{
-                background: {theme['background']};
-                color: {theme['foreground']};
-                border: 2px solid {theme['button_border']};
-                border-radius: 8px;
-                padding: 15px;
-                font-family: {theme['font_family']};
-                font-size: {theme['font_size']};
-                selection-background-color: {theme['primary']};
-                background-image: {theme.get('grid_texture', 'none')};
-            }}
-            QListWidget::item {{
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 {theme['panel_bg']}, stop:1 {theme['button_bg']});
-                border: 1px solid {theme['secondary']};
-                border-radius: 6px;
-                padding: 15px;
-                margin: 6px;
-                font-weight: bold;
-                background-image: {theme.get('scan_lines', 'none')};
-            }}
-            QListWidget::item:hover {{
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 {theme['primary']}, stop:1 {theme['accent']});
-                border-color: {theme['accent']};
-                color: {theme['background']};
-                border-width: 2px;
-            }}
-            QListWidget::item:selected {{
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 {theme['primary']}, stop:1 {theme['secondary']});
-                color: {theme['background']};
-                border-color: {theme['accent']};
-                border-width: 2px;
-            }}
-        """)
+        # Ctrl/Shift-click picks several decks for a mixed review
+        self.deck_list_widget.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.deck_list_widget.itemClicked.connect(self.on_deck_selected)
         self.deck_list_widget.setContextMenuPolicy(Qt.CustomContextMenu)
         self.deck_list_widget.customContextMenuRequested.connect(self.show_context_menu)
@@ -100,20 +53,50 @@ class DeckListView(QWidget):
         self.generate_deck_button = PrimaryButton("🎯 NEW DECK")
         self.generate_deck_button.clicked.connect(self.on_generate_deck)
 
+        self.session_button = PrimaryButton("🔀 MIXED REVIEW")
+        self.session_button.clicked.connect(self.on_start_session)
+        self.session_button.setToolTip("Review the due cards of the selected decks (Ctrl-click to select several), "
+                                       "or of all decks, interleaved in one session.")
+
         button_layout.addWidget(self.generate_deck_button)
         button_layout.addStretch()
+        button_layout.addWidget(self.session_button)
         button_layout.addWidget(self.start_quiz_button)
         layout.addLayout(button_layout)
         self.generate_deck_button.setToolTip("Enter a topic and generate a new deck with questions from the internet.")
+        self.refresh_theme()
 
     def refresh_decks(self):
+        """Reload the decks in the background; populate_decks fills the list."""
+        queries.submit(self.DECKS_CHANNEL, db.get_all_decks,
+                       on_result=self.populate_decks, on_error=self.on_decks_error, parent=self)
+
+    def populate_decks(self, decks):
         self.deck_list_widget.clear()
-        self.decks = db.get_all_decks()
+        self.decks = decks
         for deck in self.decks:
-            item = QListWidgetItem(deck["name"])
+            item = QListWidgetItem(self.format_deck_label(deck))
             item.setData(32, deck["id"])
+            item.setData(33, deck["name"])
+            item.setData(34, deck.get("library"))
             self.deck_list_widget.addItem(item)
 
+    def format_deck_label(self, deck):
+        """Deck name plus the materialized stats from deck_stats."""
+        label = (f"{deck['name']}   ·   {deck['card_count']} cards   ·   "
+                 f"{deck['new_count']} new   ·   {deck['mastery']:.0%} mastered")
+        if deck.get("library"):
+            label += f"   ·   📚 {deck['library']}"
+        return label
+
+    def on_decks_error(self, error):
+        print(f"Failed to load decks: {error}")
+
+    def hideEvent(self, event):
+        # Navigated away: a deck list nobody will see is not worth loading
+        queries.cancel(self.DECKS_CHANNEL)
+        super().hideEvent(event)
+
     def on_deck_selected(self, item):
         self.selected_deck_id = item.data(32)
         self.start_quiz_button.setEnabled(True)
@@ -122,6 +105,13 @@ class DeckListView(QWidget):
         if self.selected_deck_id is not None:
             self.start_quiz_signal.emit(self.selected_deck_id)
 
+    def on_start_session(self):
+        """Mixed review of the selected decks if several are selected, otherwise of every deck."""
+        selected = [item.data(32) for item in self.deck_list_widget.selectedItems()]
+        deck_ids = selected if len(selected) > 1 else [deck["id"] for deck in self.decks]
+        if deck_ids:
+            self.start_session_signal.emit(deck_ids)
+
     def on_generate_deck(self):
         from PyQt5.QtWidgets import QDialog, QVBoxLayout, QLineEdit, QPushButton, QComboBox, QLabel
         
@@ -212,10 +202,19 @@ class DeckListView(QWidget):
             return
         
         deck_id = item.data(32)
-        deck_name = item.text()
+        deck_name = item.data(33)
+        library = item.data(34)
         
         menu = QMenu(self)
         
+        if library:
+            # Shared library decks are read-only
+            info_action = QAction(f"📚 From the '{library}' library (read-only)", self)
+            info_action.setEnabled(False)
+            menu.addAction(info_action)
+            menu.exec_(self.deck_list_widget.mapToGlobal(position))
+            return
+        
         # Change difficulty submenu
         change_difficulty_menu = menu.addMenu("Change Difficulty")
         
@@ -241,7 +240,7 @@ class DeckListView(QWidget):
     
     def regenerate_deck(self, deck_id, deck_name, difficulty):
         reply = QMessageBox.question(self, "Regenerate Deck", 
-                                   f"Regenerate '{deck_name}' with {difficulty} difficulty?\n\nThis will replace all existing questions.",
+                                   f"Regenerate '{deck_name}' with {difficulty} difficulty?\n\nQuestions that stay the same keep their review progress.",
                                    QMessageBox.Yes | QMessageBox.No)
         
         if reply == QMessageBox.Yes:
@@ -258,6 +257,58 @@ class DeckListView(QWidget):
             self.delete_deck_signal.emit(deck_id)
     
     def refresh_theme(self):
-        """Refresh the UI with current theme."""
-        # Simple refresh - just update the decks
-        self.refresh_decks()
\ No newline at end of file
+        """Re-apply the current theme to this view and its buttons."""
+        theme = get_current_theme()
+        self.title.setStyleSheet(f"""
+            QLabel {{
+                font-family: {theme['title_font']};
+                font-size: 22px;
+                font-weight: bold;
+                color: {theme['primary']};
+                background: {theme['panel_bg']};
+                border: 2px solid {theme['button_border']};
+                border-radius: 8px;
+                padding: 20px;
+                margin-bottom: 20px;
+                text-align: center;
+                background-image: {theme.get('scan_lines', 'none')};
+            }}
+        """)
+        self.deck_list_widget.setStyleSheet(f"""
+            QListWidget {{
+                background: {theme['background']};
+                color: {theme['foreground']};
+                border: 2px solid {theme['button_border']};
+                border-radius: 8px;
+                padding: 15px;
+                font-family: {theme['font_family']};
+                font-size: {theme['font_size']};
+                selection-background-color: {theme['primary']};
+                background-image: {theme.get('grid_texture', 'none')};
+            }}
+            QListWidget::item {{
+                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
+                    stop:0 {theme['panel_bg']}, stop:1 {theme['button_bg']});
+                border: 1px solid {theme['secondary']};
+                border-radius: 6px;
+                padding: 15px;
+                margin: 6px;
+                font-weight: bold;
+                background-image: {theme.get('scan_lines', 'none')};
+            }}
+            QListWidget::item:hover {{
+                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
+                    stop:0 {theme['primary']}, stop:1 {theme['accent']});
+                border-color: {theme['accent']};
+                color: {theme['background']};
+                border-width: 2px;
+            }}
+            QListWidget::item:selected {{
+                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
+                    stop:0 {theme['primary']}, stop:1 {theme['secondary']});
+                color: {theme['background']};
+                border-color: {theme['accent']};
+                border-width: 2px;
+            }}
+        """)
+        refresh_child_themes(self)
@@ -3,32 +3,53 @@ Simple quiz view without SQLAlchemy dependencies.
 """
 
 import random
+import time
 from PyQt5.QtCore import pyqtSignal, QTimer, Qt
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QLabel, QRadioButton,
-                             QButtonGroup, QHBoxLayout)
+                             QButtonGroup, QHBoxLayout, QLineEdit, QCheckBox)
 
 from themes import get_current_theme
-from widgets import PrimaryButton
+from widgets import PrimaryButton, refresh_child_themes
+from config import QUIZ_SIZE, QUIZ_SAMPLING, QUIZ_ANSWER_MODE
 from simple_db import db
+from db_writer import writer
+from card_store import CardColumns
+from answer_index import classify_answer
+from answer_grader import compile_answer
+from db_queries import queries
+from review_log import review_log
+from review_session import ReviewSession
 
-class QuizView(QWidget):
-    quiz_finished_signal = pyqtSignal()
+# How long feedback stays up before the next question, in milliseconds.
+# In typed mode, Enter skips the wait.
+FEEDBACK_DELAY_MS = 1500
+# A session fetches its next questions when this many are left unanswered.
+SESSION_PREFETCH_QUESTIONS = 2
 
-    def __init__(self):
-        super().__init__()
-        self.deck_id = None
-        self.questions = []
-        self.current_question_index = -1
-        self.init_ui()
+# Dynamic property the stylesheet keys feedback colours on:
+# "neutral", "selected", "correct" or "wrong".
+FEEDBACK_PROPERTY = "feedback"
 
-    def init_ui(self):
-        self.main_layout = QVBoxLayout(self)
-        self.main_layout.setContentsMargins(30, 30, 30, 30)
+_stylesheet_cache = {}
 
-        self.question_label = QLabel("❓ Question will appear here...")
-        theme = get_current_theme()
-        self.question_label.setStyleSheet(f"""
-            QLabel {{
+
+def _report_progress_error(future):
+    if future.exception() is not None:
+        print(f"Could not save review progress: {future.exception()}")
+
+
+def quiz_stylesheet(theme):
+    """
+    The quiz view's stylesheet for a theme, built once per theme.
+
+    Every feedback state is a [feedback="..."] selector, so answering and
+    moving to the next question only flips properties instead of handing
+    Qt a new stylesheet to parse.
+    """
+    key = theme["name"]
+    if key not in _stylesheet_cache:
+        _stylesheet_cache[key] = f"""
+            QLabel#quizQuestion {{
                 font-family: {theme['font_family']};
                 font-size: 16px;
                 font-weight: bold;
@@ -41,7 +62,120 @@ class QuizView(QWidget):
                 margin-bottom: 25px;
                 background-image: {theme.get('scan_lines', 'none')};
             }}
-        """)
+            QRadioButton {{
+                font-family: {theme['font_family']};
+                font-size: 14px;
+                font-weight: bold;
+                color: {theme['foreground']};
+                background: {theme['panel_bg']};
+                border: 1px solid {theme['secondary']};
+                border-radius: 6px;
+                padding: 15px;
+                margin: 8px;
+                background-image: {theme.get('scan_lines', 'none')};
+            }}
+            QRadioButton:hover {{
+                background: {theme['button_bg']};
+                border-color: {theme['accent']};
+                color: {theme['accent']};
+            }}
+            QRadioButton[feedback="selected"] {{
+                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
+                    stop:0 {theme['primary']}, stop:1 {theme['secondary']});
+                color: {theme['background']};
+                border-color: {theme['accent']};
+                border-width: 2px;
+            }}
+            QRadioButton[feedback="correct"] {{
+                border: 2px solid {theme['success']};
+                color: {theme['success']};
+            }}
+            QRadioButton[feedback="wrong"] {{
+                border: 2px solid {theme['error']};
+                color: {theme['error']};
+            }}
+            QRadioButton::indicator {{
+                width: 16px;
+                height: 16px;
+                border: 2px solid {theme['button_border']};
+                border-radius: 8px;
+                background: {theme['background']};
+            }}
+            QRadioButton::indicator:checked {{
+                background: {theme['primary']};
+                border-color: {theme['accent']};
+            }}
+            QLineEdit#quizAnswer {{
+                font-family: {theme['font_family']};
+                font-size: 16px;
+                font-weight: bold;
+                color: {theme['foreground']};
+                background: {theme['panel_bg']};
+                border: 2px solid {theme['secondary']};
+                border-radius: 6px;
+                padding: 12px;
+                margin: 8px;
+            }}
+            QLineEdit#quizAnswer:focus {{
+                border-color: {theme['accent']};
+            }}
+            QLineEdit#quizAnswer[feedback="correct"] {{
+                border-color: {theme['success']};
+                color: {theme['success']};
+            }}
+            QLineEdit#quizAnswer[feedback="wrong"] {{
+                border-color: {theme['error']};
+                color: {theme['error']};
+            }}
+            QLabel#quizFeedback {{
+                font-size: 16px;
+                font-weight: bold;
+            }}
+            QLabel#quizFeedback[feedback="correct"] {{
+                color: {theme['success']};
+            }}
+            QLabel#quizFeedback[feedback="wrong"] {{
+                color: {theme['error']};
+            }}
+        """
+    return _stylesheet_cache[key]
+
+
+def set_feedback_state(widget, state):
+    """Switch a widget's feedback property and re-polish it, if it changed."""
+    if widget.property(FEEDBACK_PROPERTY) == state:
+        return
+    widget.setProperty(FEEDBACK_PROPERTY, state)
+    style = widget.style()
+    style.unpolish(widget)
+    style.polish(widget)
+
+
+class QuizView(QWidget):
+    LOAD_CHANNEL = "quiz.load_deck"
+
+    quiz_finished_signal = pyqtSignal()
+    quiz_completed_signal = pyqtSignal(int, int, int)  # deck_id, correct answers, questions answered
+
+    def __init__(self):
+        super().__init__()
+        self.deck_id = None
+        self.session = None  # ReviewSession of a mixed review, None for a single-deck quiz
+        self.questions = []
+        self.current_question_index = -1
+        self.correct_count = 0
+        self.answered_count = 0
+        self.question_shown_at = time.monotonic()  # For the response time in the review log
+        self.typed_mode = QUIZ_ANSWER_MODE == "typed"
+        self.init_ui()
+
+    def init_ui(self):
+        self.main_layout = QVBoxLayout(self)
+        self.main_layout.setContentsMargins(30, 30, 30, 30)
+        self.setStyleSheet(quiz_stylesheet(get_current_theme()))
+
+        self.question_label = QLabel("❓ Question will appear here...")
+        self.question_label.setObjectName("quizQuestion")
         self.question_label.setWordWrap(True)
         self.question_label.setAlignment(Qt.AlignCenter)
         self.main_layout.addWidget(self.question_label)
@@ -50,49 +184,23 @@ class QuizView(QWidget):
         self.radio_buttons = []
         for i in range(4):
             radio = QRadioButton(f"● OPTION {i+1}")
-            radio.setStyleSheet(f"""
-                QRadioButton {{
-                    font-family: {theme['font_family']};
-                    font-size: 14px;
-                    font-weight: bold;
-                    color: {theme['foreground']};
-                    background: {theme['panel_bg']};
-                    border: 1px solid {theme['secondary']};
-                    border-radius: 6px;
-                    padding: 15px;
-                    margin: 8px;
-                    background-image: {theme.get('scan_lines', 'none')};
-                }}
-                QRadioButton:hover {{
-                    background: {theme['button_bg']};
-                    border-color: {theme['accent']};
-                    color: {theme['accent']};
-                }}
-                QRadioButton:checked {{
-                    background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                        stop:0 {theme['primary']}, stop:1 {theme['secondary']});
-                    color: {theme['background']};
-                    border-color: {theme['accent']};
-                    border-width: 2px;
-                }}
-                QRadioButton::indicator {{
-                    width: 16px;
-                    height: 16px;
-                    border: 2px solid {theme['button_border']};
-                    border-radius: 8px;
-                    background: {theme['background']};
-                }}
-                QRadioButton::indicator:checked {{
-                    background: {theme['primary']};
-                    border-color: {theme['accent']};
-                }}
-            """)
+            radio.setProperty(FEEDBACK_PROPERTY, "neutral")
             self.radio_buttons.append(radio)
             self.options_group.addButton(radio, i)
             self.main_layout.addWidget(radio)
+        self.options_group.buttonClicked.connect(self.on_option_selected)
+
+        self.answer_input = QLineEdit()
+        self.answer_input.setObjectName("quizAnswer")
+        self.answer_input.setProperty(FEEDBACK_PROPERTY, "neutral")
+        self.answer_input.setPlaceholderText("Type your answer and press Enter")
+        self.answer_input.returnPressed.connect(self.on_answer_entered)
+        self.answer_input.setVisible(self.typed_mode)
+        self.main_layout.addWidget(self.answer_input)
 
         self.feedback_label = QLabel("")
-        self.feedback_label.setStyleSheet(f"font-size: 16px; font-weight: bold;")
+        self.feedback_label.setObjectName("quizFeedback")
+        self.feedback_label.setProperty(FEEDBACK_PROPERTY, "neutral")
         self.main_layout.addWidget(self.feedback_label)
 
         button_layout = QHBoxLayout()
@@ -102,71 +210,208 @@ class QuizView(QWidget):
         self.finish_button = PrimaryButton("🏆 FINISH")
         self.finish_button.clicked.connect(self.finish_quiz)
 
+        self.typed_toggle = QCheckBox("⌨️ Type answers")
+        self.typed_toggle.setChecked(self.typed_mode)
+        self.typed_toggle.toggled.connect(self.set_typed_mode)
+
         button_layout.addWidget(self.finish_button)
         button_layout.addStretch()
+        button_layout.addWidget(self.typed_toggle)
         button_layout.addWidget(self.submit_button)
         self.main_layout.addLayout(button_layout)
 
+        self.advance_timer = QTimer(self)
+        self.advance_timer.setSingleShot(True)
+        self.advance_timer.setInterval(FEEDBACK_DELAY_MS)
+        self.advance_timer.timeout.connect(self.next_question)
+
     def load_deck(self, deck_id: int):
+        """Load a deck's questions in the background; start_questions shows them."""
         self.deck_id = deck_id
-        cards = db.get_deck_cards(deck_id)
-        if len(cards) >= 2:
-            self.questions = self.generate_questions(cards)
-            random.shuffle(self.questions)
-            self.current_question_index = -1
+        self.session = None
+        self.advance_timer.stop()
+        self.questions = []
+        self.current_question_index = -1
+        self.correct_count = 0
+        self.answered_count = 0
+        self.question_label.setText("⏳ Loading questions...")
+        self.submit_button.setEnabled(False)
+        queries.submit(self.LOAD_CHANNEL, self.build_questions, deck_id,
+                       on_result=self.start_questions, on_error=self.on_load_error, parent=self)
+
+    def build_questions(self, deck_id: int):
+        """
+        Runs on the read pool: sample the quiz cards in SQLite and turn them
+        into questions. Only QUIZ_SIZE cards (plus a small pool of answers
+        for fallback distractors) are read, whatever the deck size.
+        """
+        cards = db.sample_deck_cards(deck_id, QUIZ_SIZE, QUIZ_SAMPLING)
+        if not cards:
+            return []
+        answer_pool = db.sample_deck_cards(deck_id, 3 * QUIZ_SIZE, "uniform").backs
+        with db.answer_lookup() as library:
+            questions = self.generate_questions(cards, answer_pool, library)
+        random.shuffle(questions)
+        return questions
+
+    def load_session(self, deck_ids):
+        """
+        Start a mixed review over several decks: their due cards interleaved
+        in one queue (see review_session), fetched a batch at a time while
+        the user answers.
+        """
+        self.deck_id = None
+        self.session = ReviewSession(deck_ids)
+        self.advance_timer.stop()
+        self.questions = []
+        self.current_question_index = -1
+        self.correct_count = 0
+        self.answered_count = 0
+        self.question_label.setText("⏳ Loading questions...")
+        self.submit_button.setEnabled(False)
+        queries.submit(self.LOAD_CHANNEL, self.build_session_questions, self.session,
+                       on_result=self.start_questions, on_error=self.on_load_error, parent=self)
+
+    def build_session_questions(self, session):
+        """Runs on the read pool: the session's next QUIZ_SIZE cards as questions, in queue order."""
+        cards, deck_ids = session.next_cards(QUIZ_SIZE)
+        if not cards:
+            return []
+        with db.answer_lookup() as library:
+            questions = self.generate_questions(cards, library=library)
+        for question, deck_id in zip(questions, deck_ids):
+            question["deck_id"] = deck_id
+        return questions
+
+    def fetch_session_questions(self):
+        """Queue the session's next batch unless it is over or already on its way."""
+        if self.session is None or self.session.finished or queries.is_pending(self.LOAD_CHANNEL):
+            return
+        queries.submit(self.LOAD_CHANNEL, self.build_session_questions, self.session,
+                       on_result=self.extend_session, on_error=self.on_load_error, parent=self)
+
+    def extend_session(self, questions):
+        waiting = self.current_question_index >= len(self.questions)
+        self.questions += questions
+        if waiting:
+            # The user got to the end of the last batch first
+            self.current_question_index -= 1
             self.next_question()
 
-    def generate_questions(self, cards):
+    def start_questions(self, questions):
+        if not questions:
+            if self.session is not None:
+                self.question_label.setText("Nothing to review in these decks right now.")
+            else:
+                self.question_label.setText("This deck has no cards to quiz on yet.")
+            return
+        self.questions = questions
+        self.current_question_index = -1
+        self.next_question()
+
+    def on_load_error(self, error):
+        print(f"Failed to load deck {self.deck_id}: {error}")
+        self.question_label.setText("⚠️ Could not load this deck.")
+
+    def hideEvent(self, event):
+        # Navigated away: drop a load that is still in flight
+        queries.cancel(self.LOAD_CHANNEL)
+        super().hideEvent(event)
+
+    def generate_questions(self, cards, answer_pool=None, library=None):
+        """
+        Build up to QUIZ_SIZE multiple-choice questions. Accepts a
+        CardColumns or the legacy list of card dicts.
+
+        Cards without their own distractors get answers of the same kind
+        (year, number, name, ...): first from answer_pool (default: the
+        cards themselves), then from the rest of the library through
+        library, an answer_index.AnswerLookup, if given.
+        """
+        if not isinstance(cards, CardColumns):
+            cards = CardColumns.from_dicts(cards)
+        if answer_pool is None:
+            answer_pool = cards.backs
+        pool_by_kind = {}
+        for answer in set(answer_pool):
+            pool_by_kind.setdefault(classify_answer(answer), []).append(answer)
         questions = []
         
-        for card in cards[:10]:  # Limit to 10 questions
-            correct_answer = card["back"]
-            print(f"Card: {card['front']} -> {card['back']}")
-            print(f"Has distractors: {'distractors' in card}")
-            if "distractors" in card:
-                print(f"Distractors: {card['distractors']}")
+        for index in range(min(len(cards), QUIZ_SIZE)):
+            card = cards[index]
+            correct_answer = card.back
             
             # Check if card has distractors from API
-            if "distractors" in card and len(card["distractors"]) >= 3:
-                distractors = card["distractors"][:3]
-                print(f"Using API distractors: {distractors}")
+            distractors = card.distractors
+            if distractors and len(distractors) >= 3:
+                distractors = distractors[:3]
             else:
-                # Fallback: use other cards' answers as distractors
-                all_answers = [c["back"] for c in cards]
-                other_answers = [ans for ans in all_answers if ans != correct_answer]
-                
-                if len(other_answers) >= 3:
-                    distractors = random.sample(other_answers, 3)
-                else:
-                    distractors = other_answers[:]
-                    generic_distractors = ["None of the above", "Not applicable", "Unknown"]
-                    while len(distractors) < 3:
-                        distractors.append(generic_distractors[len(distractors) % len(generic_distractors)])
-                print(f"Using fallback distractors: {distractors}")
+                # Fallback: same-kind answers from this deck, then the library
+                same_kind = pool_by_kind.get(classify_answer(correct_answer), [])
+                distractors = self.pick_other_answers(same_kind, correct_answer, 3)
+                if len(distractors) < 3 and library is not None:
+                    distractors += library.distractors(correct_answer, 3 - len(distractors), exclude=distractors)
+                if len(distractors) < 3:
+                    others = [answer for answer in answer_pool if answer not in distractors]
+                    distractors += self.pick_other_answers(others, correct_answer, 3 - len(distractors))
+                generic_distractors = ["None of the above", "Not applicable", "Unknown"]
+                while len(distractors) < 3:
+                    distractors.append(generic_distractors[len(distractors) % len(generic_distractors)])
+                print(f"Using fallback distractors for '{card.front}': {distractors}")
             
             choices = distractors + [correct_answer]
             random.shuffle(choices)
             
             questions.append({
-                "question": card["front"],
+                "card_id": card.id,
+                "question": card.front,
                 "choices": choices,
-                "answer": correct_answer
+                "answer": correct_answer,
+                # Accepted variants for typed answers, built here off the GUI thread
+                "grader": compile_answer(correct_answer),
             })
         return questions
 
+    @staticmethod
+    def pick_other_answers(answers, correct_answer, count):
+        """
+        Pick up to count distinct answers other than correct_answer.
+
+        Large decks are sampled by random probing instead of copying the
+        whole answer column for every question.
+        """
+        if len(answers) > 8 * count:
+            picked = []
+            for _ in range(8 * count):
+                answer = answers[random.randrange(len(answers))]
+                if answer != correct_answer and answer not in picked:
+                    picked.append(answer)
+                    if len(picked) == count:
+                        return picked
+        others = list({answer for answer in answers if answer != correct_answer})
+        return random.sample(others, min(count, len(others)))
+
     def next_question(self):
         self.current_question_index += 1
+        if self.session is not None and len(self.questions) - self.current_question_index <= SESSION_PREFETCH_QUESTIONS:
+            self.fetch_session_questions()
         if self.current_question_index >= len(self.questions):
+            if self.session is not None and queries.is_pending(self.LOAD_CHANNEL):
+                self.question_label.setText("⏳ Loading questions...")
+                self.submit_button.setEnabled(False)
+                return  # extend_session carries on
             self.finish_quiz()
             return
 
-        theme = get_current_theme()
+        # Only text and feedback properties change between questions; the
+        # view's stylesheet stays parsed.
         self.feedback_label.setText("")
+        set_feedback_state(self.feedback_label, "neutral")
         self.submit_button.setEnabled(True)
         self.options_group.setExclusive(False)
         for radio in self.radio_buttons:
             radio.setChecked(False)
-            radio.setStyleSheet(f"color: {theme['foreground']};")
+            set_feedback_state(radio, "neutral")
         self.options_group.setExclusive(True)
 
         question_data = self.questions[self.current_question_index]
@@ -174,37 +419,109 @@ class QuizView(QWidget):
 
         for i, choice in enumerate(question_data["choices"]):
             self.radio_buttons[i].setText(choice)
-            self.radio_buttons[i].setVisible(True)
-        
-        for i in range(len(question_data["choices"]), 4):
-            self.radio_buttons[i].setVisible(False)
+        self.answer_input.clear()
+        self.answer_input.setReadOnly(False)
+        set_feedback_state(self.answer_input, "neutral")
+        self.show_answer_widgets()
+        self.question_shown_at = time.monotonic()
+
+    def show_answer_widgets(self):
+        """The options of the current question, or the answer field in typed mode."""
+        choices = len(self.questions[self.current_question_index]["choices"]) if self.questions else 0
+        for i, radio in enumerate(self.radio_buttons):
+            radio.setVisible(not self.typed_mode and i < choices)
+        self.answer_input.setVisible(self.typed_mode)
+        if self.typed_mode:
+            self.answer_input.setFocus()
+
+    def set_typed_mode(self, typed):
+        self.typed_mode = typed
+        if 0 <= self.current_question_index < len(self.questions):
+            self.show_answer_widgets()
+        else:
+            self.answer_input.setVisible(typed)
+
+    def on_answer_entered(self):
+        """Enter submits a typed answer, and once it is graded moves straight on."""
+        if self.submit_button.isEnabled():
+            self.check_answer()
+        elif self.advance_timer.isActive():
+            self.advance_timer.stop()
+            self.next_question()
+
+    def on_option_selected(self, selected_button):
+        if not self.submit_button.isEnabled():
+            return  # Answer already submitted; keep the feedback shown
+        for radio in self.radio_buttons:
+            set_feedback_state(radio, "selected" if radio is selected_button else "neutral")
 
     def check_answer(self):
-        selected_button = self.options_group.checkedButton()
-        if not selected_button:
-            return
+        grade = None
+        if self.typed_mode:
+            selected_button = None
+            selected_answer = self.answer_input.text()
+            if not selected_answer.strip():
+                return
+        else:
+            selected_button = self.options_group.checkedButton()
+            if not selected_button:
+                return
+            selected_answer = selected_button.text()
 
         self.submit_button.setEnabled(False)
         question_data = self.questions[self.current_question_index]
-        selected_answer = selected_button.text()
         correct_answer = question_data["answer"]
 
-        is_correct = (selected_answer == correct_answer)
-        theme = get_current_theme()
+        if self.typed_mode:
+            grade = (question_data.get("grader") or compile_answer(correct_answer)).grade(selected_answer)
+            is_correct = grade.correct
+        else:
+            is_correct = (selected_answer == correct_answer)
+        response_ms = (time.monotonic() - self.question_shown_at) * 1000
+        self.answered_count += 1
+        self.correct_count += is_correct
+        if question_data.get("card_id"):
+            writer.submit(db.record_answer, question_data["card_id"], is_correct).add_done_callback(
+                _report_progress_error)
+            review_log.record(question_data["card_id"], question_data.get("deck_id", self.deck_id),
+                              selected_answer, is_correct, response_ms)
+        self.show_feedback(selected_button, is_correct, grade)
+
+        self.advance_timer.start()
 
-        if is_correct:
+    def show_feedback(self, selected_button, is_correct, grade=None):
+        """Mark the chosen and correct options (or the typed answer) and show the verdict."""
+        correct_answer = self.questions[self.current_question_index]["answer"]
+        if self.typed_mode:
+            self.answer_input.setReadOnly(True)  # Still takes Enter, to move on
+            set_feedback_state(self.answer_input, "correct" if is_correct else "wrong")
+        else:
+            for radio in self.radio_buttons:
+                if radio.text() == correct_answer:
+                    set_feedback_state(radio, "correct")
+                elif radio is selected_button:
+                    set_feedback_state(radio, "wrong")
+
+        if is_correct and grade is not None and grade.distance:
+            self.feedback_label.setText(f"Correct! (It is spelled: {correct_answer})")
+            set_feedback_state(self.feedback_label, "correct")
+        elif is_correct:
             self.feedback_label.setText("Correct!")
-            self.feedback_label.setStyleSheet(f"color: {theme['success']}; font-weight: bold;")
+            set_feedback_state(self.feedback_label, "correct")
         else:
             self.feedback_label.setText(f"Incorrect. The answer is: {correct_answer}")
-            self.feedback_label.setStyleSheet(f"color: {theme['error']}; font-weight: bold;")
-
-        QTimer.singleShot(1500, self.next_question)
+            set_feedback_state(self.feedback_label, "wrong")
 
     def finish_quiz(self):
+        review_log.flush()
+        self.advance_timer.stop()
+        self.session = None
+        if self.answered_count and self.deck_id is not None:
+            self.quiz_completed_signal.emit(self.deck_id, self.correct_count, self.answered_count)
+            self.answered_count = 0  # Report each quiz once
         self.quiz_finished_signal.emit()
     
     def refresh_theme(self):
         """Refresh the UI with current theme."""
-        # Simple refresh - styles will update on next interaction
-        pass
\ No newline at end of file
+        self.setStyleSheet(quiz_stylesheet(get_current_theme()))
+        refresh_child_themes(self)
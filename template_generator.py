@@ -0,0 +1,191 @@
+"""
+Local, template-based deck generator.
+
+Turns a CSV/TSV table and one or more question templates into cards without
+calling the API: countries and capitals, elements and symbols, vocabulary
+lists and so on. A template pairs a question pattern, which can use any
+column as {Column}, with the column that holds the answer. The distractors
+for a card are other values from that same answer column, so they are
+always the right kind of answer.
+
+Cards are generated lazily and streamed into the database with
+SimpleDB.bulk_insert_cards, so tables of any size go in as one transaction
+of batched executemany calls.
+
+Examples:
+    python template_generator.py capitals.csv --deck "World Capitals" \\
+        --card "What is the capital of {Country}?::Capital" \\
+        --card "{Capital} is the capital of which country?::Country"
+    python template_generator.py elements.tsv --deck Elements --card "Symbol of {Name}?::Symbol" --dry-run
+"""
+
+import argparse
+import csv
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+from simple_db import db, init_db, normalize_front
+
+DISTRACTOR_COUNT = 3
+# Random draws tried per card before falling back to a scan of the column.
+DISTRACTOR_PROBES = 8 * DISTRACTOR_COUNT
+
+
+class TemplateError(ValueError):
+    """A template refers to a column the table does not have."""
+
+
+def parse_card_spec(spec):
+    """Split "QUESTION TEMPLATE::ANSWER COLUMN" into its two parts."""
+    question, separator, answer_column = spec.rpartition("::")
+    if not separator or not question.strip() or not answer_column.strip():
+        raise TemplateError(f"Card template must look like 'Question about {{Column}}?::AnswerColumn', got {spec!r}")
+    return question.strip(), answer_column.strip()
+
+
+def read_table(path, delimiter=None):
+    """
+    Read a CSV/TSV file into (column names, rows as dicts). The delimiter is
+    a tab for .tsv/.tab files and otherwise sniffed from the first lines.
+    """
+    path = Path(path)
+    with open(path, newline="", encoding="utf-8-sig") as handle:
+        if delimiter is None:
+            if path.suffix.lower() in (".tsv", ".tab"):
+                delimiter = "\t"
+            else:
+                sample = handle.read(64 * 1024)
+                handle.seek(0)
+                try:
+                    delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+                except csv.Error:
+                    delimiter = ","
+        reader = csv.DictReader(handle, delimiter=delimiter)
+        columns = [name.strip() for name in reader.fieldnames or []]
+        reader.fieldnames = columns
+        rows = [{key: (value or "").strip() for key, value in row.items() if key is not None} for row in reader]
+    return columns, rows
+
+
+def _column_values(rows, column):
+    """Distinct non-empty values of a column, in first-seen order."""
+    values = {}
+    for row in rows:
+        value = row.get(column, "")
+        if value:
+            values.setdefault(normalize_front(value), value)
+    return list(values.values())
+
+
+def _pick_distractors(values, answer, rng):
+    answer_key = normalize_front(answer)
+    picked, keys = [], {answer_key}
+    if len(values) > 2 * DISTRACTOR_PROBES:
+        for _ in range(DISTRACTOR_PROBES):
+            value = values[rng.randrange(len(values))]
+            key = normalize_front(value)
+            if key not in keys:
+                keys.add(key)
+                picked.append(value)
+                if len(picked) == DISTRACTOR_COUNT:
+                    return picked
+    candidates = [value for value in values if normalize_front(value) not in keys]
+    picked.extend(rng.sample(candidates, min(DISTRACTOR_COUNT - len(picked), len(candidates))))
+    return picked
+
+
+def generate_cards(columns, rows, templates, seed=None):
+    """
+    Yield a card dict per row and template. Rows missing a value the
+    template needs are skipped. Cards get distractors only if the answer
+    column has at least DISTRACTOR_COUNT other values.
+    """
+    rng = random.Random(seed)
+    column_set = set(columns)
+    for question, answer_column in templates:
+        needed = {name for _, name, _, _ in string.Formatter().parse(question) if name}
+        missing = (needed | {answer_column}) - column_set
+        if missing:
+            raise TemplateError(f"Unknown column(s) {', '.join(sorted(missing))}; the table has {', '.join(columns)}")
+        answers = _column_values(rows, answer_column)
+        for row in rows:
+            answer = row.get(answer_column, "")
+            if not answer or any(not row.get(name) for name in needed):
+                continue
+            card = {"front": question.format_map(row), "back": answer}
+            distractors = _pick_distractors(answers, answer, rng)
+            if len(distractors) == DISTRACTOR_COUNT:
+                card["distractors"] = distractors
+            yield card
+
+
+def create_deck_from_table(path, deck_name, card_specs, description=None, seed=None, delimiter=None):
+    """
+    Generate cards from a table and store them as a new deck, in one
+    transaction. Returns (deck_id, cards inserted).
+    """
+    columns, rows = read_table(path, delimiter)
+    templates = [parse_card_spec(spec) for spec in card_specs]
+    counted = _Counter(generate_cards(columns, rows, templates, seed))
+    deck_id = db.import_deck({
+        "name": deck_name,
+        "description": description or f"Generated from {Path(path).name}.",
+        "cards": counted,
+    })
+    return deck_id, counted.count
+
+
+class _Counter:
+    """Passes items through while counting them."""
+
+    def __init__(self, items):
+        self._items = items
+        self.count = 0
+
+    def __iter__(self):
+        for item in self._items:
+            self.count += 1
+            yield item
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a ZapCards deck from a CSV/TSV table and question templates.")
+    parser.add_argument("table", help="CSV or TSV file with a header row")
+    parser.add_argument("--deck", required=True, help="name of the new deck")
+    parser.add_argument("--card", action="append", required=True, metavar="'QUESTION {Column}?::AnswerColumn'",
+                        help="question template and answer column; repeat for several card types")
+    parser.add_argument("--description", help="deck description")
+    parser.add_argument("--delimiter", help="field separator (default: tab for .tsv, otherwise detected)")
+    parser.add_argument("--seed", type=int, help="random seed for distractor choice")
+    parser.add_argument("--dry-run", action="store_true", help="print a few cards instead of saving the deck")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.dry_run:
+            columns, rows = read_table(args.table, args.delimiter)
+            templates = [parse_card_spec(spec) for spec in args.card]
+            for number, card in enumerate(generate_cards(columns, rows, templates, args.seed)):
+                if number == 5:
+                    break
+                print(f"{card['front']} -> {card['back']}  (distractors: {', '.join(card.get('distractors', []))})")
+            return 0
+
+        init_db()
+        started = time.perf_counter()
+        deck_id, inserted = create_deck_from_table(args.table, args.deck, args.card, args.description,
+                                                   args.seed, args.delimiter)
+    except (OSError, TemplateError) as e:
+        print(f"Error: {e}")
+        return 1
+    except Exception as e:
+        print(f"Could not create the deck: {e}")
+        return 1
+    print(f"Created deck '{args.deck}' (id {deck_id}) with {inserted} cards in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
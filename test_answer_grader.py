@@ -0,0 +1,143 @@
+"""Tests for answer_grader."""
+
+import random
+
+import pytest
+
+from answer_grader import (_char_masks, answer_variants, bounded_edit_distance, grade_answer,
+                           normalize_answer)
+
+
+def _levenshtein(a, b):
+    """Plain dynamic-programming edit distance, the reference for the bit-parallel version."""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Paris", "paris"),
+    ("  The   Beatles ", "beatles"),
+    ("An apple", "apple"),
+    ("a", "a"),
+    ("Théâtre", "theatre"),
+    ("STRASSE", "strasse"),
+    ("Straße", "strasse"),
+    ("Rock-'n'-Roll!", "rock n roll"),
+    ("line\tbreak\nhere", "line break here"),
+    ("1/2", "1 2"),
+    ("", ""),
+])
+def test_normalize_answer(text, expected):
+    assert normalize_answer(text) == expected
+
+
+def test_variants_split_on_spaced_slash_only():
+    assert answer_variants("colour / color") == {"colour color", "colour", "color"}
+    assert answer_variants("1/2", "number") == {"1 2"}
+    assert answer_variants("km/h") == {"km h"}
+
+
+def test_variants_drop_parentheticals():
+    assert answer_variants("Paris (France)", "other") == {"paris france", "paris"}
+
+
+def test_variants_split_names_on_or_and_semicolon():
+    assert answer_variants("Mumbai or Bombay", "place") == {"mumbai or bombay", "mumbai", "bombay"}
+    assert answer_variants("Beijing; Peking", "place") == {"beijing peking", "beijing", "peking"}
+    assert "gulf of mexico" in answer_variants("Gulf of Mexico or Mexican Gulf", "place")
+
+
+@pytest.mark.parametrize("answer", [
+    "To be or not to be",
+    "Trick or treat",
+    "Now or never",
+    "It rains; we stay home",
+])
+def test_variants_keep_ordinary_phrases_whole(answer):
+    assert answer_variants(answer, "other") == {normalize_answer(answer)}
+
+
+def test_variants_accept_surname_for_people():
+    assert "curie" in answer_variants("Marie Curie", "person")
+
+
+@pytest.mark.parametrize("answer", ["Elizabeth II", "Henry VIII", "Martin Luther King Jr."])
+def test_variants_skip_regnal_numbers_and_suffixes(answer):
+    assert all(len(variant) >= 3 and variant not in ("ii", "viii", "jr")
+               for variant in answer_variants(answer, "person"))
+
+
+def test_variants_surname_after_suffix():
+    assert "king" in answer_variants("Martin Luther King Jr.", "person")
+
+
+@pytest.mark.parametrize("typed, answer", [
+    ("Henry VII", "Henry VIII"),
+    ("Apollo 13", "Apollo 11"),
+    ("Louis XIV", "Louis XVI"),
+    ("Apollo", "Apollo 11"),
+])
+def test_grade_numerals_must_match(typed, answer):
+    assert not grade_answer(typed, answer).correct
+
+
+def test_grade_typo_beside_numeral():
+    assert grade_answer("Apolo 11", "Apollo 11").correct
+    assert grade_answer("Henri VIII", "Henry VIII").correct
+
+
+def test_grade_rejects_fragments_of_phrases():
+    assert not grade_answer("not to be", "To be or not to be").correct
+    assert not grade_answer("treat", "Trick or treat").correct
+    assert grade_answer("Bombay", "Mumbai or Bombay").correct
+
+
+def test_grade_typo_budget():
+    assert grade_answer("Missisippi", "Mississippi").correct
+    assert not grade_answer("Misisipi", "Mississippi").correct
+    assert not grade_answer("1867", "1868").correct
+    assert not grade_answer("cat", "car").correct
+
+
+@pytest.mark.parametrize("pattern, text", [
+    ("kitten", "sitting"),
+    ("flaw", "lawn"),
+    ("abc", "abc"),
+    ("abc", ""),
+    ("", "abc"),
+    ("a" * 70, "a" * 68 + "bb"),
+])
+def test_bounded_edit_distance_examples(pattern, text):
+    distance = _levenshtein(pattern, text)
+    masks = _char_masks(pattern)
+    assert bounded_edit_distance(pattern, masks, text, distance) == distance
+    if distance:
+        assert bounded_edit_distance(pattern, masks, text, distance - 1) is None
+
+
+def test_bounded_edit_distance_matches_dp():
+    """The early exit must never give up on, or accept, a pair the full computation disagrees with."""
+    rng = random.Random(1)
+    for _ in range(5000):
+        pattern = "".join(rng.choice("abcd ") for _ in range(rng.randint(0, 24)))
+        text = list(pattern)
+        for _ in range(rng.randint(0, 5)):
+            position = rng.randint(0, len(text))
+            operation = rng.randrange(3)
+            if operation == 0:
+                text.insert(position, rng.choice("abcde"))
+            elif text and position < len(text):
+                if operation == 1:
+                    del text[position]
+                else:
+                    text[position] = rng.choice("abcde")
+        text = "".join(text)
+        distance = _levenshtein(pattern, text)
+        limit = rng.randint(0, 6)
+        expected = distance if distance <= limit else None
+        assert bounded_edit_distance(pattern, _char_masks(pattern), text, limit) == expected, (pattern, text, limit)
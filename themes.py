@@ -210,4 +210,36 @@ def set_theme(theme_name):
     return False
 
 def get_theme_list():
-    return [(key, theme["name"]) for key, theme in THEMES.items()]
\ No newline at end of file
+    return [(key, theme["name"]) for key, theme in THEMES.items()]
+
+def app_stylesheet(theme):
+    """The application-wide stylesheet for a theme (plain widgets and message boxes)."""
+    return f"""
+        QWidget {{
+            font-family: {theme['font_family']};
+            font-size: {theme['font_size']};
+            background: {theme['background']};
+            color: {theme['foreground']};
+        }}
+        QMessageBox {{
+            background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
+                stop:0 {theme['background']}, stop:1 {theme['panel_bg']});
+            border: 2px solid {theme['button_border']};
+            background-image: {theme.get('grid_texture', 'none')};
+        }}
+        QMessageBox QPushButton {{
+            background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+                stop:0 {theme['button_bg']}, stop:1 {theme['background']});
+            border: 2px solid {theme['button_border']};
+            border-radius: 4px;
+            padding: 10px 20px;
+            font-weight: bold;
+            color: {theme['foreground']};
+            background-image: {theme.get('scan_lines', 'none')};
+        }}
+        QMessageBox QPushButton:hover {{
+            background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+                stop:0 {theme['primary']}, stop:1 {theme['secondary']});
+            color: {theme['background']};
+        }}
+    """
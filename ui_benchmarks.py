@@ -0,0 +1,393 @@
+"""
+Frame-time benchmarks for the ZapCards UI.
+
+Runs the real views offscreen, against synthetic databases built for the
+run, and times the work done between two frames, so UI changes can be
+checked against the 60 Hz frame budget (16.7 ms):
+
+  startup    constructing MainWindow and each view on its own
+  deck_list  loading and populating the deck list with 10k and 100k decks
+  theme      switching the main window to each theme
+  quiz       a question transition (next_question plus a synchronous
+             repaint), showing answer feedback and grading a typed
+             answer, for every theme
+
+    python ui_benchmarks.py all --save before.json
+    python ui_benchmarks.py all --compare before.json
+    python ui_benchmarks.py quiz --themes stranger_things --transitions 500 --json
+
+Results carry the commit and Qt version they were taken with. --compare
+prints the change against a saved run and exits with 1 if any median got
+slower by more than --tolerance, so UI slowdowns can fail a check the way
+database regressions do. The synthetic databases live in a temporary
+directory; the real database and its backups are never touched.
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QEvent, QT_VERSION_STR, PYQT_VERSION_STR, qInstallMessageHandler
+from PyQt5.QtWidgets import QApplication
+
+from themes import THEMES, set_theme
+
+FRAME_BUDGET_MS = 1000 / 60
+DEFAULT_TRANSITIONS = 200
+# Timed runs of each startup, deck list and theme measurement.
+DEFAULT_REPEAT = 5
+DEFAULT_DECK_COUNTS = (10_000, 100_000)
+# Decks in the database the startup and theme suites open.
+STARTUP_DECKS = 50
+SYNTHETIC_CARDS_PER_DECK = 5
+# Distinct answers across synthetic cards; few, so building the answer
+# index does not dominate the setup time.
+SYNTHETIC_ANSWERS = 500
+# A median must grow by this share, and by at least REGRESSION_MIN_MS,
+# to count as a regression; smaller changes are noise on a shared machine.
+REGRESSION_TOLERANCE = 0.20
+REGRESSION_MIN_MS = 0.5
+SUITES = ("startup", "deck_list", "theme", "quiz")
+
+
+def _quiet_qt_messages(mode, context, message):
+    # The offscreen platform warns about every top-level show.
+    if "propagateSizeHints" not in message:
+        print(message, file=sys.stderr)
+
+
+def _synthetic_questions(count):
+    questions = []
+    for i in range(count):
+        answer = f"Answer {i}"
+        choices = [f"Distractor {i}-{j} with a longer label to wrap" for j in range(3)] + [answer]
+        questions.append({
+            "card_id": None,  # Keeps check_answer-style feedback away from the database
+            "question": f"Question {i}: which of these options is the correct answer to this question?",
+            "choices": choices,
+            "answer": answer,
+        })
+    return questions
+
+
+def _summarize(samples):
+    samples = sorted(samples)
+    return {
+        "median_ms": statistics.median(samples),
+        # Nearest rank, so it is never below the median (with 5 samples it is the slowest).
+        "p95_ms": samples[min(len(samples) - 1, math.ceil(0.95 * len(samples)) - 1)],
+        "max_ms": samples[-1],
+    }
+
+
+def _timed(app, view, action):
+    started = time.perf_counter()
+    action()
+    view.repaint()
+    app.processEvents()
+    return (time.perf_counter() - started) * 1000
+
+
+def _discard(app, widget):
+    widget.close()
+    widget.deleteLater()
+    # No event loop runs here, so deliver the deferred delete by hand.
+    app.sendPostedEvents(None, QEvent.DeferredDelete)
+
+
+def _settle(app):
+    """Let background loads the views started on construction land before timing."""
+    from db_queries import queries
+    from simple_deck_list_view import DeckListView
+    from simple_quiz_view import QuizView
+    while any(queries.is_pending(channel) for channel in (DeckListView.DECKS_CHANNEL, QuizView.LOAD_CHANNEL)):
+        app.processEvents()
+        time.sleep(0.001)
+    app.processEvents()
+
+
+def _row(benchmark, samples, theme=None):
+    from themes import CURRENT_THEME
+    return {"benchmark": benchmark, "theme": theme or CURRENT_THEME, "runs": len(samples), **_summarize(samples)}
+
+
+def _deck_label(count):
+    return f"{count // 1000}k" if count >= 1000 and count % 1000 == 0 else str(count)
+
+
+def build_synthetic_db(path, deck_count, cards_per_deck=SYNTHETIC_CARDS_PER_DECK):
+    """
+    Create a database at path holding deck_count decks of cards_per_deck
+    cards, identical on every run, and point the app's db at it.
+    """
+    from answer_index import index_pending_answers
+    from generation_jobs import DIFFICULTIES
+    from simple_db import db, init_db
+
+    started = time.perf_counter()
+    db.db_path = Path(path)
+    init_db()
+    conn = db.get_connection()
+    try:
+        with conn:
+            conn.executemany("INSERT INTO decks (name, description) VALUES (?, 'Synthetic benchmark deck')",
+                             ((f"Synthetic topic {i:06d} - {DIFFICULTIES[i % len(DIFFICULTIES)]}",)
+                              for i in range(deck_count)))
+            deck_ids = [deck_id for (deck_id,) in conn.execute(
+                "SELECT id FROM decks WHERE description = 'Synthetic benchmark deck' ORDER BY id")]
+            conn.executemany("INSERT INTO cards (deck_id, front, back) VALUES (?, ?, ?)",
+                             ((deck_id, f"Question {j} about synthetic topic {deck_id}?",
+                               f"Answer {(deck_id * cards_per_deck + j) % SYNTHETIC_ANSWERS}")
+                              for deck_id in deck_ids for j in range(cards_per_deck)))
+            index_pending_answers(conn)
+    finally:
+        conn.close()
+    print(f"Built a synthetic database with {deck_count} decks in {time.perf_counter() - started:.1f}s",
+          file=sys.stderr)
+    return db.db_path
+
+
+def benchmark_startup(app, repeat):
+    """Time constructing (and first painting) MainWindow and each view."""
+    from home_view import HomeView
+    from settings_view import SettingsView
+    from simple_deck_list_view import DeckListView
+    from simple_quiz_view import QuizView
+    from main_window import MainWindow
+
+    rows = []
+    for name, factory in (("HomeView", HomeView), ("SettingsView", SettingsView),
+                          ("DeckListView", DeckListView), ("QuizView", QuizView), ("MainWindow", MainWindow)):
+        samples = []
+        # The first construction also loads fonts and styles once per process; untimed.
+        for run in range(repeat + 1):
+            started = time.perf_counter()
+            widget = factory()
+            widget.show()
+            widget.repaint()
+            app.processEvents()
+            if run:
+                samples.append((time.perf_counter() - started) * 1000)
+            _settle(app)
+            if name == "MainWindow":
+                widget.maintenance.shutdown()
+            _discard(app, widget)
+        rows.append(_row(f"startup.{name}", samples))
+    return rows
+
+
+def benchmark_deck_list(app, work_dir, deck_counts, repeat):
+    """Time loading and populating the deck list for each database size."""
+    from simple_db import db
+    from simple_deck_list_view import DeckListView
+
+    rows = []
+    for count in deck_counts:
+        build_synthetic_db(Path(work_dir) / f"decks-{count}.db", count)
+        view = DeckListView()
+        view.resize(1000, 750)
+        view.show()
+        _settle(app)
+
+        load, populate = [], []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            decks = db.get_all_decks()
+            load.append((time.perf_counter() - started) * 1000)
+            populate.append(_timed(app, view, lambda: view.populate_decks(decks)))
+        label = _deck_label(count)
+        rows.append(_row(f"deck_list.load@{label}", load))
+        rows.append(_row(f"deck_list.populate@{label}", populate))
+        _discard(app, view)
+    return rows
+
+
+def benchmark_theme(app, theme_names, repeat):
+    """Time switching the main window (and every view) to each theme."""
+    from main_window import MainWindow
+
+    window = MainWindow()
+    window.show()
+    _settle(app)
+    samples = {name: [] for name in theme_names}
+    for _ in range(repeat):
+        for name in theme_names:
+            def switch():
+                set_theme(name)
+                window.change_theme(name)
+            samples[name].append(_timed(app, window, switch))
+    window.maintenance.shutdown()
+    _discard(app, window)
+    return [_row("theme.switch", samples[name], theme=name) for name in theme_names]
+
+
+def benchmark_quiz(app, theme_names, transitions):
+    """Time quiz transitions and feedback for each theme. Returns result rows."""
+    from simple_quiz_view import QuizView
+
+    rows = []
+    for theme_name in theme_names:
+        set_theme(theme_name)
+        view = QuizView()
+        view.resize(900, 700)
+        view.show()
+        app.processEvents()
+
+        questions = _synthetic_questions(transitions + 1)
+        view.questions = questions
+        view.current_question_index = -1
+        view.next_question()
+        app.processEvents()
+
+        transition, feedback = [], []
+        for _ in range(transitions):
+            selected = view.radio_buttons[0]
+            selected.setChecked(True)
+            feedback.append(_timed(app, view, lambda: view.show_feedback(selected, False)))
+            transition.append(_timed(app, view, view.next_question))
+
+        # Typed answers: grading (with a typo) plus feedback, then moving on with Enter
+        view.set_typed_mode(True)
+        view.questions += _synthetic_questions(transitions)
+        typed = []
+        for _ in range(transitions):
+            answer = view.questions[view.current_question_index]["answer"]
+            view.answer_input.setText(answer.replace("Answer", "Answr"))
+            typed.append(_timed(app, view, view.on_answer_entered))
+            view.on_answer_entered()
+        view.set_typed_mode(False)
+
+        for name, samples in (("transition", transition), ("feedback", feedback), ("typed_answer", typed)):
+            rows.append({"benchmark": f"quiz.{name}", "theme": theme_name, "runs": len(samples),
+                         **_summarize(samples)})
+        _discard(app, view)
+    return rows
+
+
+def run_metadata():
+    """Where the numbers come from, so runs of different commits can be told apart."""
+    try:
+        commit = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=Path(__file__).parent,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {"commit": commit, "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "qt": QT_VERSION_STR, "pyqt": PYQT_VERSION_STR,
+            "platform": platform.platform(), "qpa": os.environ.get("QT_QPA_PLATFORM")}
+
+
+def load_rows(path):
+    """Rows of a saved run (older runs saved a bare list of rows)."""
+    with open(path) as f:
+        results = json.load(f)
+    return results["rows"] if isinstance(results, dict) else results
+
+
+def compare_rows(rows, baseline_rows, tolerance=REGRESSION_TOLERANCE):
+    """
+    Print each median next to the baseline's. Returns the rows that got
+    slower by more than tolerance (and REGRESSION_MIN_MS).
+    """
+    baseline = {(row["benchmark"], row["theme"]): row for row in baseline_rows}
+    regressions = []
+    print(f"{'benchmark':<28}{'theme':<20}{'before ms':>10}{'after ms':>10}{'change':>9}")
+    for row in rows:
+        before = baseline.get((row["benchmark"], row["theme"]))
+        if before is None:
+            print(f"{row['benchmark']:<28}{row['theme']:<20}{'-':>10}{row['median_ms']:>10.2f}{'new':>9}")
+            continue
+        change = row["median_ms"] / before["median_ms"] - 1 if before["median_ms"] else 0.0
+        slower = change > tolerance and row["median_ms"] - before["median_ms"] > REGRESSION_MIN_MS
+        if slower:
+            regressions.append(row)
+        print(f"{row['benchmark']:<28}{row['theme']:<20}{before['median_ms']:>10.2f}{row['median_ms']:>10.2f}"
+              f"{change:>+9.0%}{'  SLOWER' if slower else ''}")
+    return regressions
+
+
+def print_rows(rows):
+    print(f"{'benchmark':<28}{'theme':<20}{'median ms':>10}{'p95 ms':>10}{'max ms':>10}{'of frame':>10}")
+    for row in rows:
+        print(f"{row['benchmark']:<28}{row['theme']:<20}{row['median_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+              f"{row['max_ms']:>10.2f}{row['p95_ms'] / FRAME_BUDGET_MS:>10.0%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time ZapCards UI work against the frame budget.")
+    parser.add_argument("suite", choices=SUITES + ("all",), help="which benchmark to run")
+    parser.add_argument("--themes", nargs="+", choices=sorted(THEMES), default=sorted(THEMES))
+    parser.add_argument("--transitions", type=int, default=DEFAULT_TRANSITIONS)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help="timed runs of each startup, deck list and theme measurement")
+    parser.add_argument("--decks", nargs="+", type=int, default=list(DEFAULT_DECK_COUNTS),
+                        help="deck counts for the deck list benchmark")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--save", metavar="PATH", help="also write the results to PATH as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                        help="slowdown of a median (0.2 = 20%%) that counts as a regression")
+    args = parser.parse_args(argv)
+    suites = SUITES if args.suite == "all" else (args.suite,)
+
+    from simple_db import db
+    from db_backup import backups
+    from db_queries import queries
+    from db_writer import writer
+
+    qInstallMessageHandler(_quiet_qt_messages)
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    rows = []
+    # The app's own messages (migrations, snapshots) stay out of the results.
+    with tempfile.TemporaryDirectory(prefix="zapcards-bench-") as work_dir, \
+            contextlib.redirect_stdout(sys.stderr):
+        # Snapshots of the synthetic databases go to the work directory; one
+        # taken up front keeps MainWindow from starting a backup mid-timing.
+        backups.backup_dir = Path(work_dir) / "backups"
+        try:
+            if "startup" in suites or "theme" in suites:
+                build_synthetic_db(Path(work_dir) / "startup.db", STARTUP_DECKS)
+                backups.create_snapshot()
+            if "startup" in suites:
+                rows += benchmark_startup(app, args.repeat)
+            if "deck_list" in suites:
+                rows += benchmark_deck_list(app, work_dir, args.decks, args.repeat)
+            if "theme" in suites:
+                db.db_path = Path(work_dir) / "startup.db"
+                rows += benchmark_theme(app, args.themes, args.repeat)
+            if "quiz" in suites:
+                rows += benchmark_quiz(app, args.themes, args.transitions)
+        finally:
+            queries.shutdown()
+            writer.close()
+
+    results = {"meta": run_metadata(), "rows": rows}
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_rows(rows)
+    if args.compare:
+        print()
+        regressions = compare_rows(rows, load_rows(args.compare), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower than {args.compare}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+Widget lifecycle and Python memory instrumentation, for debugging leaks.
+
+A long session should not grow: going back to a view, switching themes or
+finishing a quiz ought to leave the same number of live QObjects and roughly
+the same Python heap behind. With ZAPCARDS_UI_INSTRUMENTATION=1 the main
+window records a checkpoint at every navigation and theme change: the live
+QObjects per class, and a tracemalloc snapshot. Each checkpoint logs what
+grew since the one before, and leak_report() lists the classes that kept
+growing between visits to the same view, plus the source lines whose
+allocations grew the most since the first checkpoint.
+
+    python ui_instrumentation.py [--cycles 20]
+
+drives the real main window offscreen through navigation, quiz loads and
+theme switches (reads only; nothing is answered, and no generation jobs,
+backups or maintenance are started) and prints the report.
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+from PyQt5 import sip
+from PyQt5.QtCore import QObject
+from PyQt5.QtWidgets import QApplication
+
+from config import UI_INSTRUMENTATION
+
+# Stack frames kept per allocation; more frames cost more memory and time.
+TRACEMALLOC_FRAMES = 8
+# Classes and source lines listed per log line and in the report.
+REPORT_TOP = 10
+# Pause between the steps of the scripted session, in milliseconds.
+STEP_INTERVAL_MS = 20
+# Allocations from these files are the instrumentation itself. They are
+# skipped in the statistics; Snapshot.filter_traces() is far too slow.
+_IGNORED_FILES = {tracemalloc.__file__, __file__, "<frozen importlib._bootstrap>",
+                  "<frozen importlib._bootstrap_external>", "<unknown>"}
+
+
+def live_qobjects():
+    """
+    Count live QObjects per class name: everything reachable from the
+    application and its top-level widgets, plus parentless objects that
+    only Python holds (threads, watchers and the like).
+    """
+    counts = Counter()
+    seen = set()
+
+    def add(obj):
+        address = sip.unwrapinstance(obj)
+        if address not in seen:
+            seen.add(address)
+            counts[type(obj).__name__] += 1
+
+    app = QApplication.instance()
+    if app is not None:
+        for root in [app] + app.topLevelWidgets():
+            add(root)
+            for child in root.findChildren(QObject):
+                add(child)
+    for obj in gc.get_objects():
+        if isinstance(obj, QObject) and not sip.isdeleted(obj):
+            add(obj)
+    return counts
+
+
+def _heap_size(snapshot):
+    return sum(stat.size for stat in snapshot.statistics("filename")
+               if stat.traceback[0].filename not in _IGNORED_FILES)
+
+
+def _format_growth(growth):
+    return ", ".join(f"{name} {count:+d}" for name, count in growth.most_common(REPORT_TOP)) or "nothing"
+
+
+class UiInstrumentation:
+    """
+    Records QObject counts and tracemalloc snapshots at checkpoints. Does
+    nothing unless enabled; start() begins tracing Python allocations and
+    should run as early as possible.
+    """
+
+    def __init__(self, enabled=UI_INSTRUMENTATION, frames=TRACEMALLOC_FRAMES):
+        self.enabled = enabled
+        self.frames = frames
+        self._baseline = None       # First tracemalloc snapshot
+        self._previous = None       # (counts, snapshot, heap size) of the last checkpoint
+        self._visits = {}           # label -> QObject counts at each visit
+
+    def start(self):
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def checkpoint(self, label):
+        """Record the state after a navigation; logs what grew since the last checkpoint."""
+        if not self.enabled:
+            return
+        self.start()
+        started = time.perf_counter()
+        gc.collect()
+        counts = live_qobjects()
+        snapshot = tracemalloc.take_snapshot()
+        heap = _heap_size(snapshot)
+        if self._previous is None:
+            self._baseline = snapshot
+            print(f"[ui] {label}: {sum(counts.values())} QObjects, Python heap {heap / 1e6:.1f} MB (baseline)")
+        else:
+            previous_counts, _, previous_heap = self._previous
+            growth = counts - previous_counts
+            print(f"[ui] {label}: {sum(counts.values())} QObjects "
+                  f"({sum(counts.values()) - sum(previous_counts.values()):+d}), "
+                  f"Python heap {heap / 1e6:.1f} MB ({(heap - previous_heap) / 1e6:+.2f}); "
+                  f"grew: {_format_growth(growth)} [{(time.perf_counter() - started) * 1000:.0f} ms]")
+        self._previous = (counts, snapshot, heap)
+        self._visits.setdefault(label, []).append(counts)
+
+    def leaking_classes(self):
+        """
+        Classes whose live count went up on most revisits of a view and
+        never down, as a Counter of the largest such growth. Objects created
+        once and kept (a lazily built status bar, say) grow only once and
+        are not reported. Views visited fewer than three times are skipped.
+        """
+        leaks = Counter()
+        for visits in self._visits.values():
+            if len(visits) < 3:
+                continue
+            for name in visits[-1]:
+                steps = [counts[name] for counts in visits]
+                steps = [b - a for a, b in zip(steps, steps[1:])]
+                if min(steps) >= 0 and 2 * sum(step > 0 for step in steps) > len(steps):
+                    leaks[name] = max(leaks[name], sum(steps))
+        return leaks
+
+    def leak_report(self):
+        """A readable summary of leaking classes and the allocation sites that grew most."""
+        if not self.enabled or self._previous is None:
+            return "UI instrumentation is off (set ZAPCARDS_UI_INSTRUMENTATION=1)."
+        lines = [f"Checkpoints: {sum(len(visits) for visits in self._visits.values())} "
+                 f"across {len(self._visits)} views"]
+        leaks = self.leaking_classes()
+        if leaks:
+            lines.append("QObject classes growing on every revisit:")
+            lines += [f"  {name:<32}{count:+d}" for name, count in leaks.most_common(REPORT_TOP)]
+        else:
+            lines.append("No QObject class grew across revisits.")
+        lines.append("Python allocations grown most since the first checkpoint:")
+        stats = [stat for stat in self._previous[1].compare_to(self._baseline, "lineno")
+                 if stat.size_diff > 0 and stat.traceback[0].filename not in _IGNORED_FILES]
+        for stat in stats[:REPORT_TOP]:
+            frame = stat.traceback[0]
+            lines.append(f"  {stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+7d} blocks  "
+                         f"{frame.filename}:{frame.lineno}")
+        return "\n".join(lines)
+
+
+# Global instrumentation instance, used by the main window
+ui_instrumentation = UiInstrumentation()
+
+
+def _session(window, cycles):
+    """
+    The scripted navigation, one step per next(). Each step yields a
+    condition to wait for before the next one runs.
+    """
+    from db_queries import queries
+    from themes import get_theme_list
+    from simple_deck_list_view import DeckListView
+    from simple_quiz_view import QuizView
+
+    views = window.views
+    theme_count = len(get_theme_list())
+
+    def decks_loaded():
+        return not queries.is_pending(DeckListView.DECKS_CHANNEL)
+
+    for cycle in range(cycles):
+        views["home"].navigate_to_decks_signal.emit()
+        yield decks_loaded
+        decks = views["deck_list"].decks
+        if decks:
+            views["deck_list"].start_quiz_signal.emit(decks[cycle % len(decks)]["id"])
+            yield lambda: not queries.is_pending(QuizView.LOAD_CHANNEL)
+            views["quiz"].finish_quiz()
+            yield decks_loaded
+        views["home"].navigate_to_settings_signal.emit()
+        yield None
+        combo = views["settings"].theme_combo
+        combo.setCurrentIndex((combo.currentIndex() + 1) % theme_count)
+        yield None
+        views["settings"].navigate_back_signal.emit()
+        yield None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look for leaks across navigation and theme switches.")
+    parser.add_argument("--cycles", type=int, default=20, help="navigation cycles to run")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    # The instance the main window records into; run as a script, this
+    # module's own globals belong to __main__, a separate copy.
+    from ui_instrumentation import ui_instrumentation as instrumentation
+    instrumentation.enabled = True
+    instrumentation.start()
+
+    from PyQt5.QtCore import QTimer
+    from simple_db import init_db
+    from db_writer import writer
+    from db_queries import queries
+    from db_backup import backups
+    from main_window import MainWindow
+
+    init_db()
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    window = MainWindow(background_work=False)
+    window.show()
+    # Steps run from a timer inside the event loop, as they would for a user;
+    # objects released with deleteLater() are only deleted by a running loop.
+    steps = _session(window, args.cycles)
+    waiting_for = None
+
+    def advance():
+        nonlocal waiting_for
+        if waiting_for is not None and not waiting_for():
+            return
+        try:
+            waiting_for = next(steps)
+        except StopIteration:
+            timer.stop()
+            app.quit()
+
+    timer = QTimer()
+    timer.setInterval(STEP_INTERVAL_MS)
+    timer.timeout.connect(advance)
+    timer.start()
+    try:
+        app.exec_()
+        print()
+        print(instrumentation.leak_report())
+    finally:
+        window.maintenance.shutdown()
+        window.close()
+        backups.shutdown()
+        queries.shutdown()
+        writer.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,62 +4,357 @@ A module to find questions for a given topic from the internet.
 This implementation uses the Google Gemini API to generate flashcards.
 """
 import json
+import random
+import threading
+import time
 from typing import List, Dict, Any
 
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from google.generativeai.types import generation_types
 
-from config import GEMINI_API_KEY
+from config import GEMINI_API_KEY, GEMINI_REQUESTS_PER_MINUTE, GEMINI_MAX_ATTEMPTS
+from simple_db import normalize_front
 
-def find_questions_for_topic(topic: str, count: int = 10, difficulty: str = "Medium") -> Dict[str, Any]:
+# --- Resilience settings ---
+# Requests allowed back to back before the rate limiter starts spacing them.
+RATE_LIMIT_BURST = 3
+# Exponential backoff between retries: BACKOFF_BASE * 2**attempt seconds,
+# capped at BACKOFF_MAX, with full jitter.
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+# Consecutive failures that open the circuit, and how long it stays open.
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 60.0
+
+# Errors that mean "try again later" rather than "this request is wrong".
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.DeadlineExceeded,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Every API call takes one token; tokens refill
+    at a steady rate, so concurrent jobs together never exceed the quota.
     """
-    Generates a new deck with questions and answers related to a topic.
-    Uses the Google Gemini API.
 
-    Args:
-        topic: The topic to generate questions for (e.g., "Solar System").
-        count: The number of questions to generate.
+    def __init__(self, rate_per_second: float, capacity: int):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
 
-    Returns:
-        A dictionary representing a new deck, or None if it fails.
-        Example:
-        {
-            "name": "Solar System",
-            "description": "Auto-generated deck about the Solar System.",
-            "cards": [
-                {"front": "Which planet is known as the Red Planet?", "back": "Mars"},
-                ...
-            ]
-        }
+    def acquire(self) -> float:
+        """Block until a token is available. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Fails fast while the API looks down. After failure_threshold
+    consecutive failures the circuit opens for reset_timeout seconds; then a
+    single trial call is let through (half-open) and its outcome decides
+    whether the circuit closes again.
     """
-    if not GEMINI_API_KEY or GEMINI_API_KEY == "YOUR_API_KEY_HERE":
-        print("ERROR: Gemini API key is not configured in config.py.")
-        return None
 
-    print(f"Generating {count} questions for topic '{topic}' using Gemini API...")
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
 
-    try:
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                raise CircuitOpenError("The question generation service is unavailable; try again shortly.")
+            self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def record_neutral(self):
+        """A call that says nothing about the service's health; frees the half-open trial slot."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+_rate_limiter = TokenBucket(GEMINI_REQUESTS_PER_MINUTE / 60.0, RATE_LIMIT_BURST)
+_circuit_breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+_metrics_lock = threading.Lock()
+_metrics = {
+    "calls": 0,             # Attempts actually sent to the API
+    "successes": 0,
+    "retries": 0,
+    "quota_errors": 0,      # 429 / ResourceExhausted responses
+    "failures": 0,          # Requests that gave up
+    "circuit_rejections": 0,
+    "rate_limit_wait_seconds": 0.0,
+    "malformed_responses": 0,  # Responses that needed salvaging
+    "cards_received": 0,
+    "cards_rejected": 0,    # Invalid or duplicate cards
+    "top_up_requests": 0,
+}
+_configured = False
+
+
+def _count(name: str, amount=1):
+    with _metrics_lock:
+        _metrics[name] += amount
+
+
+def get_generation_metrics() -> Dict[str, Any]:
+    """A snapshot of the generation API counters, plus the circuit state."""
+    with _metrics_lock:
+        snapshot = dict(_metrics)
+    snapshot["circuit_state"] = _circuit_breaker.state
+    return snapshot
+
+
+def _configure_api():
+    """Configure the SDK once per process."""
+    global _configured
+    if not _configured:
         genai.configure(api_key=GEMINI_API_KEY)
-        
-        # List available models for debugging
+        _configured = True
+
+
+def _generate_content(model, prompt, generation_config):
+    """
+    Call the Gemini API through the shared rate limiter and circuit breaker,
+    retrying quota and server errors with jittered exponential backoff.
+    Other errors (bad request, auth) are raised immediately.
+    """
+    for attempt in range(GEMINI_MAX_ATTEMPTS):
         try:
-            models = genai.list_models()
-            print("Available models:")
-            for model_info in models:
-                if 'generateContent' in model_info.supported_generation_methods:
-                    print(f"  - {model_info.name}")
-        except Exception as e:
-            print(f"Could not list models: {e}")
-        
-        model = genai.GenerativeModel('gemini-2.0-flash')
+            _circuit_breaker.before_call()
+        except CircuitOpenError:
+            _count("circuit_rejections")
+            raise
+        try:
+            _count("rate_limit_wait_seconds", _rate_limiter.acquire())
+            _count("calls")
+            response = model.generate_content(prompt, generation_config=generation_config)
+        except RETRYABLE_ERRORS as e:
+            _circuit_breaker.record_failure()
+            if isinstance(e, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+                _count("quota_errors")
+            if attempt + 1 >= GEMINI_MAX_ATTEMPTS:
+                _count("failures")
+                raise
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            print(f"Gemini API call failed ({e.__class__.__name__}), retrying in {delay:.1f}s...")
+            _count("retries")
+            time.sleep(delay)
+        except BaseException as e:
+            # Not a service-health problem; do not trip the breaker, but let
+            # the next call be the half-open trial if this one was.
+            _circuit_breaker.record_neutral()
+            if isinstance(e, Exception):
+                _count("failures")
+            raise
+        else:
+            _circuit_breaker.record_success()
+            _count("successes")
+            return response
 
-        difficulty_instructions = {
-            "Easy": "Make the questions basic and straightforward, suitable for beginners.",
-            "Medium": "Make the questions moderately challenging, requiring some knowledge of the topic.",
-            "Hard": "Make the questions advanced and detailed, requiring deep understanding of the topic."
-        }
-        
-        prompt = f"""
+# --- Response parsing ---
+DISTRACTOR_COUNT = 3
+# Follow-up requests allowed for cards that were missing or invalid.
+MAX_TOP_UP_REQUESTS = 2
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _strip_code_fences(text: str) -> str:
+    return text.strip().replace("```json", "").replace("```", "").strip()
+
+
+def _find_string_field(text: str, key: str):
+    """Decode the string value of the first "key": "..." pair in text, if it is complete."""
+    marker = f'"{key}"'
+    position = text.find(marker)
+    while position != -1:
+        colon = position + len(marker)
+        while colon < len(text) and text[colon] in " \t\r\n":
+            colon += 1
+        if colon < len(text) and text[colon] == ":":
+            value_start = colon + 1
+            while value_start < len(text) and text[value_start] in " \t\r\n":
+                value_start += 1
+            try:
+                value, _ = _JSON_DECODER.raw_decode(text, value_start)
+            except ValueError:
+                return None
+            return value if isinstance(value, str) else None
+        position = text.find(marker, position + 1)
+    return None
+
+
+def _iter_object_spans(text: str, start: int):
+    """
+    Yield (begin, end) for every balanced top-level {...} after start,
+    honouring string literals and escapes. Stops at an unbalanced tail,
+    which is what a truncated response looks like.
+    """
+    depth = 0
+    begin = None
+    in_string = False
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            if depth == 0:
+                begin = index
+            depth += 1
+        elif char == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                yield begin, index + 1
+        elif char == "]" and depth == 0:
+            return  # End of the cards array
+
+
+def salvage_deck_json(text: str) -> Dict[str, Any]:
+    """
+    Parse a deck response, recovering as much as possible when it is damaged.
+
+    Well-formed JSON is returned as is. Otherwise the deck name and
+    description are picked out individually and every complete object in
+    the "cards" array is decoded on its own, so a truncated or slightly
+    broken response still yields all of its intact cards. Returns a dict
+    with "name", "description" and "cards" (possibly empty), plus
+    "salvaged": True when the response had to be repaired.
+    """
+    text = _strip_code_fences(text)
+    try:
+        deck = json.loads(text)
+        if isinstance(deck, dict):
+            deck.setdefault("cards", [])
+            return deck
+    except ValueError:
+        pass
+
+    cards = []
+    cards_key = text.find('"cards"')
+    array_start = text.find("[", cards_key) if cards_key != -1 else -1
+    if array_start != -1:
+        for begin, end in _iter_object_spans(text, array_start + 1):
+            try:
+                cards.append(json.loads(text[begin:end]))
+            except ValueError:
+                continue  # Damaged inside; skip just this card
+    return {
+        "name": _find_string_field(text, "name"),
+        "description": _find_string_field(text, "description"),
+        "cards": cards,
+        "salvaged": True,
+    }
+
+
+def validate_card(card) -> Dict[str, Any]:
+    """
+    Check a generated card against the deck schema and tidy it up.
+
+    A valid card has a non-empty "front" and "back" string and at least
+    DISTRACTOR_COUNT distinct, non-empty distractors that differ from the
+    answer. Returns the cleaned card (exactly DISTRACTOR_COUNT distractors),
+    or None if the card is unusable.
+    """
+    if not isinstance(card, dict):
+        return None
+    front, back = card.get("front"), card.get("back")
+    if not isinstance(front, str) or not isinstance(back, str):
+        return None
+    front, back = front.strip(), back.strip()
+    if not front or not back:
+        return None
+
+    distractors = []
+    seen = {normalize_front(back)}
+    for distractor in card.get("distractors") or []:
+        if not isinstance(distractor, (str, int, float)) or isinstance(distractor, bool):
+            continue
+        distractor = str(distractor).strip()
+        key = normalize_front(distractor)
+        if distractor and key not in seen:
+            seen.add(key)
+            distractors.append(distractor)
+    if len(distractors) < DISTRACTOR_COUNT:
+        return None
+    return {"front": front, "back": back, "distractors": distractors[:DISTRACTOR_COUNT]}
+
+
+def _build_prompt(topic: str, count: int, difficulty: str, avoid_fronts=()) -> str:
+    difficulty_instructions = {
+        "Easy": "Make the questions basic and straightforward, suitable for beginners.",
+        "Medium": "Make the questions moderately challenging, requiring some knowledge of the topic.",
+        "Hard": "Make the questions advanced and detailed, requiring deep understanding of the topic."
+    }
+    avoid = ""
+    if avoid_fronts:
+        listed = "\n".join(f"        - {front}" for front in avoid_fronts)
+        avoid = f"""
+        The deck already contains these questions; do not repeat them:
+{listed}
+"""
+
+    return f"""
         You are a helpful assistant that creates study materials.
         Generate a flashcard deck about the topic: "{topic}".
         
@@ -69,7 +364,7 @@ def find_questions_for_topic(topic: str, count: int = 10, difficulty: str = "Med
         The deck should have a creative and relevant name and a short, one-sentence description.
         Create exactly {count} flashcards. Each card must have a "front" (the question) and a "back" (the correct answer).
         Also include 3 plausible but incorrect "distractors" for each question to make good multiple choice questions.
-
+{avoid}
         Provide the output as a single, valid JSON object with the following structure:
         {{
           "name": "Deck Name",
@@ -91,32 +386,105 @@ def find_questions_for_topic(topic: str, count: int = 10, difficulty: str = "Med
         Do not include any text or formatting outside of this JSON object.
         """
 
-        response = model.generate_content(
-            prompt,
-            generation_config=generation_types.GenerationConfig(
-                # Controls randomness. Lower is more predictable.
-                temperature=0.7 
-            )
-        )
 
-        # Clean up the response to extract only the JSON part
-        cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
-        print(f"API Response: {cleaned_response[:500]}...")  # Show first 500 chars
-        deck_data = json.loads(cleaned_response)
-        
-        print(f"Parsed deck data: {deck_data}")
+def find_questions_for_topic(topic: str, count: int = 10, difficulty: str = "Medium",
+                             existing_cards=None, on_cards=None) -> Dict[str, Any]:
+    """
+    Generates a new deck with questions and answers related to a topic.
+    Uses the Google Gemini API.
+
+    Damaged responses are salvaged card by card and every card is validated;
+    if fewer than count valid cards come back, only the missing number is
+    requested again (at most MAX_TOP_UP_REQUESTS times).
+
+    Args:
+        topic: The topic to generate questions for (e.g., "Solar System").
+        count: The number of questions to generate.
+        existing_cards: Cards already generated for this deck (e.g. by an
+            interrupted job); only the remainder is requested.
+        on_cards: Called as on_cards(name, description, cards) with the
+            accepted cards of each response, as soon as it arrives.
+
+    Returns:
+        A dictionary representing a new deck, or None if it fails.
+        Example:
+        {
+            "name": "Solar System",
+            "description": "Auto-generated deck about the Solar System.",
+            "cards": [
+                {"front": "Which planet is known as the Red Planet?", "back": "Mars",
+                 "distractors": ["Venus", "Jupiter", "Mercury"]},
+                ...
+            ]
+        }
+    """
+    if not GEMINI_API_KEY or GEMINI_API_KEY == "YOUR_API_KEY_HERE":
+        print("ERROR: Gemini API key is not configured in config.py.")
+        return None
+
+    name = description = None
+    cards = list(existing_cards or [])
+    seen_fronts = {normalize_front(card["front"]) for card in cards}
+    print(f"Generating {count - len(cards)} questions for topic '{topic}' using Gemini API...")
+    try:
+        _configure_api()
         
-        # Basic validation
-        if "name" in deck_data and "cards" in deck_data:
-            print("Successfully generated deck from API.")
-            # Check if cards have distractors
-            for i, card in enumerate(deck_data["cards"][:3]):  # Check first 3 cards
-                print(f"Card {i}: {card}")
-            return deck_data
-        else:
-            print("API response was not in the expected format.")
-            return None
+        model = genai.GenerativeModel('gemini-2.0-flash')
+        generation_config = generation_types.GenerationConfig(
+            # Controls randomness. Lower is more predictable.
+            temperature=0.7 
+        )
+
+        for request in range(1 + MAX_TOP_UP_REQUESTS):
+            missing = count - len(cards)
+            if missing <= 0:
+                break
+            if request:
+                _count("top_up_requests")
+                print(f"Requesting {missing} more question(s) to complete the deck...")
+            prompt = _build_prompt(topic, missing, difficulty, [card["front"] for card in cards])
+            response = _generate_content(model, prompt, generation_config)
+            print(f"API Response: {response.text[:500]}...")  # Show first 500 chars
+
+            deck_data = salvage_deck_json(response.text)
+            if deck_data.get("salvaged"):
+                _count("malformed_responses")
+            name = name or deck_data.get("name")
+            description = description or deck_data.get("description")
+
+            received = deck_data["cards"] if isinstance(deck_data["cards"], list) else []
+            accepted = rejected = 0
+            new_cards = []
+            for raw_card in received:
+                if len(cards) == count:
+                    break
+                card = validate_card(raw_card)
+                key = normalize_front(card["front"]) if card else None
+                if card is None or key in seen_fronts:
+                    rejected += 1
+                    continue
+                seen_fronts.add(key)
+                new_cards.append(card)
+                cards.append(card)
+                accepted += 1
+            _count("cards_received", len(received))
+            _count("cards_rejected", rejected)
+            print(f"Accepted {accepted} of {len(received)} card(s) from this response.")
+            if on_cards is not None and new_cards:
+                on_cards(deck_data.get("name"), deck_data.get("description"), new_cards)
 
     except Exception as e:
         print(f"An error occurred while calling the Gemini API: {e}")
-        return None
\ No newline at end of file
+        # Keep whatever earlier responses produced.
+
+    if not cards:
+        print("API response did not contain any usable cards.")
+        return None
+    if len(cards) < count:
+        print(f"Only {len(cards)} of {count} questions could be generated.")
+    print("Successfully generated deck from API.")
+    return {
+        "name": name or topic,
+        "description": description or f"Auto-generated deck about {topic}.",
+        "cards": cards,
+    }
@@ -2,13 +2,25 @@
 Reusable custom widgets for the Quiz-Go UI.
 """
 
-from PyQt5.QtWidgets import QPushButton
+from PyQt5.QtWidgets import QPushButton, QWidget
 from themes import get_current_theme
 
+
+def refresh_child_themes(widget: QWidget):
+    """Re-apply the current theme to every descendant that has a refresh_theme()."""
+    for child in widget.findChildren(QWidget):
+        refresh = getattr(child, "refresh_theme", None)
+        if refresh is not None:
+            refresh()
+
+
 class StrangerPanel(QPushButton):
     """A dark panel with 80s sci-fi styling."""
     def __init__(self, text="", parent=None):
         super().__init__(text, parent)
+        self.refresh_theme()
+
+    def refresh_theme(self):
         theme = get_current_theme()
         self.setStyleSheet(f"""
             QPushButton {{
@@ -25,6 +37,10 @@ class NeonLabel(QPushButton):
     """A neon-styled label with 80s glow effect."""
     def __init__(self, text="", parent=None):
         super().__init__(text, parent)
+        self.setEnabled(False)
+        self.refresh_theme()
+
+    def refresh_theme(self):
         theme = get_current_theme()
         self.setStyleSheet(f"""
             QPushButton {{
@@ -37,12 +53,14 @@ class NeonLabel(QPushButton):
                 letter-spacing: 2px;
             }}
         """)
-        self.setEnabled(False)
 
 class PrimaryButton(QPushButton):
     """Themed button that adapts to current theme."""
     def __init__(self, text, parent=None):
         super().__init__(text, parent)
+        self.refresh_theme()
+
+    def refresh_theme(self):
         theme = get_current_theme()
         self.setStyleSheet(f"""
             QPushButton {{